@@ -0,0 +1,148 @@
+#
+# File: batch_lanczos.py
+# Author: Ivan Gonzalez
+#
+""" Implements the Lanczos algorithm for a batch of hamiltonians.
+
+You use this module to calculate the ground states of several
+hamiltonians with the same dimensions at once, as the ones of a few
+disorder realizations of the same chain (see :class:`BatchSystem`.) The
+wavefunctions of all of them are stacked in a numpy array of ndim = 3,
+the first index labelling the hamiltonian, and the Lanczos iterations are
+done in lockstep, so each step is a few batched matrix products.
+"""
+import numpy as np
+from sys import float_info
+from dmrg101.core.dmrg_exceptions import DMRGException
+
+def make_tridiagonal_matrices(alphas, betas):
+    """Makes the tridiagonal matrices from the Lanczos coefficients.
+
+    Parameters
+    ----------
+    alphas : a list of numpy arrays with ndim = 1.
+        The diagonal elements for each iteration, one per hamiltonian.
+    betas : a list of numpy arrays with ndim = 1.
+        The off-diagonal elements, with one element less than `alphas`.
+
+    Returns
+    -------
+    result : a numpy array with ndim = 3.
+        The tridiagonal matrix for each hamiltonian.
+    """
+    size = len(alphas)
+    result = np.zeros((len(alphas[0]), size, size))
+    diagonal = np.arange(size)
+    result[:, diagonal, diagonal] = np.array(alphas).transpose()
+    if size > 1:
+	off_diagonal = np.array(betas[:size-1]).transpose()
+	result[:, diagonal[1:], diagonal[:-1]] = off_diagonal
+	result[:, diagonal[:-1], diagonal[1:]] = off_diagonal
+    return result
+
+def get_norms(wfs):
+    """Gets the norm of each wavefunction in a batch.
+    """
+    return np.sqrt(np.sum(np.abs(wfs.reshape(len(wfs), -1))**2, axis=1))
+
+def calculate_ground_states(hamiltonian, initial_wfs=None,
+		            min_lanczos_iterations=3,
+			    too_many_iterations=1000, precision=0.000001):
+    """Calculates the ground states of a batch of hamiltonians.
+
+    The iterations go on until the ground state energies of all the
+    hamiltonians are converged. Each hamiltonian keeps the Lanczos
+    vectors up to the iteration where its energy converged, so its
+    ground state is the same as if it was calculated alone.
+
+    Parameters
+    ----------
+    hamiltonian : a BatchCompositeOperator.
+        The hamiltonians you want to diagonalize.
+    initial_wfs : a numpy array of ndim = 3 (optional).
+        The wavefunctions that will be used as seed. If None, random ones
+	are used.
+    min_lanczos_iterations : an int, optional.
+        The number of iterations before starting the diagonalizations.
+    too_many_iterations : a int, optional.
+        The maximum number of iterations allowed.
+    precision : a double, optional.
+        The accepted precision to which the ground state energy is
+        considered not improving.
+
+    Returns
+    -------
+    gs_energies : a numpy array of ndim = 1.
+        The ground state energy of each hamiltonian.
+    gs_wfs : a numpy array of ndim = 3.
+        The ground state wavefunctions (normalized.)
+
+    Raises
+    ------
+    DMRGException
+        if the number of iterations goes over `too_many_iterations`.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from dmrg101.core.batch_lanczos import calculate_ground_states
+    >>> from dmrg101.core.batch_operators import BatchCompositeOperator
+    >>> s_z = np.diag([0.5, -0.5])
+    >>> h = BatchCompositeOperator(2, 2, 2)
+    >>> h.add(s_z, s_z, np.array([1.0, -1.0]))
+    >>> energies, wfs = calculate_ground_states(h)
+    >>> print energies
+    [-0.25 -0.25]
+    """
+    shape = (hamiltonian.batch_size, hamiltonian.left_dim,
+	     hamiltonian.right_dim)
+    if initial_wfs is None:
+	initial_wfs = 2 * np.random.random(shape) - 1
+    elif initial_wfs.shape != shape:
+	raise DMRGException("Initial wavefunctions do not fit.")
+    lanczos_vectors = [initial_wfs / get_norms(initial_wfs)[:, None, None]]
+    alphas = []
+    betas = []
+    energies = np.empty(shape[0])
+    energies.fill(np.inf)
+    sizes = np.zeros(shape[0], int)
+    for iteration in range(too_many_iterations):
+	current = lanczos_vectors[-1]
+	new = hamiltonian.apply(current)
+	alpha = np.real(np.sum((np.conj(current) * new).reshape(len(new), -1),
+		               axis=1))
+	new -= alpha[:, None, None] * current
+	if betas:
+	    new -= betas[-1][:, None, None] * lanczos_vectors[-2]
+	beta = get_norms(new)
+	alphas.append(alpha)
+	done = (sizes == 0) & (beta < float_info.epsilon)
+	if len(alphas) >= min_lanczos_iterations or done.any():
+	    new_energies = np.array([np.linalg.eigvalsh(matrix)[0] for matrix
+		                     in make_tridiagonal_matrices(alphas, betas)])
+	    done |= (sizes == 0) & (np.abs(new_energies - energies) <
+		                    precision)
+	    sizes[done] = len(alphas)
+	    energies = np.where((sizes == 0) | done, new_energies, energies)
+	    if sizes.all():
+		break
+	betas.append(beta)
+	lanczos_vectors.append(new / np.where(beta < float_info.epsilon, 1.0,
+		                              beta)[:, None, None])
+    else:
+	raise DMRGException("Too many Lanczos iterations")
+    #
+    # the coefficients of the ground state of each hamiltonian in its
+    # Lanczos vectors, padded with zeros up to the largest size
+    #
+    coefficients = np.zeros((shape[0], len(alphas)))
+    for i, size in enumerate(sizes):
+	evals, evecs = np.linalg.eigh(make_tridiagonal_matrices(
+	    [alpha[i:i+1] for alpha in alphas[:size]],
+	    [beta[i:i+1] for beta in betas[:size-1]])[0])
+	coefficients[i, :size] = evecs[:, 0]
+    gs_wfs = np.zeros(shape, np.result_type(*lanczos_vectors))
+    for i, lanczos_vector in enumerate(lanczos_vectors[:len(alphas)]):
+	gs_wfs += coefficients[:, i, None, None] * lanczos_vector
+    gs_wfs /= get_norms(gs_wfs)[:, None, None]
+    return energies, gs_wfs
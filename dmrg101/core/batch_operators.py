@@ -0,0 +1,131 @@
+#
+# File: batch_operators.py
+# Author: Ivan Gonzalez
+#
+""" A module for operators acting on a batch of wavefunctions.
+"""
+import numpy as np
+from dmrg101.core.dmrg_exceptions import DMRGException
+from dmrg101.core.transform_matrix import multiply_stacks
+
+class BatchCompositeOperator(object):
+    """A sum of operators acting on a batch of wavefunctions.
+
+    You use this class as a CompositeOperator, when you run several DMRG
+    calculations with the same dimensions in lockstep (see
+    :class:`BatchSystem`.) The wavefunctions are stacked in a numpy array
+    of ndim = 3, whose first index labels the calculation. The operators
+    of each term are stacked in the same way, or are a matrix (ndim = 2)
+    if they are the same for all the calculations, and the parameter of a
+    term can be a number or an array with one value per calculation.
+
+    Each term is applied to the whole batch with a few batched matrix
+    products. When the right operator of a term is the same for all the
+    calculations, the batch is multiplied by it as a single large
+    matrix, which keeps the BLAS busy even if the matrices are small.
+
+    Parameters
+    ----------
+    batch_size : an int.
+        The number of calculations.
+    left_dim : an int.
+        The dimension of the Hilbert space of the left side.
+    right_dim : an int.
+        The dimension of the Hilbert space of the right side.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from dmrg101.core.batch_operators import BatchCompositeOperator
+    >>> twice = BatchCompositeOperator(3, 2, 2)
+    >>> twice.add(np.eye(2), np.eye(2), np.array([1.0, 2.0, 3.0]))
+    >>> wfs = np.ones((3, 2, 2))
+    >>> print twice.apply(wfs)[:, 0, 0]
+    [ 1.  2.  3.]
+    """
+    def __init__(self, batch_size, left_dim, right_dim):
+	super(BatchCompositeOperator, self).__init__()
+	self.batch_size = batch_size
+	self.left_dim = left_dim
+	self.right_dim = right_dim
+	self.list_of_components = []
+
+    def check_fits(self, operator, dim):
+	"""Checks the operator is a square matrix or a batch of them.
+
+	Raises
+	------
+	DMRGException
+	    if the operator doesn't fit.
+	"""
+	if operator.ndim == 3 and operator.shape[0] != self.batch_size:
+	    raise DMRGException("Operator is not for this batch")
+	if operator.ndim not in (2, 3) or operator.shape[-2:] != (dim, dim):
+	    raise DMRGException("Operator does not fit")
+
+    def add(self, left_op, right_op, parameter=1.0):
+	"""Adds a term to the operator.
+
+	Parameters
+	----------
+	left_op : a numpy array of ndim = 3 or 2.
+	    The operators acting on the left indexes of the wavefunctions.
+	right_op : a numpy array of ndim = 3 or 2.
+	    The operators acting on the right indexes of the wavefunctions.
+	parameter : a double/complex, or a numpy array of ndim = 1 (optional).
+	    A parameter that multiplies the whole thing, or one for each
+	    calculation.
+
+	Raises
+	------
+	DMRGException
+	    if any of the operators don't fit.
+	"""
+	self.check_fits(left_op, self.left_dim)
+	self.check_fits(right_op, self.right_dim)
+	parameter = np.asarray(parameter)
+	if parameter.ndim == 1:
+	    if parameter.shape[0] != self.batch_size:
+		raise DMRGException("Parameters are not for this batch")
+	    parameter = parameter[:, np.newaxis, np.newaxis]
+	self.list_of_components.append((left_op, right_op, parameter))
+
+    def apply(self, wfs):
+	"""Applies the operator to a batch of wavefunctions.
+
+	Parameters
+	----------
+	wfs : a numpy array of ndim = 3.
+	    The wavefunctions, as matrices, stacked.
+
+	Returns
+	-------
+	result : a numpy array of ndim = 3.
+	    The result.
+
+	Raises
+	------
+	DMRGException
+	    if the wavefunctions don't fit, or there are no terms.
+	"""
+	if wfs.shape != (self.batch_size, self.left_dim, self.right_dim):
+	    raise DMRGException("Wavefunctions do not fit.")
+	if not self.list_of_components:
+	    raise DMRGException("Composite operator is empty.")
+	result = None
+	for left_op, right_op, parameter in self.list_of_components:
+	    tmp = multiply_stacks(left_op, wfs)
+	    if right_op.ndim == 2:
+		tmp = np.dot(tmp.reshape(-1, self.right_dim),
+			     right_op.transpose()).reshape(tmp.shape)
+	    else:
+		tmp = multiply_stacks(tmp, right_op.transpose(0, 2, 1))
+	    if parameter.ndim or parameter != 1.0:
+		tmp = tmp * parameter
+	    if result is None:
+		result = tmp
+	    elif np.can_cast(tmp.dtype, result.dtype):
+		result += tmp
+	    else:
+		result = result + tmp
+	return result
@@ -0,0 +1,284 @@
+#
+# File: batch_system.py
+# Author: Ivan Gonzalez
+#
+""" A module to run DMRG for a batch of systems in lockstep.
+"""
+import numpy as np
+from dmrg101.core.batch_lanczos import calculate_ground_states
+from dmrg101.core.batch_operators import BatchCompositeOperator
+from dmrg101.core.block import _block_versions
+from dmrg101.core.dmrg_exceptions import DMRGException
+from dmrg101.core.entropies import calculate_entropies
+from dmrg101.core.make_tensor import make_batch_tensor
+from dmrg101.core.reduced_DM import diagonalize_batch, truncate_batch
+from dmrg101.core.system import System
+from dmrg101.core.transform_matrix import multiply_stacks, transform_batch
+
+class BatchBlock(object):
+    """A block for a batch of systems.
+
+    You use this class as a Block, when you run a batch of systems in
+    lockstep (see :class:`BatchSystem`.) All the systems have the same
+    dimension, and the operators are numpy arrays of ndim = 3, whose
+    first index labels the system, or of ndim = 2, if they are the same
+    for all the systems.
+
+    Parameters
+    ----------
+    dim : an int.
+	Size of the Hilbert space.
+    operators : a dict of strings and numpy arrays.
+	Operators for the block.
+    transformation_matrix : a numpy array of ndim = 3.
+	The truncation matrix used to make the block for each system, or
+	None if the block was not made by a DMRG transformation.
+    number_of_sites : an int.
+	The number of sites in the block, or None if unknown.
+    version : an int.
+	A number different for each block made, see :class:`Block`.
+    """
+    def __init__(self, dim):
+	super(BatchBlock, self).__init__()
+	self.dim = dim
+	self.operators = {'id': np.eye(dim, dim)}
+	self.transformation_matrix = None
+	self.number_of_sites = None
+	self.version = next(_block_versions)
+
+def make_batch_block_from_site(site):
+    """Makes a brand new batch block using a single site.
+
+    The operators of the site are the same for all the systems, so they
+    are copied as matrices.
+    """
+    result = BatchBlock(site.dim)
+    for name, matrix in site.operators.items():
+	result.operators[name] = np.array(matrix)
+    result.number_of_sites = 1
+    return result
+
+class BatchSystem(System):
+    """A batch of systems run in lockstep by the DMRG algorithm.
+
+    You use this class to run the same DMRG calculation for many systems
+    which differ only in the parameters of the hamiltonian, as the
+    disorder realizations of a chain with random couplings. Each system
+    alone is too small to keep the cores busy, but all the batch
+    together is not: the wavefunctions and the operators of all the
+    systems are stacked along a first index, so applying the
+    hamiltonian, transforming the operators, and diagonalizing the
+    reduced density matrices are batched array operations, and the
+    Python overhead is paid once for the whole batch.
+
+    You use it as a System, with the same models, but the parameters of
+    the terms can be numpy arrays with one value per system (see
+    :class:`DisorderedHeisenbergModel`.) The DMRG steps return numpy
+    arrays with the energy, entropy and truncation error for each
+    system. As the systems go in lockstep, the same number of states is
+    kept for all of them.
+
+    Parameters
+    ----------
+    site : a Site.
+        The single site, the same for both sides.
+    batch_size : an int.
+        The number of systems.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from dmrg101.core.batch_system import BatchSystem
+    >>> from dmrg101.core.sites import SpinOneHalfSite
+    >>> from dmrg101.utils.models.disordered_heisenberg_model import (
+    ...     DisorderedHeisenbergModel)
+    >>> couplings = np.array([[1.0] * 5, [0.5] * 5])
+    >>> batch = BatchSystem(SpinOneHalfSite(), 2)
+    >>> batch.model = DisorderedHeisenbergModel(couplings)
+    >>> batch.number_of_sites = 6
+    >>> for left_block_size in range(1, 4):
+    ...     energies, entropies, errors = batch.infinite_dmrg_step(
+    ...         left_block_size, 8)
+    >>> print np.round(energies, 6)
+    [-2.493577 -1.246789]
+    """
+    def __init__(self, site, batch_size):
+	super(BatchSystem, self).__init__(site)
+	if batch_size < 1:
+	    raise DMRGException("The batch needs at least one system")
+	self.batch_size = batch_size
+	self.left_block = make_batch_block_from_site(site)
+	self.right_block = make_batch_block_from_site(site)
+	self.operators_to_add_to_block = {}
+	self.clear_hamiltonian()
+
+    def clear_hamiltonian(self):
+        """Makes a brand new hamiltonian.
+	"""
+	self.clear_tensor_cache()
+	self.h = BatchCompositeOperator(self.batch_size, self.get_left_dim(),
+		                        self.get_right_dim())
+
+    def make_tensor_from_pool(self, block_matrix, site_matrix):
+	"""Makes a tensor product for the batch.
+
+	The arrays are not from the buffer pool, as they are batches, but
+	this is what :meth:`get_tensor` calls.
+	"""
+	return make_batch_tensor(block_matrix, site_matrix)
+
+    def get_batch_parameter(self, param):
+	"""Gets a parameter you can multiply a batch of matrices with.
+	"""
+	param = np.asarray(param)
+	if param.ndim == 1:
+	    if param.shape[0] != self.batch_size:
+		raise DMRGException("Parameters are not for this batch")
+	    param = param[:, np.newaxis, np.newaxis]
+	return param
+
+    def make_tensor_sum_from_pool(self, tensors):
+	"""Makes a sum of tensor products for the batch.
+
+	The array is not from the buffer pool, as the tensor products.
+	"""
+	return sum(self.get_batch_parameter(param) * tensor
+		   for tensor, param in tensors)
+
+    def add_scaled_tensor(self, result, tensor, param):
+	"""Adds a batch of tensor products times a parameter to a batch.
+
+	Parameters
+	----------
+	result : a numpy array of ndim = 3.
+	    The batch of matrices you add the products to.
+	tensor : a numpy array of ndim = 3.
+	    The batch of tensor products.
+	param : a double/complex, or a numpy array of ndim = 1.
+	    A parameter which multiplies the products, or one for each
+	    system.
+	"""
+	result += self.get_batch_parameter(param) * tensor
+
+    def add_to_operators_to_update(self, name, block_op='id', site_op='id'):
+	"""Adds an operator to the list of operators to update.
+	"""
+	self.operators_to_add_to_block[name] = self.get_tensor(
+		self.growing_block, block_op, self.growing_site, site_op)
+
+    def add_adjoint_to_operators_to_update(self, name, adjoint_of):
+	"""Adds the adjoint of an operator to the operators to update.
+
+	Raises
+	------
+	DMRGException
+	    if `adjoint_of` is not in the list of operators to update.
+	"""
+	if adjoint_of not in self.operators_to_add_to_block:
+	    raise DMRGException("Cannot update the adjoint of a missing "
+		                "operator")
+	self.adjoint_operators_to_add_to_block[name] = adjoint_of
+
+    def set_block_hamiltonian(self):
+        """Sets the block hamiltonian of each system to the model's one.
+	"""
+	if self.growing_side == 'left':
+	    tmp_matrix_size = self.get_left_dim()
+        else:
+	    tmp_matrix_size = self.get_right_dim()
+	tmp_matrix_for_bh = np.zeros((self.batch_size, tmp_matrix_size,
+		                      tmp_matrix_size))
+	self.model.set_block_hamiltonian(tmp_matrix_for_bh, self)
+	self.operators_to_add_to_block['bh'] = tmp_matrix_for_bh
+
+    def update_all_operators(self, transformation_matrix):
+	"""Updates the operators and puts them in the block.
+
+	All the operators of all the systems are transformed at once, see
+	:func:`transform_batch`.
+
+	Parameters
+	----------
+	transformation_matrix : a numpy array of ndim = 3.
+	    The truncation matrix for each system.
+	"""
+	if self.growing_side == 'left':
+	    old_blocks = self.old_left_blocks
+	    old_block = self.left_block
+	else:
+	    old_blocks = self.old_right_blocks
+	    old_block = self.right_block
+	old_blocks.append(old_block)
+	new_block = BatchBlock(transformation_matrix.shape[2])
+	new_block.transformation_matrix = transformation_matrix
+	new_block.number_of_sites = len(old_blocks) + 1
+	for name, matrices in self.operators_to_add_to_block.items():
+	    new_block.operators[name] = transform_batch(matrices,
+		                                        transformation_matrix)
+	for name, adjoint_of in self.adjoint_operators_to_add_to_block.items():
+	    new_block.operators[name] = np.conj(
+		    new_block.operators[adjoint_of].transpose(0, 2, 1))
+	if self.growing_side == 'left':
+	    self.left_block = new_block
+	else:
+	    self.right_block = new_block
+	self.operators_to_add_to_block = {}
+	self.adjoint_operators_to_add_to_block = {}
+
+    def calculate_ground_state(self, initial_wf=None, min_lanczos_iterations=3,
+		               too_many_iterations=1000, precision=0.000001):
+	"""Calculates the ground state of each system.
+
+	The ground states are calculated with the Lanczos algorithm for
+	all the systems in lockstep, see :func:`calculate_ground_states`.
+
+        Returns
+        -------
+        gs_energies : a numpy array of ndim = 1.
+            The ground state energy of each system.
+        gs_wfs : a numpy array of ndim = 3.
+            The ground state wavefunctions (normalized.)
+	"""
+	self.ground_state_energy, self.ground_state_wf = (
+		calculate_ground_states(self.h, initial_wf,
+		                        min_lanczos_iterations,
+					too_many_iterations, precision) )
+	return self.ground_state_energy, self.ground_state_wf
+
+    def get_truncation_matrix(self, ground_state_wf, number_of_states_kept):
+        """Gets the truncation matrix for each system.
+
+	The reduced density matrices of all the systems are made and
+	diagonalized at once.
+
+        Returns
+        -------
+        truncation_matrix : a numpy array of ndim = 3.
+            The truncation matrix for each system.
+        entropy : a numpy array of ndim = 1.
+            The Von Neumann entropy for each system.
+        truncation_error : a numpy array of ndim = 1.
+            The truncation error for each system.
+	"""
+	if self.shrinking_side == 'right':
+	    rho = multiply_stacks(ground_state_wf,
+		                  np.conj(ground_state_wf.transpose(0, 2, 1)))
+	else:
+	    rho = multiply_stacks(ground_state_wf.transpose(0, 2, 1),
+		                  np.conj(ground_state_wf))
+	evals, evecs = diagonalize_batch(rho)
+	truncated_evals, truncation_matrix = truncate_batch(
+		evals, evecs, number_of_states_kept)
+	entropy = calculate_entropies(truncated_evals)
+	truncation_error = 1.0 - np.sum(truncated_evals, axis=1)
+	return truncation_matrix, entropy, truncation_error
+
+    def turn_around(self, new_growing_side):
+	"""Turns around in the finite algorithm.
+	"""
+	if new_growing_side == 'left':
+	    self.left_block = make_batch_block_from_site(self.left_site)
+	    self.old_left_blocks.clear()
+	else:
+	    self.right_block = make_batch_block_from_site(self.right_site)
+	    self.old_right_blocks.clear()
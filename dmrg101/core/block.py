@@ -5,10 +5,14 @@
 """ A module for blocks.
 """
 import copy 
+import itertools
 import numpy as np
 from dmrg101.core.dmrg_exceptions import DMRGException
+from dmrg101.core.shared_memory import copy_to_shared_memory
 from dmrg101.core.sites import Site
 
+_block_versions = itertools.count()
+
 class Block(Site):
     """A block.
     
@@ -25,8 +29,21 @@ class Block(Site):
 	Size of the Hilbert space. The dimension must be at least 1. A
 	block of dim = 1  represents the vaccum (or something strange like
 	that, it's used for demo purposes mostly.)
-    operators : a dictionary of string and numpy array (with ndim = 2).
+    operators : an OperatorBank.
 	Operators for the block.
+    transformation_matrix : a numpy array of ndim = 2.
+	The truncation matrix used to make the block, or None if the block
+	was not made by a DMRG transformation.
+    number_of_sites : an int.
+	The number of sites in the block, or None if unknown.
+    recipes : a dict of strings and tuples of two strings.
+	For the operators made as the tensor product of an operator of the
+	previous block and one of the single site, the names of these two
+	operators.
+    version : an int.
+	A number different for each block made, which identifies its
+	operators, e.g. to cache the results of calculations with them.
+	A snapshot of the block has the same version.
 
     Examples
     --------
@@ -55,6 +72,69 @@ class Block(Site):
 	Hamiltonian operator is added to the list.
     	"""
     	super(Block, self).__init__(dim)
+	self.transformation_matrix = None
+	self.number_of_sites = None
+	self.recipes = {}
+	self.version = next(_block_versions)
+
+    def snapshot(self):
+	"""Makes a read-only copy of the block.
+
+	You use this function to keep an old version of the block without
+	copying its operators. The snapshot and the block share the
+	operators storage (see :meth:`OperatorBank.snapshot`), which is
+	copied only if any of them changes its operators afterwards.
+
+	Returns
+	-------
+	result : a Block.
+	    The snapshot.
+	"""
+	result = copy.copy(self)
+	result.operators = self.operators.snapshot()
+	result.version = self.version
+	return result
+
+    def copy(self):
+	"""Makes a copy of the block you can change.
+
+	You use this function to change some operators of a block, e.g.
+	when the parameters of the model change, keeping the old block as
+	it is. As with a snapshot, the operators are copied only when any
+	of them changes, but the copy gets a new version.
+
+	Returns
+	-------
+	result : a Block.
+	    The copy.
+	"""
+	result = self.snapshot()
+	result.recipes = dict(self.recipes)
+	result.version = next(_block_versions)
+	return result
+
+    def move_to_shared_memory(self, directory):
+	"""Moves the operators and the truncation matrix to shared memory.
+
+	You use this function before sending the block to another process,
+	so its matrices are mapped, and not copied, by the other process
+	(see :class:`SharedArray`.)
+
+	Parameters
+	----------
+	directory : a string.
+	    The directory for the shared memory, see
+	    :func:`make_shared_memory_directory`.
+	"""
+	self.operators.move_to_shared_memory(directory)
+	if self.transformation_matrix is not None:
+	    self.transformation_matrix = copy_to_shared_memory(
+		    self.transformation_matrix, directory)
+
+    def __setstate__(self, state):
+	# a block from another process is a different block for this one
+	self.__dict__.update(state)
+	self.version = next(_block_versions)
 
 def make_block_from_site(site):
     """Makes a brand new block using a single site.
@@ -106,4 +186,5 @@ def make_block_from_site(site):
     """
     result = Block(site.dim)
     result.operators = copy.deepcopy(site.operators)
+    result.number_of_sites = 1
     return result
@@ -0,0 +1,551 @@
+#
+# File: block_history.py
+# Author: Ivan Gonzalez
+#
+""" A module to keep the old versions of the blocks.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+from collections import OrderedDict
+from Queue import Queue
+from dmrg101.core.block import Block
+from dmrg101.core.dmrg_exceptions import DMRGException
+from dmrg101.core.make_tensor import make_tensor
+from dmrg101.core.operator_bank import PendingOperator, make_operator_bank
+
+BLOCK_FILES = ('_operators.npy', '_transformation.npy', '_manifest.json')
+
+def save_block(block, path):
+    """Saves a block to disk.
+
+    You use this function to save all the operators of a block, and its
+    truncation matrix, to a few files: the operators and the truncation
+    matrix go to `.npy` files, and everything else to a small JSON
+    manifest. The pending operators of the block are calculated.
+
+    Parameters
+    ----------
+    block : a Block.
+        The block.
+    path : a string.
+        The path of the files, which are made adding the endings in
+	`BLOCK_FILES`.
+    """
+    operators = block.operators
+    np.save(path + '_operators.npy', operators.stack)
+    has_transformation = block.transformation_matrix is not None
+    if has_transformation:
+	np.save(path + '_transformation.npy', block.transformation_matrix)
+    manifest = {'dim': block.dim,
+		'names': operators.names,
+		'adjoints': operators.adjoints,
+		'recipes': block.recipes,
+		'number_of_sites': block.number_of_sites,
+		'has_transformation': has_transformation}
+    with open(path + '_manifest.json', 'w') as f:
+	json.dump(manifest, f)
+
+def load_block(path, in_memory=False):
+    """Loads a block saved with :func:`save_block`.
+
+    The operators are memory-mapped, unless `in_memory` is True, so
+    nothing is read from disk until you use them. The bank is marked as
+    shared, so the operators are copied if anyone tries to change them,
+    and the files are never changed.
+
+    Parameters
+    ----------
+    path : a string.
+        The path of the files, without the endings.
+    in_memory : a bool (optional).
+        Whether the operators are read into memory.
+
+    Returns
+    -------
+    result : a Block.
+        The block.
+    """
+    with open(path + '_manifest.json') as f:
+	manifest = json.load(f)
+    names = [str(name) for name in manifest['names']]
+    if in_memory:
+	stack = np.load(path + '_operators.npy')
+	stack.flags.writeable = False
+    else:
+	stack = np.load(path + '_operators.npy', mmap_mode='r')
+    result = Block(manifest['dim'])
+    result.operators = make_operator_bank(names, stack)
+    result.operators.shared = True
+    for name, adjoint_of in manifest['adjoints'].items():
+	result.operators.add_adjoint(str(name), str(adjoint_of))
+    result.recipes = dict((str(name), (str(block_op), str(site_op)))
+		          for name, (block_op, site_op) in
+			  manifest['recipes'].items())
+    result.number_of_sites = manifest['number_of_sites']
+    if manifest['has_transformation']:
+	result.transformation_matrix = np.load(path + '_transformation.npy')
+    return result
+
+def remove_block(path):
+    """Removes the files of a block saved with :func:`save_block`.
+    """
+    for ending in BLOCK_FILES:
+	if os.path.exists(path + ending):
+	    os.remove(path + ending)
+
+class BlockHistory(list):
+    """The old versions of a block, kept in memory.
+
+    You use this class to keep the blocks for each length, as they are
+    needed in the finite algorithm. The block with `i` sites is stored
+    at index `i` - 1. It's just a list that you can clear.
+    """
+    def clear(self):
+	"""Removes all the blocks.
+	"""
+	del self[:]
+
+    def prefetch(self, i):
+	"""Does nothing, as all the blocks are in memory already.
+	"""
+	pass
+
+def work_on_tasks(tasks, errors):
+    """Runs the tasks in a queue until it gets a None.
+
+    You use this function as the target of the thread that saves and
+    loads the blocks in the background. The exceptions are kept in the
+    `errors` list, so they can be raised in the main thread.
+    """
+    while True:
+	task = tasks.get()
+	try:
+	    if task is None:
+		return
+	    task()
+	except Exception as e:
+	    errors.append(e)
+	finally:
+	    # don't keep the task, which may keep the history alive
+	    task = None
+	    tasks.task_done()
+
+class OutOfCoreBlockHistory(object):
+    """The old versions of a block, kept on disk.
+
+    You use this class instead of a BlockHistory when the blocks for all
+    the lengths don't fit in memory. Each block is saved to disk when
+    appended, and loaded back as memory-mapped (read-only) arrays when
+    you get it. Only the last `cache_size` blocks you used are kept in
+    memory. As the sweeps only use blocks of neighbouring lengths, most
+    of the blocks you get are already in the cache.
+
+    The blocks you get are read-only: if you change their operators, the
+    operators are copied first (see :meth:`OperatorBank.snapshot`) and
+    the changes are not saved.
+
+    If `background` is True, the blocks are saved by a background thread,
+    and you can ask the thread to load a block you will need soon (see
+    :meth:`prefetch`). Then the disk I/O happens while the main thread
+    does something else, typically the Lanczos iterations.
+
+    Parameters
+    ----------
+    directory : a string (optional).
+        The directory where the blocks are saved. If None, a temporary
+	directory is created, and removed when you call :meth:`close` or
+	the history is garbage collected.
+    cache_size : an int (optional).
+        The number of blocks kept in memory.
+    prefix : a string (optional).
+        The prefix for the file names, so several histories can use the
+	same directory.
+    background : a bool (optional).
+        Whether the blocks are saved and prefetched in a background
+	thread.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from dmrg101.core.block import Block
+    >>> from dmrg101.core.block_history import OutOfCoreBlockHistory
+    >>> history = OutOfCoreBlockHistory(cache_size=1)
+    >>> for i in range(3):
+    ...     block = Block(2)
+    ...     block.operators['s_z'] = i * np.eye(2)
+    ...     history.append(block)
+    >>> print len(history), len(history.cache)
+    3 1
+    >>> print history[1].operators['s_z']
+    [[ 1.  0.]
+     [ 0.  1.]]
+    >>> history.close()
+    """
+    def __init__(self, directory=None, cache_size=2, prefix='block',
+		 background=False):
+	super(OutOfCoreBlockHistory, self).__init__()
+	if cache_size < 1:
+	    raise DMRGException("The cache must hold at least one block")
+	self.owns_directory = directory is None
+	if self.owns_directory:
+	    directory = tempfile.mkdtemp(prefix='dmrg101_')
+	elif not os.path.isdir(directory):
+	    os.makedirs(directory)
+	self.directory = directory
+	self.cache_size = cache_size
+	self.prefix = prefix
+	self.number_of_blocks = 0
+	self.cache = OrderedDict()
+	self.lock = threading.RLock()
+	self.unsaved = {}
+	self.loading = {}
+	self.errors = []
+	self.tasks = None
+	if background:
+	    self.start_worker()
+
+    def __del__(self):
+	if getattr(self, 'owns_directory', False):
+	    self.close()
+	elif self.tasks is not None:
+	    self.stop_worker()
+
+    def __len__(self):
+	return self.number_of_blocks
+
+    def __getitem__(self, i):
+	self.check_errors()
+	if i < 0:
+	    i += self.number_of_blocks
+	if i < 0 or i >= self.number_of_blocks:
+	    raise IndexError("No block with that size in the history")
+	with self.lock:
+	    being_loaded = self.loading.get(i)
+	if being_loaded is not None:
+	    being_loaded.wait()
+	    self.check_errors()
+	with self.lock:
+	    block = self.cache.pop(i, None)
+	    if block is None:
+		block = self.unsaved.get(i)
+	if block is None:
+	    block = self.load(i)
+	with self.lock:
+	    self.put_in_cache(i, block)
+	return block
+
+    def __iter__(self):
+	for i in range(self.number_of_blocks):
+	    yield self[i]
+
+    def get_path(self, i):
+	"""Gets the path (without the endings) for the block at index `i`.
+	"""
+	return os.path.join(self.directory, '%s_%d' % (self.prefix, i))
+
+    def put_in_cache(self, i, block):
+	"""Puts a block in the cache, dropping the least recently used.
+
+	The blocks not saved yet are kept in `self.unsaved` anyway, until
+	the background thread saves them.
+	"""
+	self.cache[i] = block
+	while len(self.cache) > self.cache_size:
+	    self.cache.popitem(last=False)
+
+    def append(self, block):
+	"""Saves a block at the end of the history.
+
+	The pending operators of the block are calculated before saving,
+	in the main thread, so the background thread only reads the block.
+
+	Parameters
+	----------
+	block : a Block.
+	    The block. It should not be changed afterwards, so use a
+	    snapshot if you keep using the block.
+	"""
+	self.check_errors()
+	i = self.number_of_blocks
+	block.operators.renormalize_pending()
+	self.number_of_blocks += 1
+	if self.tasks is None:
+	    self.save(i, block)
+	else:
+	    with self.lock:
+		self.unsaved[i] = block
+	    self.tasks.put(lambda: self.save_in_background(i, block))
+	with self.lock:
+	    self.put_in_cache(i, block)
+
+    def save_in_background(self, i, block):
+	"""Saves a block, and forgets it's unsaved.
+	"""
+	self.save(i, block)
+	with self.lock:
+	    self.unsaved.pop(i, None)
+
+    def prefetch(self, i):
+	"""Loads a block in the background, if it's not in memory.
+
+	You use this function to load a block you know you will need soon,
+	without waiting for the disk. The block is read into memory (not
+	memory-mapped), and put in the cache. If the history does not work
+	in the background, it does nothing.
+
+	Parameters
+	----------
+	i : an int.
+	    The index of the block.
+	"""
+	self.check_errors()
+	if self.tasks is None or i < 0 or i >= self.number_of_blocks:
+	    return
+	with self.lock:
+	    if i in self.cache or i in self.unsaved or i in self.loading:
+		return
+	    loaded = threading.Event()
+	    self.loading[i] = loaded
+	self.tasks.put(lambda: self.load_in_background(i, loaded))
+
+    def load_in_background(self, i, loaded):
+	"""Loads a block into the cache, and tells it's done.
+	"""
+	try:
+	    block = self.load(i, in_memory=True)
+	    with self.lock:
+		self.put_in_cache(i, block)
+	finally:
+	    with self.lock:
+		self.loading.pop(i, None)
+	    loaded.set()
+
+    def check_errors(self):
+	"""Raises the exceptions of the background thread, if any.
+	"""
+	if self.errors:
+	    raise self.errors.pop(0)
+
+    def flush(self):
+	"""Waits until the background thread has saved all the blocks.
+	"""
+	if self.tasks is not None:
+	    self.tasks.join()
+	self.check_errors()
+
+    def start_worker(self):
+	"""Starts the background thread, if it's not running.
+	"""
+	if self.tasks is None:
+	    self.tasks = Queue()
+	    # the thread must not keep a reference to the history
+	    self.worker = threading.Thread(target=work_on_tasks,
+		                           args=(self.tasks, self.errors))
+	    self.worker.daemon = True
+	    self.worker.start()
+
+    def detach(self):
+	"""Forgets the background thread and the directory.
+
+	You use this function in a process started with `fork`, which
+	gets a copy of the history without its background thread. The
+	history is still there to read the blocks saved, but the files
+	are not removed when the process is done with it, as they belong
+	to the parent process. Stop the background thread before the fork
+	(see :meth:`stop_worker`), so all the blocks are saved.
+	"""
+	self.tasks = None
+	self.owns_directory = False
+
+    def stop_worker(self):
+	"""Stops the background thread, after it's done with its tasks.
+	"""
+	if self.tasks is not None:
+	    self.tasks.put(None)
+	    self.worker.join()
+	    self.tasks = None
+
+    def save(self, i, block):
+	"""Saves the block at index `i` to disk.
+	"""
+	save_block(block, self.get_path(i))
+
+    def load(self, i, in_memory=False):
+	"""Loads the block at index `i` from disk.
+	"""
+	return load_block(self.get_path(i), in_memory)
+
+    def clear(self):
+	"""Removes all the blocks, also from disk.
+	"""
+	self.flush()
+	for i in range(self.number_of_blocks):
+	    remove_block(self.get_path(i))
+	self.number_of_blocks = 0
+	with self.lock:
+	    self.cache.clear()
+
+    def close(self):
+	"""Removes all the blocks, and the directory if it was temporary.
+
+	The background thread, if any, is stopped.
+	"""
+	self.clear()
+	self.stop_worker()
+	if self.owns_directory and os.path.isdir(self.directory):
+	    shutil.rmtree(self.directory)
+
+class CompactBlockHistory(object):
+    """The old versions of a block, kept as truncation matrices.
+
+    You use this class instead of a BlockHistory when the operators of
+    the blocks for all the lengths don't fit in memory, and you don't
+    mind to recalculate some of them. For each length, only the
+    truncation matrix and the operators without a recipe (see
+    :attr:`Block.recipes`), as the block Hamiltonian, are kept. When you
+    get a block, the other operators are rebuilt replaying the
+    transformations: each one is the tensor product of an operator of
+    the previous block and one of the single site, transformed with the
+    truncation matrix. The rebuilt operators are pending (see
+    :class:`PendingOperator`), so only the ones you use are calculated.
+
+    The last `cache_size` blocks you got are kept in memory, with the
+    operators already rebuilt.
+
+    Parameters
+    ----------
+    site : a Site.
+        The single site added to the block at each step.
+    cache_size : an int (optional).
+        The number of rebuilt blocks kept in memory.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from dmrg101.core.block import make_block_from_site
+    >>> from dmrg101.core.block_history import CompactBlockHistory
+    >>> from dmrg101.core.make_tensor import make_tensor
+    >>> from dmrg101.core.sites import SpinOneHalfSite
+    >>> from dmrg101.core.system import make_updated_block_for_site
+    >>> site = SpinOneHalfSite()
+    >>> history = CompactBlockHistory(site)
+    >>> history.append(make_block_from_site(site))
+    >>> # a block with two sites, keeping all the states
+    >>> s_z = make_tensor(np.eye(2), site.operators['s_z'])
+    >>> new_block = make_updated_block_for_site(np.eye(4), {'s_z': s_z})
+    >>> new_block.recipes['s_z'] = ('id', 's_z')
+    >>> history.append(new_block)
+    >>> # only the truncation matrix is kept, and 's_z' is rebuilt
+    >>> print history.entries[1]['names']
+    []
+    >>> print np.allclose(history[1].operators['s_z'], s_z)
+    True
+    """
+    def __init__(self, site, cache_size=2):
+	super(CompactBlockHistory, self).__init__()
+	if cache_size < 1:
+	    raise DMRGException("The cache must hold at least one block")
+	self.site = site
+	self.cache_size = cache_size
+	self.entries = []
+	self.cache = OrderedDict()
+
+    def __len__(self):
+	return len(self.entries)
+
+    def __getitem__(self, i):
+	if i < 0:
+	    i += len(self.entries)
+	if i < 0 or i >= len(self.entries):
+	    raise IndexError("No block with that size in the history")
+	entry = self.entries[i]
+	if isinstance(entry, Block):
+	    return entry
+	block = self.cache.pop(i, None)
+	if block is None:
+	    block = self.rebuild(i)
+	self.cache[i] = block
+	while len(self.cache) > self.cache_size:
+	    self.cache.popitem(last=False)
+	return block
+
+    def __iter__(self):
+	for i in range(len(self.entries)):
+	    yield self[i]
+
+    def append(self, block):
+	"""Keeps what's needed to rebuild a block.
+
+	The blocks not made by a DMRG transformation (as the ones made from
+	a single site) are kept whole.
+
+	Parameters
+	----------
+	block : a Block.
+	    The block.
+	"""
+	if block.transformation_matrix is None:
+	    self.entries.append(block)
+	    return
+	operators = block.operators
+	recipes = dict((name, recipe) for name, recipe in block.recipes.items()
+		       if name in operators.index)
+	names = [name for name in operators.names
+		 if name != 'id' and name not in recipes]
+	stack = np.array([operators[name] for name in names])
+	self.entries.append({'transformation_matrix': 
+		                 block.transformation_matrix,
+			     'names': names,
+			     'stack': stack,
+			     'recipes': recipes,
+			     'adjoints': dict(operators.adjoints)})
+
+    def rebuild(self, i):
+	"""Rebuilds the block at index `i`.
+	"""
+	entry = self.entries[i]
+	transformation_matrix = entry['transformation_matrix']
+	block = Block(transformation_matrix.shape[1])
+	block.transformation_matrix = transformation_matrix
+	block.recipes = dict(entry['recipes'])
+	block.number_of_sites = i + 1
+	for name, matrix in zip(entry['names'], entry['stack']):
+	    block.operators[name] = matrix
+	for name, (block_op, site_op) in entry['recipes'].items():
+	    block.operators.add_pending(name, PendingOperator(
+		self.make_recipe(i, block_op, site_op), transformation_matrix))
+	for name, adjoint_of in entry['adjoints'].items():
+	    block.operators.add_adjoint(name, adjoint_of)
+	return block
+
+    def make_recipe(self, i, block_op, site_op):
+	"""Makes a recipe for an operator of the block at index `i`.
+
+	The previous block is got only when the recipe is used, and not at
+	all if the operator of the block is the identity.
+	"""
+	site_matrix = self.site.operators[site_op]
+	previous_dim = (self.entries[i]['transformation_matrix'].shape[0] /
+		        self.site.dim)
+	def make_matrix():
+	    if block_op == 'id':
+		block_matrix = np.eye(previous_dim)
+	    else:
+		block_matrix = self[i-1].operators[block_op]
+	    return make_tensor(block_matrix, site_matrix)
+	return make_matrix
+
+    def prefetch(self, i):
+	"""Does nothing, as the blocks are rebuilt when you get them.
+	"""
+	pass
+
+    def clear(self):
+	"""Removes all the blocks.
+	"""
+	self.entries = []
+	self.cache.clear()
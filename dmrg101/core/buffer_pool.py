@@ -0,0 +1,184 @@
+#
+# File: buffer_pool.py
+# Author: Ivan Gonzalez
+#
+""" A module to reuse the memory of the temporary matrices.
+"""
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# the default limit for the memory of the free arrays in a pool
+DEFAULT_MAX_BYTES = 512 * 1024**2
+
+class BufferPool(object):
+    """A pool of arrays to reuse, keyed by shape and type.
+
+    You use this class to avoid allocating and freeing over and over
+    arrays of the same shape, as the temporary matrices made in each DMRG
+    step. As the finite sweeps go through the same sizes of the blocks
+    again and again, most of the arrays you get from the pool were used
+    before, and no memory is allocated. Besides saving the time spent by
+    the allocator (and the page faults for the new memory), the memory
+    does not get fragmented in long runs.
+
+    You get an array with :meth:`get`, which is full of garbage, or with
+    :meth:`get_zeros`, and give it back with :meth:`release` when you are
+    done with it. After releasing an array you *must not* use it anymore,
+    as someone else may get it. Only arrays owning their memory are kept,
+    i.e. views or memory-mapped arrays are ignored.
+
+    The memory kept by the free arrays is limited by `max_bytes`. When
+    an array released does not fit, the free arrays with the shapes
+    used least recently are dropped to make room, so the arrays of the
+    first DMRG steps don't stay in the pool for the whole run.
+
+    The pool is safe to use from several threads.
+
+    Parameters
+    ----------
+    max_arrays_per_shape : an int (optional).
+        The maximum number of free arrays of each shape and type kept in
+	the pool.
+    max_bytes : an int (optional).
+        The maximum number of bytes used by the free arrays in the pool,
+	by default `DEFAULT_MAX_BYTES`. If None, there is no limit.
+
+    Examples
+    --------
+    >>> from dmrg101.core.buffer_pool import BufferPool
+    >>> pool = BufferPool()
+    >>> a = pool.get((2, 2))
+    >>> pool.release(a)
+    >>> b = pool.get((2, 2))
+    >>> print b is a, pool.stats['hits'], pool.stats['misses']
+    True 1 1
+    """
+    def __init__(self, max_arrays_per_shape=32, max_bytes=DEFAULT_MAX_BYTES):
+	super(BufferPool, self).__init__()
+	self.max_arrays_per_shape = max_arrays_per_shape
+	self.max_bytes = max_bytes
+	self.free_arrays = OrderedDict()
+	self.bytes_kept = 0
+	self.lock = threading.Lock()
+	self.stats = dict.fromkeys(('hits', 'misses', 'released', 'dropped'), 0)
+
+    def get(self, shape, dtype='double'):
+	"""Gets an array from the pool, full of garbage.
+
+	Parameters
+	----------
+	shape : a tuple of ints.
+	    The shape of the array.
+	dtype : a numpy dtype (optional).
+	    The type of the elements.
+
+	Returns
+	-------
+	result : a numpy array.
+	    An array with this shape and type. If there is no free one in
+	    the pool, a new one is allocated.
+	"""
+	key = (tuple(shape), np.dtype(dtype))
+	with self.lock:
+	    free_arrays = self.get_free_arrays(key)
+	    if free_arrays:
+		result = free_arrays.pop()
+		self.bytes_kept -= result.nbytes
+		self.stats['hits'] += 1
+		return result
+	    self.stats['misses'] += 1
+	return np.empty(key[0], key[1])
+
+    def get_zeros(self, shape, dtype='double'):
+	"""Gets an array from the pool, full of zeros.
+	"""
+	result = self.get(shape, dtype)
+	result.fill(0)
+	return result
+
+    def release(self, array):
+	"""Gives back an array to the pool.
+
+	If the pool is full, the array is dropped, and its memory freed as
+	usual.
+
+	Parameters
+	----------
+	array : a numpy array.
+	    The array. It's ignored if it doesn't own its memory.
+	"""
+	if (not isinstance(array, np.ndarray) or isinstance(array, np.memmap)
+	    or not array.flags.owndata or not array.flags.writeable):
+	    return
+	key = (array.shape, array.dtype)
+	with self.lock:
+	    free_arrays = self.get_free_arrays(key)
+	    if any(free_array is array for free_array in free_arrays):
+		return
+	    if (len(free_arrays) >= self.max_arrays_per_shape or
+		(self.max_bytes is not None and array.nbytes > self.max_bytes)):
+		self.stats['dropped'] += 1
+		return
+	    self.make_room(array.nbytes)
+	    # making room may drop the list of this shape too
+	    self.get_free_arrays(key).append(array)
+	    self.bytes_kept += array.nbytes
+	    self.stats['released'] += 1
+
+    def get_free_arrays(self, key):
+	"""Gets the list of free arrays for a shape and type.
+
+	The shape becomes the one used most recently. You call this
+	function holding the lock.
+	"""
+	free_arrays = self.free_arrays.pop(key, [])
+	self.free_arrays[key] = free_arrays
+	return free_arrays
+
+    def make_room(self, nbytes):
+	"""Drops free arrays until there is room for `nbytes` more bytes.
+
+	The arrays of the shapes used least recently are dropped first.
+	You call this function holding the lock.
+	"""
+	if self.max_bytes is None:
+	    return
+	while self.bytes_kept + nbytes > self.max_bytes:
+	    key, free_arrays = next(self.free_arrays.iteritems())
+	    if free_arrays:
+		self.bytes_kept -= free_arrays.pop(0).nbytes
+		self.stats['dropped'] += 1
+	    if not free_arrays:
+		del self.free_arrays[key]
+
+    def release_all(self, arrays):
+	"""Gives back a few arrays to the pool.
+	"""
+	for array in arrays:
+	    self.release(array)
+
+    def clear(self):
+	"""Frees all the arrays in the pool.
+	"""
+	with self.lock:
+	    self.free_arrays.clear()
+	    self.bytes_kept = 0
+
+_buffer_pool = BufferPool()
+
+def get_buffer_pool():
+    """Gets the buffer pool shared by the numerical routines.
+
+    You use this function to get the pool used by default for the
+    temporary matrices in the DMRG steps and the Lanczos vectors. You can
+    change its limits, or look at its stats, e.g. to see how many arrays
+    were reused. Its free arrays use at most `DEFAULT_MAX_BYTES`, unless
+    you change its `max_bytes`.
+
+    Returns
+    -------
+    result : a BufferPool.
+        The pool.
+    """
+    return _buffer_pool
@@ -0,0 +1,163 @@
+#
+# File: checkpoint.py
+# Author: Ivan Gonzalez
+#
+""" A module to save a system in the middle of a DMRG run and resume it.
+"""
+import json
+import os
+import shutil
+import numpy as np
+from dmrg101.core.block_history import save_block, load_block
+from dmrg101.core.dmrg_exceptions import DMRGException
+from dmrg101.core.system import System
+from dmrg101.core.wavefunction import Wavefunction
+
+CHECKPOINT_VERSION = 1
+
+def save_checkpoint(system, directory):
+    """Saves the state of a system to a directory.
+
+    You use this function between two DMRG steps to save everything you
+    need to resume the calculation: the blocks, the old versions of the
+    blocks, which side is growing, the size of the left block in the
+    last step, and the last ground state. Each block goes to a few
+    `.npy` files, and the rest to a small JSON manifest.
+
+    The checkpoint is written to a temporary directory, which replaces
+    the old checkpoint (if any) only when everything is written, so you
+    never end up with a broken checkpoint if the job is killed while
+    saving. You can save to the directory you resumed the system from.
+
+    Parameters
+    ----------
+    system : a System.
+        The system.
+    directory : a string.
+        The directory for the checkpoint.
+
+    Notes
+    -----
+    The model and the single sites are not saved. You give them again
+    when you load the checkpoint.
+    """
+    directory = os.path.abspath(directory)
+    new_directory = directory + '.new'
+    if os.path.exists(new_directory):
+	shutil.rmtree(new_directory)
+    os.makedirs(new_directory)
+    save_block(system.left_block, os.path.join(new_directory, 'left_block'))
+    save_block(system.right_block, os.path.join(new_directory, 'right_block'))
+    for side, history in (('left', system.old_left_blocks),
+	                  ('right', system.old_right_blocks)):
+	for i, block in enumerate(history):
+	    save_block(block, os.path.join(new_directory,
+		                           'old_%s_block_%d' % (side, i)))
+    has_wf = system.ground_state_wf is not None
+    if has_wf:
+	np.save(os.path.join(new_directory, 'ground_state_wf.npy'),
+		system.ground_state_wf.as_matrix)
+    manifest = {'version': CHECKPOINT_VERSION,
+	        'growing_side': system.growing_side,
+	        'number_of_sites': system.number_of_sites,
+		'left_block_size': system.left_block_size,
+		'lazy_renormalization': system.lazy_renormalization,
+		'number_of_threads': system.number_of_threads,
+		'number_of_processes': system.number_of_processes,
+		'number_of_old_left_blocks': len(system.old_left_blocks),
+		'number_of_old_right_blocks': len(system.old_right_blocks),
+		'ground_state_energy': system.ground_state_energy,
+		'has_ground_state_wf': has_wf}
+    with open(os.path.join(new_directory, 'manifest.json'), 'w') as f:
+	json.dump(manifest, f)
+    # swap the directories: renaming is atomic, and removing the files of
+    # the old checkpoint is fine even if they are memory-mapped.
+    old_directory = directory + '.old'
+    if os.path.exists(directory):
+	if os.path.exists(old_directory):
+	    shutil.rmtree(old_directory)
+	os.rename(directory, old_directory)
+    os.rename(new_directory, directory)
+    if os.path.exists(old_directory):
+	shutil.rmtree(old_directory)
+
+def load_checkpoint(directory, left_site, right_site=None, model=None):
+    """Makes a system from a checkpoint.
+
+    You use this function to resume a DMRG calculation saved with
+    :func:`save_checkpoint`. The operators of the blocks are
+    memory-mapped, so nothing is read from disk until it's used, and
+    loading a checkpoint takes about no time. The blocks are read-only:
+    if the system changes their operators, they are copied first (see
+    :meth:`OperatorBank.snapshot`), and the checkpoint is never changed.
+
+    Parameters
+    ----------
+    directory : a string.
+        The directory with the checkpoint.
+    left_site : a Site object.
+        The site you used as a single site at the left.
+    right_site : a Site object (optional).
+        The site you used as a single site at the right.
+    model : a model object (optional).
+        The model for the system.
+
+    Returns
+    -------
+    result : a System.
+        The system, ready for the next DMRG step. The size of the left
+	block in the last step is `result.left_block_size`.
+
+    Raises
+    ------
+    DMRGException
+        if the checkpoint was made with a different version.
+
+    Examples
+    --------
+    >>> import shutil, tempfile
+    >>> from dmrg101.core.checkpoint import save_checkpoint, load_checkpoint
+    >>> from dmrg101.core.sites import SpinOneHalfSite
+    >>> from dmrg101.core.system import System
+    >>> from dmrg101.utils.models.heisenberg_model import HeisenbergModel
+    >>> system = System(SpinOneHalfSite())
+    >>> system.model = HeisenbergModel()
+    >>> system.number_of_sites = 8
+    >>> energy, entropy, error = system.infinite_dmrg_step(1, 8)
+    >>> directory = tempfile.mkdtemp()
+    >>> save_checkpoint(system, directory)
+    >>> resumed = load_checkpoint(directory, SpinOneHalfSite(),
+    ...                           model=HeisenbergModel())
+    >>> print resumed.left_block_size, resumed.left_block.dim
+    1 4
+    >>> energy, entropy, error = resumed.infinite_dmrg_step(2, 8)
+    >>> shutil.rmtree(directory)
+    """
+    with open(os.path.join(directory, 'manifest.json')) as f:
+	manifest = json.load(f)
+    if manifest['version'] != CHECKPOINT_VERSION:
+	raise DMRGException("Cannot read this checkpoint version")
+    left_block = load_block(os.path.join(directory, 'left_block'))
+    right_block = load_block(os.path.join(directory, 'right_block'))
+    result = System(left_site, right_site, left_block, right_block)
+    for side, history in (('left', result.old_left_blocks),
+	                  ('right', result.old_right_blocks)):
+	number_of_blocks = manifest['number_of_old_%s_blocks' % side]
+	for i in range(number_of_blocks):
+	    history.append(load_block(os.path.join(directory,
+		                      'old_%s_block_%d' % (side, i))))
+    result.set_growing_side(str(manifest['growing_side']))
+    result.number_of_sites = manifest['number_of_sites']
+    result.left_block_size = manifest['left_block_size']
+    result.lazy_renormalization = manifest['lazy_renormalization']
+    result.number_of_threads = manifest['number_of_threads']
+    result.number_of_processes = manifest.get('number_of_processes', 1)
+    result.ground_state_energy = manifest['ground_state_energy']
+    if manifest['has_ground_state_wf']:
+	as_matrix = np.load(os.path.join(directory, 'ground_state_wf.npy'))
+	wf = Wavefunction(as_matrix.shape[0], as_matrix.shape[1],
+		          as_matrix.dtype)
+	wf.as_matrix = as_matrix
+	result.ground_state_wf = wf
+    result.model = model
+    return result
@@ -0,0 +1,368 @@
+#
+# File: distributed_operator.py
+# Author: Ivan Gonzalez
+#
+""" A module to apply operators in several processes.
+"""
+import multiprocessing
+import shutil
+import numpy as np
+from dmrg101.core.dmrg_exceptions import DMRGException
+from dmrg101.core.operators import Operator, CompositeOperator
+from dmrg101.core.shared_memory import make_shared_array
+from dmrg101.core.shared_memory import make_shared_memory_directory
+from dmrg101.core.thread_pools import split_in_chunks
+from dmrg101.core.thread_pools import limit_blas_threads
+from dmrg101.core.thread_pools import get_blas_threads_per_worker
+from dmrg101.core.wavefunction import Wavefunction
+
+def get_operators(hamiltonian):
+    """Gets the operators of a composite, including the ones in composites.
+
+    Raises
+    ------
+    DMRGException
+        if some component is not an Operator or a CompositeOperator.
+    """
+    result = []
+    for component in hamiltonian.list_of_components:
+	if isinstance(component, CompositeOperator):
+	    result += get_operators(component)
+	elif isinstance(component, Operator):
+	    result.append(component)
+	else:
+	    raise DMRGException("Cannot distribute this operator")
+    return result
+
+def is_identity(matrix):
+    """Finds out whether a matrix is the identity.
+    """
+    matrix = np.asarray(matrix)
+    return (matrix.ndim == 2 and matrix.shape[0] == matrix.shape[1] and
+	    np.count_nonzero(matrix) == matrix.shape[0] and
+	    bool(np.all(matrix.diagonal() == 1)))
+
+class SharedTerms(object):
+    """The terms of an operator, in shared memory.
+
+    You use this class to send an operator to the processes applying it.
+    The terms are stored once, as few matrices as possible:
+
+    - the terms with the identity on both sides, as a number,
+    - the terms with the identity on the right, as a single left
+      operator, `left_sum`, and the ones with the identity on the left
+      as a single right operator, `right_sum`, so the identities are not
+      stored, nor multiplied,
+    - the other terms, grouped by their left operator, as a stack of
+      left operators, `left_ops`, and a stack with the sum of the right
+      operators for each one, `right_ops`.
+
+    The wavefunction and the result are shared arrays too. As all of
+    them are :class:`SharedArray`, only their file names are pickled.
+
+    Parameters
+    ----------
+    operators : a list of Operators.
+        The terms of the operator.
+    left_dim : an int.
+        The dimension of the left operators.
+    right_dim : an int.
+        The dimension of the right operators.
+    dtype : a numpy dtype.
+        The type of the elements.
+    directory : a string.
+        The directory for the shared arrays.
+    """
+    def __init__(self, operators, left_dim, right_dim, dtype, directory):
+	super(SharedTerms, self).__init__()
+	self.identity_parameter = 0.0
+	sums = {}
+	groups = []
+	positions = {}
+	for operator in operators:
+	    left_is_identity = is_identity(operator.left_op)
+	    right_is_identity = is_identity(operator.right_op)
+	    if left_is_identity and right_is_identity:
+		self.identity_parameter += operator.parameter
+	    elif right_is_identity:
+		sums.setdefault('left', []).append(operator)
+	    elif left_is_identity:
+		sums.setdefault('right', []).append(operator)
+	    elif id(operator.left_op) not in positions:
+		positions[id(operator.left_op)] = len(groups)
+		groups.append([operator])
+	    else:
+		groups[positions[id(operator.left_op)]].append(operator)
+	self.left_sum = None
+	if 'left' in sums:
+	    self.left_sum = make_shared_array((left_dim, left_dim), dtype,
+		                              directory)
+	    for operator in sums['left']:
+		self.left_sum += operator.parameter * operator.left_op
+	self.right_sum = None
+	if 'right' in sums:
+	    self.right_sum = make_shared_array((right_dim, right_dim), dtype,
+		                               directory)
+	    for operator in sums['right']:
+		self.right_sum += operator.parameter * operator.right_op
+	self.left_ops = make_shared_array((len(groups), left_dim, left_dim),
+		                          dtype, directory)
+	self.right_ops = make_shared_array((len(groups), right_dim,
+		                            right_dim), dtype, directory)
+	for i, group in enumerate(groups):
+	    self.left_ops[i] = group[0].left_op
+	    for operator in group:
+		self.right_ops[i] += operator.parameter * operator.right_op
+	self.wf = make_shared_array((left_dim, right_dim), dtype, directory)
+	self.result = make_shared_array((left_dim, right_dim), dtype,
+		                        directory)
+
+    def apply_to_rows(self, rows):
+	"""Calculates some rows of the result.
+
+	Parameters
+	----------
+	rows : a tuple of two ints.
+	    The first and (one past) the last row.
+	"""
+	begin, end = rows
+	if begin == end:
+	    return
+	wf = self.wf
+	rows_of_result = self.result[begin:end]
+	rows_of_result[...] = self.identity_parameter * wf[begin:end]
+	if self.left_sum is not None:
+	    rows_of_result += np.dot(self.left_sum[begin:end], wf)
+	if self.right_sum is not None:
+	    rows_of_result += np.dot(wf[begin:end], self.right_sum.transpose())
+	for left_op, right_op in zip(self.left_ops, self.right_ops):
+	    rows_of_result += np.dot(np.dot(left_op[begin:end], wf),
+		                     right_op.transpose())
+
+def serve_rows(connection, number_of_blas_threads):
+    """Applies operators to the rows of a wavefunction, when asked.
+
+    This is what the processes do. There are three kinds of messages
+    received through the `connection`:
+
+    - the terms of a new operator (see :class:`SharedTerms`), and the
+      rows from `rows[0]` to `rows[1]` of the result the process
+      calculates,
+    - True, to calculate the rows of the result,
+    - None, to end the process.
+
+    For each one but the last, a message is sent back, with None if
+    everything is fine, or the error message otherwise.
+    """
+    terms = None
+    rows = None
+    with limit_blas_threads(number_of_blas_threads):
+	while True:
+	    message = connection.recv()
+	    if message is None:
+		break
+	    try:
+		if message is True:
+		    terms.apply_to_rows(rows)
+		else:
+		    terms, rows = message
+		connection.send(None)
+	    except Exception as e:
+		connection.send(str(e))
+    connection.close()
+
+class DistributedOperator(object):
+    """An operator applied in several processes.
+
+    You use this class when a single process is not enough to apply a
+    large hamiltonian fast, as the matrix products are limited by the
+    memory bandwidth. The rows of the wavefunction (i.e. the states of
+    the left block and site) are split among a few processes, each of
+    them calculating its rows of the result. The terms and the
+    wavefunctions are in shared memory (see :class:`SharedTerms`), and
+    each process reads only its rows of the left operators, so nothing
+    is copied to the processes.
+
+    The distributed operator has `apply` and `apply_into`, as a
+    CompositeOperator, so you can calculate the ground state with it
+    (see :func:`lanczos.calculate_ground_state`.) The processes keep
+    running until you call :meth:`close`, or use the operator in a
+    `with` block, so you can use them for the hamiltonian of the next
+    DMRG step too (see :meth:`set_operator`.)
+
+    Parameters
+    ----------
+    hamiltonian : a CompositeOperator.
+        The operator. Its terms are copied to the shared memory, so you
+	can get rid of it afterwards.
+    number_of_processes : an int.
+        The number of processes.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from dmrg101.core.distributed_operator import DistributedOperator
+    >>> from dmrg101.core.operators import CompositeOperator
+    >>> from dmrg101.core.wavefunction import Wavefunction
+    >>> twice = CompositeOperator(2, 2)
+    >>> twice.add(np.eye(2, 2), np.eye(2, 2))
+    >>> twice.add(np.eye(2, 2), np.eye(2, 2))
+    >>> wf = Wavefunction(2, 2)
+    >>> wf.randomize()
+    >>> with DistributedOperator(twice, 2) as distributed_twice:
+    ...     new_wf = distributed_twice.apply(wf)
+    >>> np.allclose(new_wf.as_matrix, 2 * wf.as_matrix)
+    True
+    """
+    def __init__(self, hamiltonian, number_of_processes):
+	super(DistributedOperator, self).__init__()
+	self.connections = []
+	self.processes = []
+	self.terms = None
+	if not get_operators(hamiltonian):
+	    raise DMRGException("Composite operator is empty.")
+	number_of_blas_threads = get_blas_threads_per_worker(
+		number_of_processes)
+	for i in range(number_of_processes):
+	    connection, other_end = multiprocessing.Pipe()
+	    process = multiprocessing.Process(target=serve_rows,
+		    args=(other_end, number_of_blas_threads))
+	    process.daemon = True
+	    process.start()
+	    other_end.close()
+	    self.connections.append(connection)
+	    self.processes.append(process)
+	self.number_of_processes = number_of_processes
+	self.set_operator(hamiltonian)
+
+    def set_operator(self, hamiltonian):
+	"""Sets the operator the processes apply.
+
+	You use this function to apply another operator, typically the
+	hamiltonian of the next DMRG step, with the same processes. The
+	shared memory of the old operator is released.
+
+	Parameters
+	----------
+	hamiltonian : a CompositeOperator.
+	    The operator.
+
+	Raises
+	------
+	DMRGException
+	    if the operator is empty, the processes were stopped, or any
+	    of them failed.
+	"""
+	if not self.processes:
+	    raise DMRGException("The processes were stopped.")
+	operators = get_operators(hamiltonian)
+	if not operators:
+	    raise DMRGException("Composite operator is empty.")
+	self.left_dim = hamiltonian.left_dim
+	self.right_dim = hamiltonian.right_dim
+	self.dtype = np.result_type(np.float64, *(
+	    [operator.left_op for operator in operators] +
+	    [operator.right_op for operator in operators] +
+	    [np.array(operator.parameter) for operator in operators]))
+	self.terms = None
+	# the files are removed once the processes have mapped them
+	directory = make_shared_memory_directory()
+	try:
+	    self.terms = SharedTerms(operators, self.left_dim, self.right_dim,
+		                     self.dtype, directory)
+	    chunks = split_in_chunks(self.left_dim, self.number_of_processes)
+	    chunks += [(self.left_dim, self.left_dim)] * (
+		    self.number_of_processes - len(chunks))
+	    for connection, rows in zip(self.connections, chunks):
+		connection.send((self.terms, rows))
+	    self.check_replies()
+	finally:
+	    shutil.rmtree(directory)
+
+    def check_replies(self):
+	"""Waits for all the processes, and raises their errors, if any.
+	"""
+	errors = [connection.recv() for connection in self.connections]
+	errors = [error for error in errors if error is not None]
+	if errors:
+	    raise DMRGException("Cannot apply the operator: " + errors[0])
+
+    def __enter__(self):
+	return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+	self.close()
+
+    def __del__(self):
+	self.close()
+
+    def close(self):
+	"""Stops the processes.
+	"""
+	for connection in self.connections:
+	    try:
+		connection.send(None)
+		connection.close()
+	    except (IOError, EOFError):
+		pass
+	for process in self.processes:
+	    process.join()
+	self.detach()
+
+    def detach(self):
+	"""Forgets the processes, without stopping them.
+
+	You use this function in a process started with `fork`, which
+	gets a copy of the operator, but the processes belong to the
+	parent process.
+	"""
+	self.connections = []
+	self.processes = []
+	self.terms = None
+
+    def apply_into(self, wf, out, workspace=None):
+	"""Applies the operator, writing the result into a wavefunction.
+
+    	Parameters
+    	----------
+    	wf : A Wavefunction
+    	    The wavefunction you want to apply the operator.
+	out : A Wavefunction
+	    The wavefunction where the result is written.
+	workspace : a numpy array of ndim = 2 (optional).
+	    Not used.
+
+    	Raises
+    	------
+    	DMRGException
+	    if `wf` or `out` have not the correct dimensions as a matrix,
+	    the processes were stopped, or any of them failed.
+	"""
+        if wf.as_matrix.shape != ((self.left_dim, self.right_dim)):
+     	    raise DMRGException("Wavefunction does not fit.")
+	if out.as_matrix.shape != wf.as_matrix.shape:
+     	    raise DMRGException("Output wavefunction does not fit.")
+	if not self.processes:
+     	    raise DMRGException("The processes were stopped.")
+	self.terms.wf[...] = wf.as_matrix
+	for connection in self.connections:
+	    connection.send(True)
+	self.check_replies()
+	out.as_matrix[...] = self.terms.result
+
+    def apply(self, wf):
+	"""Applies the operator to a wavefunction.
+
+    	Parameters
+    	----------
+    	wf : A Wavefunction
+    	    The wavefunction you want to apply the operator.
+
+	Returns
+	-------
+	result : a Wavefunction.
+	    The result.
+	"""
+	result = Wavefunction(self.left_dim, self.right_dim, self.dtype)
+	self.apply_into(wf, result)
+	return result
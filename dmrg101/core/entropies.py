@@ -6,7 +6,7 @@
 """
 from math import log
 from sys import float_info
-from numpy import vectorize, power
+from numpy import vectorize, power, where, log as elementwise_log
 
 def calculate_xlogx(x, epsilon):
     """Calculates :math:`x\log x` of the argument
@@ -130,3 +130,34 @@ def calculate_renyi(reduced_density_matrix_evals, n=2):
         result = log(sum(power(reduced_density_matrix_evals, n)))
 	result /= (1.0-n)
     return result
+
+def calculate_entropies(reduced_density_matrix_evals):
+    """Calculates the Von Neumann entanglement entropies for a batch.
+
+    You use this function as :func:`calculate_entropy`, when you have
+    the eigenvalues of several reduced density matrices, one set in each
+    row.
+
+    Parameters
+    ----------
+    reduced_density_matrix_evals : an numpy array with ndim = 2.
+        The eigenvalues (or some of them) of each reduced density matrix.
+
+    Returns
+    -------
+    result : a numpy array with ndim = 1.
+        The value of each entropy.
+
+    Examples
+    --------
+    >>> from dmrg101.core.entropies import calculate_entropies
+    >>> import numpy as np
+    >>> reduced_DM_evals = np.array([[0.5, 0.5], [1.0, 0.0]])
+    >>> print calculate_entropies(reduced_DM_evals)
+    [ 0.69314718  0.        ]
+    """
+    x = reduced_density_matrix_evals
+    big_enough = x > float_info.epsilon
+    xlogx = where(big_enough, x * elementwise_log(where(big_enough, x, 1.0)),
+	          0.0)
+    return 0.0 - xlogx.sum(axis=-1)
@@ -0,0 +1,182 @@
+#
+# File: interaction_graph.py
+# Author: Ivan Gonzalez
+#
+""" A module to describe which operators of a model interact.
+"""
+from dmrg101.core.dmrg_exceptions import DMRGException
+
+class InteractionGraph(object):
+    """The graph of interactions of a model.
+
+    You use this class to declare which terms of the Hamiltonian connect
+    the sites of the chain, and which operators of the blocks act on
+    which site. With that, the system can figure out which operators of
+    a block are needed in future terms of the Hamiltonian, and which ones
+    can be dropped because all their partners are already inside the
+    block.
+
+    The interactions are bonds between an operator acting on a site at
+    the left, and an operator acting on a site at its right, at a given
+    distance. If the bond is not everywhere in the chain (as in a ladder
+    mapped to a chain, or in a chain with some missing bonds), you can
+    give the positions of the left sites of the bond. The sites are
+    numbered from 0 (the leftmost) to `number_of_sites` - 1.
+
+    The block operators are labelled by the single site operator they are
+    made of, and the distance to the edge of the block of the site they
+    act on: 0 is the last site added to the block, 1 the one before, and
+    so on. Operators of the block not declared here (as the block
+    Hamiltonian or the on-site terms) are always kept.
+
+    Examples
+    --------
+    >>> from dmrg101.core.interaction_graph import InteractionGraph
+    >>> # a two-leg ladder, zig-zag mapped onto a chain: Ising rungs join
+    >>> # the sites (0, 1), (2, 3),..., and XY legs join the sites at
+    >>> # distance 2
+    >>> ladder = InteractionGraph()
+    >>> ladder.add_bond('s_z', 's_z', 1, range(0, 100, 2))
+    >>> ladder.add_bond('s_p', 's_m', 2)
+    >>> ladder.add_bond('s_m', 's_p', 2)
+    >>> ladder.add_block_operator('s_z', 's_z', 0)
+    >>> ladder.add_block_operator('s_p_prev', 's_p', 1)
+    >>> # the last site of a left block with 3 sites is site 2, and its
+    >>> # rung partner is outside the block...
+    >>> print ladder.is_needed('s_z', 'left', 3, 100)
+    True
+    >>> # ...but the last site of a block with 4 sites is site 3, and its
+    >>> # rung partner is already inside.
+    >>> print ladder.is_needed('s_z', 'left', 4, 100)
+    False
+    >>> # the site before the edge still has a leg partner outside
+    >>> print ladder.is_needed('s_p_prev', 'left', 4, 100)
+    True
+    """
+    def __init__(self):
+	super(InteractionGraph, self).__init__()
+	self.bonds = []
+	self.block_operators = {}
+
+    def add_bond(self, left_op, right_op, distance=1, positions=None):
+	"""Adds an interaction between two sites.
+
+	Parameters
+	----------
+	left_op : a string.
+	    The name of the single site operator acting on the left site.
+	right_op : a string.
+	    The name of the single site operator acting on the right site.
+	distance : an int (optional).
+	    The distance between the sites.
+	positions : a list of ints (optional).
+	    The positions of the left site of the bond. If None, the bond
+	    is everywhere.
+
+	Raises
+	------
+	DMRGException
+	    if `distance` is not positive.
+	"""
+	if distance < 1:
+	    raise DMRGException("Bonds must join different sites")
+	if positions is not None:
+	    positions = frozenset(positions)
+	self.bonds.append((left_op, right_op, distance, positions))
+
+    def add_block_operator(self, name, site_op, distance_to_edge=0):
+	"""Declares which site a block operator acts on.
+
+	Parameters
+	----------
+	name : a string.
+	    The name of the operator in the block.
+	site_op : a string.
+	    The name of the single site operator.
+	distance_to_edge : an int (optional).
+	    The distance from the site the operator acts on to the edge of
+	    the block, i.e. 0 is the last site added to the block.
+	"""
+	self.block_operators[name] = (site_op, distance_to_edge)
+
+    def is_needed(self, name, side, block_size, number_of_sites):
+	"""Finds out whether a block operator is needed in future terms.
+
+	An operator is needed if it is part of a bond whose other site is
+	outside the block, i.e. in the single sites or the other block.
+
+	Parameters
+	----------
+	name : a string.
+	    The name of the operator in the block.
+	side : a string.
+	    Which side, left or right, the block is.
+	block_size : an int.
+	    The number of sites of the block.
+	number_of_sites : an int.
+	    The number of sites of the whole chain.
+
+	Returns
+	-------
+	result : a bool.
+	    Whether the operator is needed. Operators not declared are
+	    always needed.
+
+	Raises
+	------
+	DMRGException
+	    if `side` is not 'left' or 'right'.
+	"""
+	if side not in ('left', 'right'):
+	    raise DMRGException("Bad side")
+	if name not in self.block_operators:
+	    return True
+	site_op, distance_to_edge = self.block_operators[name]
+	if distance_to_edge >= block_size:
+	    return False
+	if side == 'left':
+	    position = block_size - 1 - distance_to_edge
+	else:
+	    position = number_of_sites - block_size + distance_to_edge
+	for left_op, right_op, distance, positions in self.bonds:
+	    if distance <= distance_to_edge:
+		continue
+	    if side == 'left' and left_op == site_op:
+		partner = position + distance
+		left_position = position
+	    elif side == 'right' and right_op == site_op:
+		partner = position - distance
+		left_position = partner
+	    else:
+		continue
+	    if partner < 0 or partner >= number_of_sites:
+		continue
+	    if positions is None or left_position in positions:
+		return True
+	return False
+
+def make_nearest_neighbour_graph(bonds, block_operators=None):
+    """Makes the graph for a model with nearest neighbour interactions.
+
+    Parameters
+    ----------
+    bonds : a list of tuples of two strings.
+        The names of the left and right operators of each bond.
+    block_operators : a list of strings (optional).
+        The operators acting on the last site of the block, named as the
+	corresponding single site operators. If None, all the operators
+	in `bonds` are used.
+
+    Returns
+    -------
+    result : an InteractionGraph.
+        The graph.
+    """
+    result = InteractionGraph()
+    for left_op, right_op in bonds:
+	result.add_bond(left_op, right_op)
+    if block_operators is None:
+	block_operators = set(op for bond in bonds for op in bond)
+    for name in block_operators:
+	result.add_block_operator(name, name)
+    return result
@@ -63,21 +63,40 @@ Examples
 .. [1] http://en.wikipedia.org/wiki/Lanczos_algorithm
 """
 import numpy as np
+from copy import copy
 from math import fabs
 from sys import float_info
-from dmrg101.core.braket import braket
+from dmrg101.core.buffer_pool import get_buffer_pool
 from dmrg101.core.dmrg_exceptions import DMRGException
 from dmrg101.core.get_real import get_real 
-from dmrg101.core.wavefunction import create_empty_like
 from dmrg101.core.wavefunction import Wavefunction
 from dmrg101.utils.tridiagonal_solver.tridiagonal_solver import tridiagonal_solver
 
+def get_lanczos_vector(wf):
+    """Gets a wavefunction like `wf`, with a matrix from the buffer pool.
+
+    The elements are garbage. You give the matrix back to the pool with
+    :func:`release_lanczos_vectors`.
+    """
+    result = copy(wf)
+    result.as_matrix = get_buffer_pool().get(wf.as_matrix.shape,
+	                                     wf.as_matrix.dtype)
+    return result
+
+def release_lanczos_vectors(lanczos_vectors):
+    """Gives back the matrices of the Lanczos vectors to the buffer pool.
+
+    The vectors kept on disk are ignored.
+    """
+    get_buffer_pool().release_all(wf.as_matrix for wf in lanczos_vectors)
+
 def create_lanczos_vectors(initial_wf):
     """Creates the three Lanczos vectors.
 
     The Lanczos vectors are created empty, but with the proper size and
     type. The first lanczos vector is set to have the same eleements as 
-    the `initial_wf`.
+    the `initial_wf`. Their matrices come from the buffer pool, see
+    :func:`get_lanczos_vector`.
 
     Parameters
     ----------
@@ -91,10 +110,10 @@ def create_lanczos_vectors(initial_wf):
 	initial_wf. The first has the same elements (is a copy), and the
 	last two are full of garbage.
     """
-    result = [create_empty_like(initial_wf), 
-	      create_empty_like(initial_wf), 
-	      create_empty_like(initial_wf)]
-    result[0].as_matrix = np.copy(initial_wf.as_matrix)
+    result = [get_lanczos_vector(initial_wf), 
+	      get_lanczos_vector(initial_wf), 
+	      get_lanczos_vector(initial_wf)]
+    result[0].as_matrix[...] = initial_wf.as_matrix
     return result
 
 def generate_tridiagonal_matrix(alpha, beta, iteration):
@@ -205,9 +224,9 @@ def lanczos_zeroth_iteration(alpha, beta, lv, hamiltonian):
     """
     if alpha and beta:
         raise DMRGException("Lists not empty at zeroth Lanczos iter")
-    lv[1] = hamiltonian.apply(lv[0])
-    alpha.append(get_real(braket(lv[0], lv[1])))
-    lv[1].as_matrix -= alpha[0]*lv[0].as_matrix
+    hamiltonian.apply_into(lv[0], lv[1])
+    alpha.append(get_real(lv[0].dot(lv[1])))
+    lv[1].axpy(-alpha[0], lv[0])
     beta.append(lv[1].get_norm())
     lv[1].normalize()
     assert(len(alpha) == 1)
@@ -216,7 +235,7 @@ def lanczos_zeroth_iteration(alpha, beta, lv, hamiltonian):
     return already_the_ground_state
 
 def lanczos_nth_iteration(alpha, beta, lv, saved_lanczos_vectors,
-		          hamiltonian, iteration):
+		          hamiltonian, iteration, directory=None):
     """Performs the n-th iteration for the Lanczos.
 
     It calculates the new values for `alpha` and `beta` for this
@@ -236,6 +255,8 @@ def lanczos_nth_iteration(alpha, beta, lv, saved_lanczos_vectors,
         The hamiltonian you want to diagonalize.
     iteration : an int
         The iteration number.
+    directory : a string (optional).
+        If not None, the directory to keep the saved Lanczos vectors.
 
     Notes
     -----
@@ -250,17 +271,17 @@ def lanczos_nth_iteration(alpha, beta, lv, saved_lanczos_vectors,
     if len(alpha) != len(beta):
         DMRGException("alpha and beta have wrong sizes")
 
-    lv[2] = hamiltonian.apply(lv[1])
-    alpha.append(get_real(braket(lv[1], lv[2])))
-    lv[2].as_matrix -= (alpha[iteration]*lv[1].as_matrix +
-    		        beta[iteration-1]*lv[0].as_matrix)
+    hamiltonian.apply_into(lv[1], lv[2])
+    alpha.append(get_real(lv[1].dot(lv[2])))
+    lv[2].axpy(-alpha[iteration], lv[1])
+    lv[2].axpy(-beta[iteration-1], lv[0])
     beta.append(lv[2].get_norm())
     lv[2].normalize()
-    cycle_lanczos_vectors(lv, saved_lanczos_vectors)
+    cycle_lanczos_vectors(lv, saved_lanczos_vectors, directory)
     assert(len(alpha) == iteration + 1)
     assert(len(beta) == iteration + 1)
 
-def cycle_lanczos_vectors(lv, saved_lanczos_vectors):
+def cycle_lanczos_vectors(lv, saved_lanczos_vectors, directory=None):
     """Cycles the Lanczos vectors to prepare them for the next iteration.
 
     You use this function to cycle the Lanczos vectors in this way:
@@ -270,7 +291,9 @@ def cycle_lanczos_vectors(lv, saved_lanczos_vectors):
 
     The first Lanczos vector before the cycle, `lv[0]` is not needed
     anymore and is appended to the `saved_lanczos_vectors` list. The last
-    Lanczos vector after the cycle, `lv[2]` contains garbage.
+    Lanczos vector after the cycle, `lv[2]` contains garbage. When the
+    saved Lanczos vectors go to disk, the memory of `lv[0]` is reused for
+    the new `lv[2]`, so nothing is allocated.
 
     Parameters
     ----------
@@ -278,9 +301,17 @@ def cycle_lanczos_vectors(lv, saved_lanczos_vectors):
         With the three Lanczos vectors in use.
     saved_lanczos_vectors : a list of Wavefunctions.
         The Lanczos vectors that are saved.
+    directory : a string (optional).
+        If not None, the saved Lanczos vectors are moved to files in this
+	directory, as they are not needed until the end.
     """
+    if directory is not None:
+	spare = copy(lv[0])
+	lv[0].move_to_disk(directory)
+    else:
+	spare = get_lanczos_vector(lv[2])
     saved_lanczos_vectors.append(lv[0])
-    lv[0], lv[1], lv[2] = lv[1], lv[2], create_empty_like(lv[2])
+    lv[0], lv[1], lv[2] = lv[1], lv[2], spare
 
 def improve_ground_state_energy(d, e, current_gs_energy, precision):
     """Gets an improved value for the ground state energy.
@@ -323,7 +354,7 @@ def improve_ground_state_energy(d, e, current_gs_energy, precision):
 def calculate_ground_state_energy(hamiltonian, initial_wf,
 				  min_lanczos_iterations, 
 				  too_many_iterations,
-				  precision):
+				  precision, directory=None):
     """Calculates the ground state energy.
 
     Parameters
@@ -340,6 +371,9 @@ def calculate_ground_state_energy(hamiltonian, initial_wf,
     precision : a double.
         The accepted precision to which the ground state energy is
 	considered not improving.
+    directory : a string (optional).
+        If not None, the saved Lanczos vectors are kept in files in this
+	directory instead of in memory.
     
     Returns
     -------
@@ -373,7 +407,7 @@ def calculate_ground_state_energy(hamiltonian, initial_wf,
     	    	raise DMRGException("Too many Lanczos iterations")
 
     	    lanczos_nth_iteration(alpha, beta, lv, saved_lanczos_vectors, 
-			          hamiltonian, iteration)
+			          hamiltonian, iteration, directory)
 
     	    if iteration >= min_lanczos_iterations:
 		d, e = generate_tridiagonal_matrix(alpha, beta, iteration)
@@ -383,6 +417,7 @@ def calculate_ground_state_energy(hamiltonian, initial_wf,
 	assert(we_are_done)
 	saved_lanczos_vectors.append(lv[1])
 	#saved_lanczos_vectors.append(lv[2])
+	release_lanczos_vectors([lv[2]])
     else: # initial_wf *is* the ground state
 	gs_energy = alpha[0]
   
@@ -408,6 +443,11 @@ def calculate_ground_state_wf(d, e, saved_lanczos_vectors):
     -------
     result : a Wavefunction.
         The ground state function (normalized).
+
+    Notes
+    -----
+    The saved Lanczos vectors are read one at a time, so they can be on
+    disk.
     """
     evals, evecs = diagonalize_tridiagonal_matrix(d, e, True)
     min_index = np.argsort(evals)[0]
@@ -427,7 +467,8 @@ def calculate_ground_state_wf(d, e, saved_lanczos_vectors):
 def calculate_ground_state(hamiltonian, initial_wf = None, 
 			   min_lanczos_iterations = 3, 
 		           too_many_iterations = 1000, 
-			   precision = 0.000001):
+			   precision = 0.000001,
+			   directory = None):
     """Calculates the ground state energy and wavefunction.
 
     Parameters
@@ -444,6 +485,10 @@ def calculate_ground_state(hamiltonian, initial_wf = None,
     precision : a double, optional.
         The accepted precision to which the ground state energy is
 	considered not improving.
+    directory : a string, optional.
+        If not None, the Lanczos vectors saved to build the ground state
+	wavefunction are kept in files in this directory, instead of in
+	memory. You use this for very large superblocks.
     
     Returns 
     -------
@@ -459,7 +504,8 @@ def calculate_ground_state(hamiltonian, initial_wf = None,
 
     gs_energy, d, e, saved_lanczos_vectors = (
         calculate_ground_state_energy(hamiltonian, initial_wf, min_lanczos_iterations, 
-		                      too_many_iterations, precision) )
+		                      too_many_iterations, precision, directory) )
     gs_wf = calculate_ground_state_wf(d, e, saved_lanczos_vectors)
+    release_lanczos_vectors(saved_lanczos_vectors)
 
     return gs_energy, gs_wf
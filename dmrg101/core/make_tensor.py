@@ -1,8 +1,9 @@
 """Makes the tensor product of matrices.
 """
 import numpy as np
+from dmrg_exceptions import DMRGException
 
-def make_tensor(small_stride_matrix, large_stride_matrix):
+def make_tensor(small_stride_matrix, large_stride_matrix, out=None):
     """Makes the tensor product of two matrices.
 
     The resulting matrix is made up multiplying the two matrices
@@ -15,8 +16,10 @@ def make_tensor(small_stride_matrix, large_stride_matrix):
         S * L_{N,1} &  S * L_{N,2} & \cdots & S * L_{N,N}\\end{pmatrix} 
 
     where :math:`S` stands for `small_stride_matrix`, 
-    :math:`L` stands for `large_stride_matrix`.
-
+    :math:`L` stands for `large_stride_matrix`, i.e. the same as
+    `np.kron(large_stride_matrix, small_stride_matrix)`. The result is
+    made with a single (broadcast) multiplication, without loops in
+    python.
     
     Parameters
     ----------
@@ -24,12 +27,20 @@ def make_tensor(small_stride_matrix, large_stride_matrix):
         The small_stride matrix for building the tensor.
     large_stride_matrix : a numpy array of ndim = 2.
         The large_stride matrix for building the tensor.
+    out : a numpy array of ndim = 2 (optional).
+        Where to put the result, e.g. an array from a buffer pool. If
+	None, a new array is created.
 
     Returns
     -------
     result : a numpy array of ndim = 2.
         The result with sizes which are the multiples of the arguments
 	sizes.
+
+    Raises
+    ------
+    DMRGException
+        if `out` has not the shape of the result.
     """
     small_stride_rows = small_stride_matrix.shape[0] 
     large_stride_rows = large_stride_matrix.shape[0]
@@ -38,13 +49,63 @@ def make_tensor(small_stride_matrix, large_stride_matrix):
     cols = small_stride_cols * large_stride_cols
     rows = small_stride_rows * large_stride_rows
 
-    result = np.empty([rows, cols])
-    for i in range(large_stride_rows):
-	ii = i * small_stride_rows
-        for j in range(large_stride_cols):
-	    jj = j * small_stride_cols
-	    result[ii : ii + small_stride_rows, 
-	           jj : jj + small_stride_cols] = (small_stride_matrix *
-				                   large_stride_matrix[i, j])
+    if out is None:
+	out = np.empty([rows, cols], np.result_type(small_stride_matrix,
+		                                    large_stride_matrix))
+    elif out.shape != (rows, cols):
+	raise DMRGException("Output matrix does not fit")
+    # the result as a 4-index array, indexed as (i, ii, j, jj) 
+    if out.flags.c_contiguous:
+	result = out.reshape(large_stride_rows, small_stride_rows,
+		             large_stride_cols, small_stride_cols)
+	np.multiply(large_stride_matrix[:, np.newaxis, :, np.newaxis],
+		    small_stride_matrix[np.newaxis, :, np.newaxis, :],
+		    out=result)
+    else:
+	out[...] = np.multiply(
+		large_stride_matrix[:, np.newaxis, :, np.newaxis],
+		small_stride_matrix[np.newaxis, :, np.newaxis, :]).reshape(rows,
+			                                                   cols)
+    return out
+
+def make_batch_tensor(small_stride_matrices, large_stride_matrix):
+    """Makes the tensor products for a batch of matrices.
+
+    You use this function as :func:`make_tensor`, when the block
+    operators of several calculations are stacked along a first index
+    (see :class:`BatchSystem`), and the site operator is the same for all
+    of them.
+
+    Parameters
+    ----------
+    small_stride_matrices : a numpy array of ndim = 3 or 2.
+        The matrices for the block, the first index labelling the
+	calculation. A matrix with ndim = 2 is the same for all of them,
+	and so is the result.
+    large_stride_matrix : a numpy array of ndim = 2.
+        The matrix for the site.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 3 or 2.
+        The tensor products.
 
-    return result
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from dmrg101.core.make_tensor import make_batch_tensor
+    >>> blocks = np.array([np.eye(2), 2 * np.eye(2)])
+    >>> result = make_batch_tensor(blocks, np.eye(3))
+    >>> print result.shape, np.allclose(result[1], 2 * np.eye(6))
+    (2, 6, 6) True
+    """
+    small_stride_matrices = np.asarray(small_stride_matrices)
+    batch_shape = small_stride_matrices.shape[:-2]
+    small_stride_rows, small_stride_cols = small_stride_matrices.shape[-2:]
+    large_stride_rows, large_stride_cols = large_stride_matrix.shape
+    result = np.multiply(
+	    large_stride_matrix[:, np.newaxis, :, np.newaxis],
+	    small_stride_matrices[..., np.newaxis, :, np.newaxis, :])
+    return result.reshape(batch_shape + 
+	                  (large_stride_rows * small_stride_rows,
+			   large_stride_cols * small_stride_cols))
@@ -0,0 +1,266 @@
+#
+# File: mps.py
+# Author: Ivan Gonzalez
+#
+""" A module for matrix product states.
+"""
+import numpy as np
+from dmrg101.core.dmrg_exceptions import DMRGException
+
+def contract_transfer_matrix(environment, bra_tensor, ket_tensor, op=None):
+    """Adds one site to the contraction of a bra and a ket.
+
+    Parameters
+    ----------
+    environment : a numpy array of ndim = 2.
+        The contraction of the sites at the left, with the bra index
+	first.
+    bra_tensor : a numpy array of ndim = 3.
+        The tensor of the bra for the site (not conjugated.)
+    ket_tensor : a numpy array of ndim = 3.
+        The tensor of the ket for the site.
+    op : a numpy array of ndim = 2 (optional).
+        An operator acting on the site. If None, the identity.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 2.
+        The contraction including the site.
+    """
+    if op is not None:
+	ket_tensor = np.tensordot(op, ket_tensor, axes=(1, 1)).transpose(1, 0, 2)
+    tmp = np.tensordot(environment, ket_tensor, axes=(1, 0))
+    return np.tensordot(bra_tensor.conj(), tmp, axes=([0, 1], [0, 1]))
+
+class MatrixProductState(object):
+    """A matrix product state.
+
+    You use this class to keep a state of a chain, as the one coming out
+    of a DMRG calculation, in a form that allows to calculate overlaps
+    and expectation values cheaply, i.e. in a time linear in the number
+    of sites.
+
+    The state is a list of tensors with ndim = 3, one per site, whose
+    indices are the left bond, the state of the site, and the right bond.
+    The first and the last bonds have dimension 1.
+
+    Parameters
+    ----------
+    tensors : a list of numpy arrays of ndim = 3.
+        The tensors for each site.
+    center : an int (optional).
+        The site of the orthogonality center, i.e. the tensors at its
+	left are left-normalized, and the ones at its right are
+	right-normalized. None if unknown.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from dmrg101.core.mps import MatrixProductState
+    >>> # the product state with all the spins up
+    >>> up = np.array([0.0, 1.0]).reshape(1, 2, 1)
+    >>> all_up = MatrixProductState([up, up, up])
+    >>> s_z = np.diag([-0.5, 0.5])
+    >>> print all_up.expectation_value({0: s_z, 2: s_z})
+    0.25
+    """
+    def __init__(self, tensors, center=None):
+	super(MatrixProductState, self).__init__()
+	for i, tensor in enumerate(tensors):
+	    if tensor.ndim != 3:
+		raise DMRGException("Tensors must have ndim = 3")
+	    if i > 0 and tensors[i-1].shape[2] != tensor.shape[0]:
+		raise DMRGException("Bond dimensions do not match")
+	self.tensors = list(tensors)
+	self.center = center
+
+    def __len__(self):
+	return len(self.tensors)
+
+    def overlap(self, other):
+	"""Calculates the overlap with another state.
+
+	Parameters
+	----------
+	other : a MatrixProductState.
+	    The other state, for the same chain.
+
+	Returns
+	-------
+	result : a double or complex.
+	    The overlap :math:`\\langle self | other \\rangle`.
+
+	Raises
+	------
+	DMRGException
+	    if the states are not for the same chain.
+	"""
+	if len(self) != len(other):
+	    raise DMRGException("States for chains of different size")
+	environment = np.ones((1, 1))
+	for bra_tensor, ket_tensor in zip(self.tensors, other.tensors):
+	    if bra_tensor.shape[1] != ket_tensor.shape[1]:
+		raise DMRGException("States for different sites")
+	    environment = contract_transfer_matrix(environment, bra_tensor,
+		                                   ket_tensor)
+	return environment[0, 0]
+
+    def norm(self):
+	"""Calculates the norm of the state.
+	"""
+	return np.sqrt(abs(self.overlap(self)))
+
+    def expectation_value(self, operators):
+	"""Calculates the expectation value of a product of operators.
+
+	You use this function to measure on-site operators, as the
+	magnetization, or correlations, as the spin-spin correlation
+	functions. The state does not need to be normalized. For fermions
+	you must include the Jordan-Wigner strings yourself.
+
+	Parameters
+	----------
+	operators : a dict of ints and numpy arrays of ndim = 2.
+	    The operators acting on each site, with the site as the key.
+	    The sites are numbered from 0, the leftmost.
+
+	Returns
+	-------
+	result : a double or complex.
+	    The expectation value.
+	"""
+	for site in operators:
+	    if site < 0 or site >= len(self):
+		raise DMRGException("No such site")
+	environment = np.ones((1, 1))
+	for site, tensor in enumerate(self.tensors):
+	    environment = contract_transfer_matrix(environment, tensor, tensor,
+		                                   operators.get(site))
+	return environment[0, 0] / self.overlap(self)
+
+    def save(self, filename):
+	"""Saves the state to a (compressed) `.npz` file.
+	"""
+	arrays = dict(('tensor_%d' % i, tensor)
+		      for i, tensor in enumerate(self.tensors))
+	arrays['center'] = np.array(-1 if self.center is None else self.center)
+	np.savez_compressed(filename, **arrays)
+
+def load_matrix_product_state(filename):
+    """Loads a state saved with :meth:`MatrixProductState.save`.
+
+    Parameters
+    ----------
+    filename : a string.
+        The name of the file.
+
+    Returns
+    -------
+    result : a MatrixProductState.
+        The state.
+    """
+    data = np.load(filename)
+    try:
+	number_of_sites = len(data.files) - 1
+	tensors = [data['tensor_%d' % i] for i in range(number_of_sites)]
+	center = int(data['center'])
+    finally:
+	data.close()
+    return MatrixProductState(tensors, None if center < 0 else center)
+
+def get_left_tensor(block, site_dim):
+    """Gets the tensor for the last site of a left block.
+
+    The tensor has indices (old block, site, new block), and it's made of
+    the truncation matrix used to make the block.
+    """
+    if block.transformation_matrix is None:
+	return np.eye(site_dim).reshape(1, site_dim, site_dim)
+    transformation_matrix = block.transformation_matrix
+    old_dim = transformation_matrix.shape[0] / site_dim
+    return transformation_matrix.reshape(site_dim, old_dim,
+	                                 block.dim).transpose(1, 0, 2)
+
+def get_right_tensor(block, site_dim):
+    """Gets the tensor for the first site of a right block.
+
+    The tensor has indices (new block, site, old block), and it's made
+    of the truncation matrix used to make the block.
+    """
+    if block.transformation_matrix is None:
+	return np.eye(site_dim).reshape(site_dim, site_dim, 1)
+    transformation_matrix = block.transformation_matrix
+    old_dim = transformation_matrix.shape[0] / site_dim
+    return transformation_matrix.reshape(site_dim, old_dim,
+	                                 block.dim).transpose(2, 0, 1)
+
+def get_blocks_of_all_sizes(block, old_blocks):
+    """Gets the blocks used to make a block, from the smallest.
+
+    Raises
+    ------
+    DMRGException
+        if the size of the block is unknown, or there are not enough
+	old blocks.
+    """
+    if block.number_of_sites is None:
+	raise DMRGException("Unknown size of the block")
+    if len(old_blocks) < block.number_of_sites - 1:
+	raise DMRGException("Old blocks missing")
+    return ([old_blocks[i] for i in range(block.number_of_sites - 1)] +
+	    [block])
+
+def make_matrix_product_state(system, wf):
+    """Makes a matrix product state out of a DMRG system.
+
+    You use this function to keep the state of a DMRG calculation. The
+    tensors for the sites in the blocks are the truncation matrices used
+    to make the blocks (and their old versions), and the tensors for
+    the single sites are made from the wavefunction using a singular
+    value decomposition. The orthogonality center is the right single
+    site.
+
+    Parameters
+    ----------
+    system : a System.
+        The system.
+    wf : a Wavefunction.
+        A wavefunction for the current blocks of the system, usually the
+	ground state.
+
+    Returns
+    -------
+    result : a MatrixProductState.
+        The state.
+
+    Raises
+    ------
+    DMRGException
+        if the wavefunction does not fit in the system, or the old blocks
+	don't match the current ones.
+    """
+    left_site_dim = system.left_site.dim
+    right_site_dim = system.right_site.dim
+    if wf.as_matrix.shape != (system.get_left_dim(), system.get_right_dim()):
+	raise DMRGException("Wavefunction does not fit in the system")
+    left_blocks = get_blocks_of_all_sizes(system.left_block,
+	                                  system.old_left_blocks)
+    right_blocks = get_blocks_of_all_sizes(system.right_block,
+	                                   system.old_right_blocks)
+    tensors = [get_left_tensor(block, left_site_dim)
+	       for block in left_blocks]
+    center = (wf.as_matrix.reshape(left_site_dim, system.left_block.dim,
+	                           right_site_dim, system.right_block.dim)
+	      .transpose(1, 0, 2, 3))
+    u, s, v = np.linalg.svd(center.reshape(
+	system.left_block.dim * left_site_dim,
+	right_site_dim * system.right_block.dim), full_matrices=False)
+    tensors.append(u.reshape(system.left_block.dim, left_site_dim, len(s)))
+    tensors.append((s[:, np.newaxis] * v).reshape(len(s), right_site_dim,
+	                                          system.right_block.dim))
+    tensors += [get_right_tensor(block, right_site_dim)
+	        for block in reversed(right_blocks)]
+    for i in range(1, len(tensors)):
+	if tensors[i-1].shape[2] != tensors[i].shape[0]:
+	    raise DMRGException("Old blocks do not match the current ones")
+    return MatrixProductState(tensors, len(left_blocks) + 1)
@@ -0,0 +1,553 @@
+#
+# File: operator_bank.py
+# Author: Ivan Gonzalez
+#
+""" A module for the storage of the operators of sites and blocks.
+"""
+import numpy as np
+from dmrg101.core.dmrg_exceptions import DMRGException
+from dmrg101.core.shared_memory import copy_to_shared_memory
+from dmrg101.core.transform_matrix import get_adjoint
+from dmrg101.core.transform_matrix import transform_matrix, transform_matrices
+
+class PendingOperator(object):
+    """An operator waiting to be transformed to a new basis.
+
+    You use this class to delay the renormalization of an operator until
+    someone actually needs it. It keeps the recipe to build the operator
+    in the old (not truncated) basis and the transformation matrix. The
+    transformed operator is kept once calculated, so banks sharing a
+    pending operator do the transformation only once.
+
+    Parameters
+    ----------
+    make_matrix : a callable with no arguments.
+        Returns the operator (a numpy array with ndim = 2) in the old
+	basis.
+    transformation_matrix : a numpy array of ndim = 2.
+        The transformation matrix to the new basis.
+    """
+    def __init__(self, make_matrix, transformation_matrix):
+	super(PendingOperator, self).__init__()
+	self.make_matrix = make_matrix
+	self.transformation_matrix = transformation_matrix
+	self.value = None
+
+    def set_value(self, value):
+	"""Sets the transformed operator and forgets the recipe.
+	"""
+	self.value = value
+	self.make_matrix = None
+
+    def get_value(self):
+	"""Gets the operator in the new basis, transforming it if needed.
+	"""
+	if self.value is None:
+	    self.set_value(transform_matrix(self.make_matrix(),
+		                            self.transformation_matrix))
+	return self.value
+
+class OperatorBank(object):
+    """A bank of operators stored in a single contiguous array.
+
+    You use this class to store all the operators of a site or a block.
+    The operators are the slices of a single numpy array with ndim = 3,
+    whose first index labels the operator, and their names are kept in a
+    dictionary mapping the name to the index. The bank behaves as a
+    dictionary of strings and numpy arrays (with ndim = 2), but the arrays
+    you get are *views* on the bank storage, so you can modify the
+    matrix elements of an operator in place.
+
+    Having all the operators in a single array allows to process all of
+    them at once (e.g. to transform them to a new basis, or to save them
+    to disk) without restacking them.
+
+    Parameters
+    ----------
+    dim : an int (optional).
+        The dimension of the operators. If None, it is set when the first
+	operator is stored.
+    dtype : a numpy dtype (optional).
+        The type of the matrix elements. If a complex operator is stored
+	in a real bank, the whole bank is converted to complex.
+    capacity : an int (optional).
+        The number of operators you can store before the storage grows.
+
+    Notes
+    -----
+    When the bank grows or changes type the storage is reallocated, so
+    the views obtained before are *not* views of the bank anymore. Get
+    the operators from the bank again after adding new ones.
+
+    Operators can be added as *pending* (see :meth:`add_pending`), which
+    means they are renormalized only the first time you access them.
+
+    Operators can also be added as the *adjoint* (hermitian conjugate) of
+    another operator in the bank (see :meth:`add_adjoint`). They are not
+    stored, and you get a transposed view of the other operator instead.
+
+    A bank can be *shared* with its snapshots (see :meth:`snapshot`). The
+    storage of a shared bank is read-only, and it's copied the first time
+    you store, add, or remove an operator (copy-on-write).
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from dmrg101.core.operator_bank import OperatorBank
+    >>> bank = OperatorBank(2)
+    >>> bank['id'] = np.eye(2)
+    >>> bank.add('s_z')
+    >>> s_z = bank['s_z']
+    >>> s_z[0, 0] = -0.5
+    >>> s_z[1, 1] = 0.5
+    >>> print bank.keys()
+    ['id', 's_z']
+    >>> print bank.stack.shape
+    (2, 2, 2)
+    >>> print bank.stack[1]
+    [[-0.5  0. ]
+     [ 0.   0.5]]
+    """
+    def __init__(self, dim=None, dtype=float, capacity=4):
+	super(OperatorBank, self).__init__()
+	self.dim = dim
+	self.names = []
+	self.index = {}
+	self.storage = None
+	self.dtype = np.dtype(dtype)
+	self.capacity = max(1, capacity)
+	self.pending = {}
+	self.adjoints = {}
+	self.shared = False
+	if self.dim is not None:
+	    self.storage = np.empty((self.capacity, dim, dim), self.dtype)
+
+    def __len__(self):
+	return len(self.names) + len(self.adjoints)
+
+    def __iter__(self):
+	return iter(self.keys())
+
+    def __contains__(self, name):
+	return name in self.index or name in self.adjoints
+
+    def __getitem__(self, name):
+	if name in self.adjoints:
+	    return get_adjoint(self[self.adjoints[name]])
+	if name in self.pending:
+	    self.resolve_pending(name)
+	try:
+	    return self.storage[self.index[name]]
+	except KeyError:
+	    raise KeyError(name)
+
+    def __setitem__(self, name, matrix):
+	matrix = np.asarray(matrix)
+	self.check_fits(matrix)
+	if np.iscomplexobj(matrix) and not np.iscomplexobj(self.storage):
+	    self.reallocate(self.capacity, np.complex128)
+	self.unshare()
+	self.adjoints.pop(name, None)
+	self.store_adjoints_of(name)
+	if name not in self.index:
+	    self.make_slot(name)
+	self.pending.pop(name, None)
+	self.storage[self.index[name]] = matrix
+
+    def __delitem__(self, name):
+	"""Removes an operator.
+
+	To keep the storage contiguous, the last operator is moved to the
+	slot left free.
+	"""
+	if name in self.adjoints:
+	    del self.adjoints[name]
+	    return
+	self.unshare()
+	self.store_adjoints_of(name)
+	self.pending.pop(name, None)
+	slot = self.index.pop(name)
+	last = len(self.names) - 1
+	if slot != last:
+	    moved = self.names[last]
+	    self.storage[slot] = self.storage[last]
+	    self.names[slot] = moved
+	    self.index[moved] = slot
+	self.names.pop()
+
+    def __repr__(self):
+	return repr(dict(self.items()))
+
+    def __deepcopy__(self, memo):
+	return self.copy()
+
+    def check_fits(self, matrix):
+	"""Checks a matrix can be stored in the bank.
+
+	Raises
+	------
+	DMRGException
+	    if `matrix` is not square or has not the right dimension.
+	"""
+	if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+	    raise DMRGException("Operators must be square matrices")
+	if self.dim is None:
+	    self.dim = matrix.shape[0]
+	    self.storage = np.empty((self.capacity, self.dim, self.dim),
+		                    self.dtype)
+	if matrix.shape[0] != self.dim:
+	    raise DMRGException("Operator does not fit in the bank")
+
+    def reallocate(self, capacity, dtype=None):
+	"""Moves the operators to a new storage.
+
+	Parameters
+	----------
+	capacity : an int.
+	    The number of operators the new storage can hold.
+	dtype : a numpy dtype (optional).
+	    The type for the new storage. If None, the type is unchanged.
+	"""
+	if dtype is not None:
+	    self.dtype = np.dtype(dtype)
+	new_storage = np.empty((capacity, self.dim, self.dim), self.dtype)
+	new_storage[:len(self.names)] = self.storage[:len(self.names)]
+	self.storage = new_storage
+	self.capacity = capacity
+	self.shared = False
+
+    def unshare(self):
+	"""Copies the storage if it's shared with other banks.
+
+	You use this function before changing the storage of the bank, so
+	the changes are not seen by the banks sharing it. After that, the
+	bank owns its storage and it's writable again.
+	"""
+	if self.shared:
+	    if self.storage is not None:
+		self.storage = np.array(self.storage)
+	    self.shared = False
+
+    def snapshot(self):
+	"""Makes a read-only copy of the bank sharing its storage.
+
+	No operator is copied: both banks share the storage, which becomes
+	read-only, and the first of them that stores, adds, or removes an
+	operator gets its own copy of the storage. The pending operators
+	are shared too, so they are renormalized only once.
+
+	Returns
+	-------
+	result : an OperatorBank.
+	    The snapshot.
+
+	Examples
+	--------
+	>>> import numpy as np
+	>>> from dmrg101.core.operator_bank import OperatorBank
+	>>> bank = OperatorBank(2)
+	>>> bank['id'] = np.eye(2)
+	>>> old_bank = bank.snapshot()
+	>>> print np.may_share_memory(old_bank['id'], bank['id'])
+	True
+	>>> bank['id'] = 2 * np.eye(2)
+	>>> print old_bank['id']
+	[[ 1.  0.]
+	 [ 0.  1.]]
+	"""
+	if self.storage is not None:
+	    self.storage.flags.writeable = False
+	self.shared = True
+	result = OperatorBank(dtype=self.dtype, capacity=self.capacity)
+	result.dim = self.dim
+	result.storage = self.storage
+	result.names = list(self.names)
+	result.index = dict(self.index)
+	result.pending = dict(self.pending)
+	result.adjoints = dict(self.adjoints)
+	result.shared = True
+	return result
+
+    def write_to_storage(self, slot, matrix):
+	"""Writes an operator into the storage, even if it's shared.
+
+	You use this function only to write operators that are the same for
+	all the banks sharing the storage, as the pending operators (which
+	are shared too). Otherwise, the storage is copied first.
+	"""
+	storage = self.storage
+	if storage.flags.writeable:
+	    storage[slot] = matrix
+	    return
+	try:
+	    storage.flags.writeable = True
+	except ValueError:
+	    # the memory itself is read-only, so the bank gets its own copy
+	    self.storage = np.array(storage)
+	    self.shared = False
+	    self.storage[slot] = matrix
+	    return
+	storage[slot] = matrix
+	storage.flags.writeable = False
+
+    def make_slot(self, name):
+	"""Makes room for a new operator at the end of the storage.
+	"""
+	if len(self.names) == self.capacity:
+	    self.reallocate(2 * self.capacity)
+	self.index[name] = len(self.names)
+	self.names.append(name)
+
+    def add(self, name):
+	"""Adds an operator full of zeros.
+
+	Parameters
+	----------
+	name : a string.
+	    The name of the operator.
+
+	Raises
+	------
+	DMRGException
+	    if `name` is already in the bank, or the bank has no dimension
+	    yet.
+	"""
+	if name in self:
+	    raise DMRGException("Operator name exists already")
+	if self.dim is None:
+	    raise DMRGException("Cannot add an operator without dimension")
+	self.unshare()
+	self.make_slot(name)
+	self.storage[self.index[name]] = 0.0
+
+    @property
+    def stack(self):
+	"""The operators as a numpy array with ndim = 3.
+
+	The first index labels the operators in the same order as
+	`self.names`. The adjoints are not included. It's a view, so no
+	copy is made.
+	"""
+	if self.storage is None:
+	    return np.empty((0, 0, 0), self.dtype)
+	self.renormalize_pending()
+	return self.storage[:len(self.names)]
+
+    def keys(self):
+	return self.names + self.adjoints.keys()
+
+    def values(self):
+	return [self[name] for name in self.keys()]
+
+    def items(self):
+	return [(name, self[name]) for name in self.keys()]
+
+    def get(self, name, default=None):
+	if name in self:
+	    return self[name]
+	return default
+
+    def copy(self):
+	"""Makes a (deep) copy of the bank.
+
+	The storage of the copy is trimmed to hold just the operators in
+	the bank.
+	"""
+	result = OperatorBank(self.dim, self.dtype, max(1, len(self.names)))
+	result.names = list(self.names)
+	result.index = dict(self.index)
+	result.pending = dict(self.pending)
+	result.adjoints = dict(self.adjoints)
+	if self.storage is not None:
+	    result.storage[:len(self.names)] = self.storage[:len(self.names)]
+	return result
+
+    def move_to_shared_memory(self, directory):
+	"""Moves the storage to shared memory.
+
+	You use this function before sending the bank to another process,
+	so the operators are not copied, but mapped by the other process
+	(see :class:`SharedArray`.) The pending operators are calculated
+	first, as their recipes can't be sent.
+
+	Parameters
+	----------
+	directory : a string.
+	    The directory for the shared memory, see
+	    :func:`make_shared_memory_directory`.
+	"""
+	if self.storage is None:
+	    return
+	self.renormalize_pending()
+	writeable = self.storage.flags.writeable
+	self.storage = copy_to_shared_memory(self.storage, directory)
+	self.storage.flags.writeable = writeable
+
+    def add_adjoint(self, name, adjoint_of):
+	"""Adds an operator which is the adjoint of another one.
+
+	The adjoint is not stored, but you get it as a transposed view of
+	the other operator (for real operators; complex ones are
+	conjugated), so it's free to keep it and to renormalize it.
+
+	Parameters
+	----------
+	name : a string.
+	    The name of the operator.
+	adjoint_of : a string.
+	    The name of the operator (already in the bank) whose adjoint
+	    (hermitian conjugate) is the operator `name`.
+
+	Raises
+	------
+	DMRGException
+	    if `name` is already in the bank, or `adjoint_of` is not stored
+	    in the bank.
+
+	Examples
+	--------
+	>>> import numpy as np
+	>>> from dmrg101.core.operator_bank import OperatorBank
+	>>> bank = OperatorBank(2)
+	>>> bank['s_p'] = np.array([[0.0, 0.0], [1.0, 0.0]])
+	>>> bank.add_adjoint('s_m', 's_p')
+	>>> print bank['s_m']
+	[[ 0.  1.]
+	 [ 0.  0.]]
+	>>> print bank.stack.shape
+	(1, 2, 2)
+	"""
+	if name in self:
+	    raise DMRGException("Operator name exists already")
+	if adjoint_of not in self.index:
+	    raise DMRGException("Cannot add the adjoint of a missing operator")
+	self.adjoints[name] = adjoint_of
+
+    def store_adjoints_of(self, name):
+	"""Stores a copy of the adjoints of an operator.
+
+	You use this function before changing or removing an operator, so
+	its adjoints are kept unchanged.
+	"""
+	for adjoint, adjoint_of in self.adjoints.items():
+	    if adjoint_of == name:
+		matrix = np.copy(self[adjoint])
+		del self.adjoints[adjoint]
+		self[adjoint] = matrix
+
+    def add_pending(self, name, pending_operator):
+	"""Adds an operator that is renormalized when first accessed.
+
+	A slot is reserved for the operator, so the storage does not
+	change when it's finally calculated.
+
+	Parameters
+	----------
+	name : a string.
+	    The name of the operator.
+	pending_operator : a PendingOperator.
+	    The recipe to calculate the operator.
+
+	Raises
+	------
+	DMRGException
+	    if `name` is already in the bank, or the bank has no dimension
+	    yet.
+	"""
+	if name in self:
+	    raise DMRGException("Operator name exists already")
+	if self.dim is None:
+	    raise DMRGException("Cannot add an operator without dimension")
+	self.unshare()
+	self.make_slot(name)
+	self.pending[name] = pending_operator
+
+    def resolve_pending(self, name):
+	"""Calculates a pending operator and puts it into the storage.
+	"""
+	value = self.pending[name].get_value()
+	if np.iscomplexobj(value) and not np.iscomplexobj(self.storage):
+	    self.reallocate(self.capacity, np.complex128)
+	self.write_to_storage(self.index[name], value)
+	del self.pending[name]
+
+    def renormalize_pending(self, number_of_threads=1):
+	"""Calculates all the pending operators.
+
+	The pending operators sharing the transformation matrix are
+	transformed all at once with :func:`transform_matrices`.
+
+	Parameters
+	----------
+	number_of_threads : an int (optional).
+	    The number of threads used to transform the operators.
+	"""
+	to_transform = {}
+	for name, pending_operator in self.pending.items():
+	    if pending_operator.value is None:
+		key = id(pending_operator.transformation_matrix)
+		to_transform.setdefault(key, []).append(pending_operator)
+	for pending_operators in to_transform.values():
+	    transformation_matrix = pending_operators[0].transformation_matrix
+	    transformed = transform_matrices(
+		    [p.make_matrix() for p in pending_operators],
+		    transformation_matrix, number_of_threads)
+	    for i, pending_operator in enumerate(pending_operators):
+		pending_operator.set_value(transformed[i])
+	for name in self.pending.keys():
+	    self.resolve_pending(name)
+
+def make_operator_bank(names, stack):
+    """Makes a bank using a stack of operators as storage.
+
+    You use this function to make a bank out of a bunch of operators
+    that are already stacked in a numpy array with ndim = 3, for example
+    the ones coming out of :func:`transform_matrices`. The stack is not
+    copied. If the stack has more matrices than names, the extra ones are
+    free room for new operators.
+
+    Parameters
+    ----------
+    names : a list of strings.
+        The names of the operators, in the same order as in `stack`.
+    stack : a numpy array of ndim = 3.
+        The operators.
+
+    Returns
+    -------
+    result : an OperatorBank.
+        A bank with the operators.
+
+    Raises
+    ------
+    DMRGException
+        if the number of names and operators is different.
+    """
+    if stack.ndim != 3 or stack.shape[1] != stack.shape[2]:
+	raise DMRGException("Need a stack of square matrices")
+    if len(names) > stack.shape[0]:
+	raise DMRGException("Wrong number of names for the operators")
+    result = OperatorBank(stack.shape[1], stack.dtype, max(1, stack.shape[0]))
+    if stack.shape[0]:
+	result.storage = stack
+    result.names = list(names)
+    result.index = dict((name, i) for i, name in enumerate(names))
+    return result
+
+def copy_to_operator_bank(operators):
+    """Copies a dictionary of operators into a bank.
+
+    Parameters
+    ----------
+    operators : a dict of strings and numpy arrays of ndim = 2.
+        The operators.
+
+    Returns
+    -------
+    result : an OperatorBank.
+        A bank with a copy of the operators.
+    """
+    result = OperatorBank(capacity=max(1, len(operators)))
+    for name, matrix in operators.items():
+	result[name] = matrix
+    return result
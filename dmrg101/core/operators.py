@@ -6,7 +6,8 @@
 """
 import numpy as np
 from dmrg101.core.dmrg_exceptions import DMRGException
-from dmrg101.core.wavefunction import Wavefunction
+from dmrg101.core.thread_pools import get_thread_pool, split_in_chunks
+from dmrg101.core.wavefunction import Wavefunction, create_empty_like
 
 class OperatorComponent(object):
     """Abstract class for the composite pattern.
@@ -31,6 +32,23 @@ class OperatorComponent(object):
         """
         pass
 
+    def apply_into(self, wf, out, workspace=None):
+        """Applies the operator, writing the result into a wavefunction.
+
+	The default just copies the result of `apply`. The subclasses do
+	it without allocating anything.
+
+        Parameters
+        ----------
+        wf : a Wavefunction
+     	    The wavefunction you want to apply the operator.
+        out : a Wavefunction
+     	    The wavefunction where the result is written.
+	workspace : a numpy array of ndim = 2 (optional).
+	    A matrix for intermediate results, if the operator needs it.
+        """
+	out.as_matrix[...] = self.apply(wf).as_matrix
+
 class Operator(OperatorComponent):
     """A class for operators.
 
@@ -130,10 +148,62 @@ class Operator(OperatorComponent):
         
         result = Wavefunction(self.left_dim, self.right_dim)
 
-        tmp = np.dot(self.right_op, wf.as_matrix.transpose())
-	result.as_matrix = self.parameter * np.dot(self.left_op, tmp.transpose())
+	# 
+	# The right operator acts on the columns of the wavefunction
+	# matrix, so you need its transpose. The operators can be
+	# transposed views (as the adjoints in an OperatorBank): numpy just
+	# passes them to the BLAS with the transposed flag, i.e. without
+	# making a copy.
+	#
+        tmp = np.dot(self.left_op, wf.as_matrix)
+	result.as_matrix = np.dot(tmp, self.right_op.transpose())
+	if self.parameter != 1.0:
+	    result.as_matrix = self.parameter * result.as_matrix
 
 	return result
+
+    def apply_into(self, wf, out, workspace=None):
+	"""Applies the operator, writing the result into a wavefunction.
+
+	You use this function instead of `apply` when you call it many
+	times, as in the Lanczos iterations, because nothing is allocated
+	(if you pass the `workspace`.)
+
+    	Parameters
+    	----------
+    	wf : A Wavefunction
+    	    The wavefunction you want to apply the operator.
+	out : A Wavefunction
+	    The wavefunction where the result is written. It must be a
+	    different one than `wf`.
+	workspace : a numpy array of ndim = 2 (optional).
+	    A matrix with the same shape as the matrix of `wf` used for
+	    the intermediate result. If None, one is allocated.
+
+    	Raises
+    	------
+    	DMRGException
+	    if `wf` or `out` have not the correct dimensions as a matrix,
+	    or they are the same wavefunction.
+	"""
+        if wf.as_matrix.shape != ((self.left_dim, self.right_dim)):
+     	    raise DMRGException("Wavefunction does not fit.")
+	if out.as_matrix.shape != wf.as_matrix.shape:
+     	    raise DMRGException("Output wavefunction does not fit.")
+	if out is wf:
+     	    raise DMRGException("Cannot apply the operator in place.")
+	dtype = np.result_type(self.left_op, self.right_op, wf.as_matrix)
+	if workspace is None:
+	    workspace = np.empty(wf.as_matrix.shape, dtype)
+	if (out.as_matrix.dtype != dtype or workspace.dtype != dtype or
+	    not out.as_matrix.flags.c_contiguous):
+	    # numpy can't write the products there
+	    out.as_matrix[...] = self.apply(wf).as_matrix
+	    return
+	np.dot(self.left_op, wf.as_matrix, out=workspace)
+	np.dot(workspace, self.right_op.transpose(), out=out.as_matrix)
+	if self.parameter != 1.0:
+	    out.scale(self.parameter)
 		
 class CompositeOperator(OperatorComponent):
     """A class for composite operators.
@@ -144,6 +214,14 @@ class CompositeOperator(OperatorComponent):
     You use this class when you want to build an operator that it is a
     linear combination of other operators. 
 
+    If you set `number_of_threads` to more than one, :meth:`apply_into`
+    splits the components among a pool of threads (numpy releases the
+    GIL in the matrix products), each of them adding up its components
+    in its own matrix, which are added at the end. You use this when the
+    matrices are too small for a multithreaded BLAS to use all the
+    cores. Limit the threads of the BLAS at the same time, see
+    :func:`limit_blas_threads`.
+
     Examples
     --------
     >>> import numpy as np
@@ -171,6 +249,9 @@ class CompositeOperator(OperatorComponent):
     	self.left_dim = left_dim
     	self.right_dim = right_dim
     	self.list_of_components = []
+	self.number_of_threads = 1
+	self.workspaces = {}
+	self.partial_results = {}
     
     def add(self, left_op, right_op, parameter=1.0):
     	"""
@@ -236,3 +317,116 @@ class CompositeOperator(OperatorComponent):
     	for component in self.list_of_components:
     	    result.as_matrix += component.apply(wf).as_matrix
 	return result
+
+    def get_workspaces(self, dtype, worker=0):
+	"""Gets the matrices for the intermediate results of `apply_into`.
+
+	They are allocated the first time, and kept for the next calls.
+	Each thread applying the operator uses its own.
+
+	Parameters
+	----------
+	dtype : a numpy dtype.
+	    The type of the elements.
+	worker : an int (optional).
+	    The number of the thread.
+
+	Returns
+	-------
+	workspace : a numpy array of ndim = 2.
+	    A matrix for the product of the left operator and the
+	    wavefunction.
+	term : a Wavefunction.
+	    A wavefunction for the result of each component.
+	"""
+	key = (dtype, worker)
+	if key not in self.workspaces:
+	    term = Wavefunction(self.left_dim, self.right_dim, dtype)
+	    workspace = np.empty((self.left_dim, self.right_dim), dtype)
+	    self.workspaces[key] = (workspace, term)
+	return self.workspaces[key]
+
+    def get_partial_result(self, out, worker):
+	"""Gets the matrix where a thread adds up its components.
+
+	The first thread uses `out` itself.
+	"""
+	if worker == 0:
+	    return out
+	key = (out.as_matrix.dtype, worker)
+	if key not in self.partial_results:
+	    self.partial_results[key] = create_empty_like(out)
+	return self.partial_results[key]
+
+    def apply_components_into(self, components, wf, out, worker=0):
+	"""Applies some of the components, adding them up into `out`.
+	"""
+	workspace, term = self.get_workspaces(out.as_matrix.dtype, worker)
+	out.as_matrix.fill(0.0)
+    	for component in components:
+	    component.apply_into(wf, term, workspace)
+	    out.axpy(1.0, term)
+
+    def apply_into(self, wf, out, workspace=None):
+    	"""Applies the operator, writing the result into a wavefunction.
+
+	You use this function instead of `apply` when you call it many
+	times, as in the Lanczos iterations, because nothing is allocated
+	after the first call: the intermediate results are kept in
+	matrices reused in each call.
+    
+    	Parameters
+    	----------
+    	wf : A Wavefunction
+    	    The wavefunction you want to apply the operator.
+	out : A Wavefunction
+	    The wavefunction where the result is written. It must be a
+	    different one than `wf`.
+	workspace : a numpy array of ndim = 2 (optional).
+	    Not used, as the composite keeps its own.
+    
+    	Raises
+    	------
+    	DMRGException
+    	    if self.list_of_components is empty, or `wf` and `out` are the
+	    same wavefunction.
+
+	Examples
+	--------
+	>>> import numpy as np
+	>>> from dmrg101.core.operators import CompositeOperator 
+	>>> from dmrg101.core.wavefunction import Wavefunction
+	>>> from dmrg101.core.wavefunction import create_empty_like
+	>>> wf = Wavefunction(2, 2)
+	>>> wf.randomize()
+	>>> twice = CompositeOperator(2, 2)
+	>>> twice.add(np.eye(2, 2), np.eye(2, 2))
+	>>> twice.add(np.eye(2, 2), np.eye(2, 2))
+	>>> new_wf = create_empty_like(wf)
+	>>> twice.apply_into(wf, new_wf)
+	>>> np.allclose(new_wf.as_matrix, 2 * wf.as_matrix)
+	True
+    	"""
+    	if not self.list_of_components:
+     	    raise DMRGException("Composite operator is empty.")
+	if out is wf:
+     	    raise DMRGException("Cannot apply the operator in place.")
+	chunks = split_in_chunks(len(self.list_of_components),
+		                 self.number_of_threads)
+	if len(chunks) == 1:
+	    self.apply_components_into(self.list_of_components, wf, out)
+	    return
+	# make everything the threads need before starting them
+	partial_results = [self.get_partial_result(out, worker)
+		           for worker in range(len(chunks))]
+	for worker in range(len(chunks)):
+	    self.get_workspaces(out.as_matrix.dtype, worker)
+
+	def apply_chunk(worker):
+	    begin, end = chunks[worker]
+	    self.apply_components_into(self.list_of_components[begin:end], wf,
+		                       partial_results[worker], worker)
+
+	get_thread_pool(len(chunks)).map(apply_chunk, range(len(chunks)))
+	for partial_result in partial_results[1:]:
+	    out.axpy(1.0, partial_result)
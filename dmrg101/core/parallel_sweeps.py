@@ -0,0 +1,387 @@
+#
+# File: parallel_sweeps.py
+# Author: Ivan Gonzalez
+#
+""" A module to sweep segments of the chain in parallel.
+
+In the finite algorithm each DMRG step needs the blocks made in the step
+before, so a sweep goes through the chain one bond at a time. In the
+real-space parallel DMRG [1]_, the chain is split in segments, which are
+swept at the same time, each one keeping the blocks at its ends (the
+environments) from the last sweep. The segments are then stitched
+together optimizing the bonds at their boundaries, now with the new
+blocks at both sides.
+
+Here the segments are swept in processes started with `fork`, i.e. on
+POSIX systems only, and the new blocks are sent back in shared memory
+(see :class:`SharedArray`), so their operators are not copied. The
+threads of the parent process are not copied by `fork`, so each segment
+is swept in a single thread (see :func:`prepare_forked_system`), and the
+background threads of the block histories are stopped while the
+segments are swept.
+
+.. [1] E.M. Stoudenmire and S.R. White, Phys. Rev. B 87, 155137 (2013).
+"""
+import multiprocessing
+import shutil
+from dmrg101.core.block_history import BlockHistory, OutOfCoreBlockHistory
+from dmrg101.core.dmrg_exceptions import DMRGException
+from dmrg101.core.shared_memory import make_shared_memory_directory
+from dmrg101.core.thread_pools import reset_thread_pools, split_in_chunks
+
+def make_segments(number_of_sites, number_of_segments):
+    """Splits the bonds of a chain in segments.
+
+    The sizes of the left block in the finite algorithm go from 1 to
+    `number_of_sites` - 3, and each segment is the (first, last) size of
+    the left block swept by a segment. The first size of a segment is
+    one more than the last size of the previous one, i.e. the segments
+    share no blocks.
+
+    Parameters
+    ----------
+    number_of_sites : an int.
+        The number of sites of the chain.
+    number_of_segments : an int.
+        The (maximum) number of segments.
+
+    Returns
+    -------
+    result : a list of tuples of two ints.
+        The first and last size of the left block in each segment.
+
+    Examples
+    --------
+    >>> from dmrg101.core.parallel_sweeps import make_segments
+    >>> print make_segments(12, 2)
+    [(1, 4), (5, 8)]
+    """
+    number_of_sizes = number_of_sites - 4
+    if number_of_sizes < 1:
+	raise DMRGException("Chain too short to split")
+    return [(begin + 1, end) for begin, end in
+	    split_in_chunks(number_of_sizes, number_of_segments)]
+
+def set_up_system_at(system, left_blocks, right_blocks, left_block_size):
+    """Sets the blocks of the system for a step of the finite algorithm.
+
+    The old blocks of each side are the ones smaller than the current
+    block, and the missing ones are None.
+
+    Parameters
+    ----------
+    system : a System.
+        The system.
+    left_blocks : a dict of ints and Blocks.
+        The left blocks, keyed by their number of sites.
+    right_blocks : a dict of ints and Blocks.
+        The right blocks, keyed by their number of sites.
+    left_block_size : an int.
+        The number of sites of the left block.
+    """
+    right_block_size = system.number_of_sites - left_block_size - 2
+    system.left_block = left_blocks[left_block_size]
+    system.right_block = right_blocks[right_block_size]
+    system.old_left_blocks = BlockHistory(
+	    left_blocks.get(size) for size in range(1, left_block_size))
+    system.old_right_blocks = BlockHistory(
+	    right_blocks.get(size) for size in range(1, right_block_size))
+    system.left_block_size = left_block_size
+
+def get_blocks(history, current_block, first_size):
+    """Gets the blocks of a history, plus the current one, from a size on.
+
+    Returns
+    -------
+    result : a dict of ints and Blocks.
+        The blocks, keyed by their number of sites.
+    """
+    result = dict((size, history[size-1])
+	          for size in range(first_size, len(history) + 1))
+    result[len(history) + 1] = current_block
+    return result
+
+def sweep_segment(system, left_blocks, right_blocks, segment,
+		  number_of_states_kept):
+    """Sweeps a segment of the chain, to the right and back.
+
+    The blocks outside the segment are not changed. The system ends at
+    the same bond where it started.
+
+    Parameters
+    ----------
+    system : a System.
+        The system.
+    left_blocks : a dict of ints and Blocks.
+        The left blocks, keyed by their number of sites.
+    right_blocks : a dict of ints and Blocks.
+        The right blocks, keyed by their number of sites.
+    segment : a tuple of two ints.
+        The first and last size of the left block in the segment.
+    number_of_states_kept : an int.
+        The number of states kept in the blocks.
+
+    Returns
+    -------
+    new_left_blocks : a dict of ints and Blocks.
+        The left blocks made.
+    new_right_blocks : a dict of ints and Blocks.
+        The right blocks made.
+    energies : a list of doubles.
+        The ground state energy at each step.
+    """
+    first, last = segment
+    energies = []
+    set_up_system_at(system, left_blocks, right_blocks, first)
+    for left_block_size in range(first, last + 1):
+	energy, entropy, error = system.finite_dmrg_step(
+		'left', left_block_size, number_of_states_kept)
+	energies.append(energy)
+    new_left_blocks = get_blocks(system.old_left_blocks, system.left_block,
+	                         first + 1)
+    left_blocks = dict(left_blocks)
+    left_blocks.update(new_left_blocks)
+    set_up_system_at(system, left_blocks, right_blocks, last + 1)
+    for left_block_size in range(last + 1, first, -1):
+	energy, entropy, error = system.finite_dmrg_step(
+		'right', left_block_size, number_of_states_kept)
+	energies.append(energy)
+    new_right_blocks = get_blocks(system.old_right_blocks,
+	                          system.right_block,
+				  system.number_of_sites - last - 2)
+    return new_left_blocks, new_right_blocks, energies
+
+def get_out_of_core_histories(system):
+    """Gets the block histories of the system kept on disk.
+    """
+    return [history for history in (system.old_left_blocks,
+	                            system.old_right_blocks)
+	    if isinstance(history, OutOfCoreBlockHistory)]
+
+def prepare_forked_system(system):
+    """Prepares a system copied in a process started with `fork`.
+
+    The threads of the parent process are not copied, so the thread
+    pools are reset, and the system works in a single thread (and a
+    single process), as there is a process for each segment already.
+    The processes applying the hamiltonian, and the block histories kept
+    on disk, are detached (see :meth:`DistributedOperator.detach` and
+    :meth:`OutOfCoreBlockHistory.detach`), as they belong to the parent
+    process.
+    """
+    reset_thread_pools()
+    system.number_of_threads = 1
+    system.h.number_of_threads = 1
+    system.number_of_processes = 1
+    if system.distributed_hamiltonian is not None:
+	system.distributed_hamiltonian.detach()
+	system.distributed_hamiltonian = None
+    for history in get_out_of_core_histories(system):
+	history.detach()
+
+def sweep_segment_in_process(connection, sweeps, segment,
+	                     number_of_states_kept, directory):
+    """Sweeps a segment, sending the new blocks in shared memory.
+
+    This is what the processes do. The new blocks are moved to shared
+    memory in `directory`, and sent back through the `connection` with
+    the energies, or the error message if anything fails.
+    """
+    try:
+	prepare_forked_system(sweeps.system)
+	new_left_blocks, new_right_blocks, energies = sweep_segment(
+		sweeps.system, sweeps.left_blocks, sweeps.right_blocks,
+		segment, number_of_states_kept)
+	for blocks in (new_left_blocks, new_right_blocks):
+	    for block in blocks.values():
+		block.move_to_shared_memory(directory)
+	connection.send((energies, new_left_blocks, new_right_blocks))
+    except Exception as e:
+	connection.send(str(e))
+    connection.close()
+
+class ParallelSweeps(object):
+    """Runs the finite algorithm sweeping segments of the chain in parallel.
+
+    You use this class to sweep long chains using several processes. The
+    chain is split in segments which are swept (to the right and back)
+    at the same time, each one in its own process, with the blocks at
+    their ends kept from the last sweep. Then the bonds at the boundaries
+    between segments are optimized again, using the new blocks at both
+    sides, so the information goes from one segment to the next.
+
+    The blocks for all the lengths of both sides are kept in
+    `self.left_blocks` and `self.right_blocks`, and you make them with
+    :meth:`warm_up`, using the infinite algorithm and a serial sweep.
+
+    Parameters
+    ----------
+    system : a System.
+        The system, with its model and number of sites set.
+    number_of_segments : an int.
+        The number of segments, i.e. of processes.
+
+    Examples
+    --------
+    >>> from dmrg101.core.parallel_sweeps import ParallelSweeps
+    >>> from dmrg101.core.sites import SpinOneHalfSite
+    >>> from dmrg101.core.system import System
+    >>> from dmrg101.utils.models.heisenberg_model import HeisenbergModel
+    >>> system = System(SpinOneHalfSite())
+    >>> system.model = HeisenbergModel()
+    >>> system.number_of_sites = 12
+    >>> sweeps = ParallelSweeps(system, 2)
+    >>> energy = sweeps.warm_up(8)
+    >>> energy = sweeps.sweep(8)
+    """
+    def __init__(self, system, number_of_segments):
+	super(ParallelSweeps, self).__init__()
+	self.system = system
+	self.number_of_segments = number_of_segments
+	self.left_blocks = {}
+	self.right_blocks = {}
+
+    def warm_up(self, number_of_states_kept):
+	"""Makes the blocks for all the lengths of both sides.
+
+	Runs the infinite algorithm, and a finite sweep to the left and
+	back.
+
+	Returns
+	-------
+	result : a double.
+	    The ground state energy in the last step.
+	"""
+	system = self.system
+	last = system.number_of_sites - 3
+	for left_block_size in range(1, last + 1):
+	    energy, entropy, error = system.infinite_dmrg_step(
+		    left_block_size, number_of_states_kept)
+	for left_block_size in range(last, 0, -1):
+	    energy, entropy, error = system.finite_dmrg_step(
+		    'right', left_block_size, number_of_states_kept)
+	self.right_blocks = get_blocks(system.old_right_blocks,
+		                       system.right_block, 1)
+	for left_block_size in range(1, last + 1):
+	    energy, entropy, error = system.finite_dmrg_step(
+		    'left', left_block_size, number_of_states_kept)
+	self.left_blocks = get_blocks(system.old_left_blocks,
+		                      system.left_block, 1)
+	return energy
+
+    def sweep(self, number_of_states_kept):
+	"""Sweeps all the segments in parallel, and stitches them.
+
+	Returns
+	-------
+	result : a double.
+	    The lowest ground state energy found in the sweep.
+
+	Raises
+	------
+	DMRGException
+	    if the blocks were not made, or a segment fails.
+	"""
+	if not self.left_blocks or not self.right_blocks:
+	    raise DMRGException("Warm up first")
+	segments = make_segments(self.system.number_of_sites,
+		                 self.number_of_segments)
+	if len(segments) == 1:
+	    energies = self.sweep_segments_here(segments,
+		                                number_of_states_kept)
+	else:
+	    energies = self.sweep_segments_in_processes(segments,
+		                                        number_of_states_kept)
+	for first, last in segments[1:]:
+	    energies += self.optimize_boundary(first, number_of_states_kept)
+	return min(energies)
+
+    def sweep_segments_here(self, segments, number_of_states_kept):
+	"""Sweeps the segments one after the other, in this process.
+	"""
+	energies = []
+	new_left_blocks = {}
+	new_right_blocks = {}
+	for segment in segments:
+	    left_blocks, right_blocks, segment_energies = sweep_segment(
+		    self.system, self.left_blocks, self.right_blocks, segment,
+		    number_of_states_kept)
+	    new_left_blocks.update(left_blocks)
+	    new_right_blocks.update(right_blocks)
+	    energies += segment_energies
+	self.left_blocks.update(new_left_blocks)
+	self.right_blocks.update(new_right_blocks)
+	return energies
+
+    def sweep_segments_in_processes(self, segments, number_of_states_kept):
+	"""Sweeps each segment in its own process.
+
+	The background threads of the block histories are stopped while
+	the processes are started, so no block is being saved or loaded
+	in the copies, and started again when they are done.
+	"""
+	histories = [history for history
+		     in get_out_of_core_histories(self.system)
+		     if history.tasks is not None]
+	for history in histories:
+	    history.stop_worker()
+	directory = make_shared_memory_directory()
+	try:
+	    connections = []
+	    processes = []
+	    for segment in segments:
+		connection, other_end = multiprocessing.Pipe()
+		process = multiprocessing.Process(
+			target=sweep_segment_in_process,
+			args=(other_end, self, segment, number_of_states_kept,
+			      directory))
+		process.start()
+		other_end.close()
+		connections.append(connection)
+		processes.append(process)
+	    results = [connection.recv() for connection in connections]
+	    for process in processes:
+		process.join()
+	    errors = [result for result in results if isinstance(result, str)]
+	    if errors:
+		raise DMRGException("Cannot sweep a segment: " + errors[0])
+	    energies = []
+	    for segment_energies, left_blocks, right_blocks in results:
+		self.left_blocks.update(left_blocks)
+		self.right_blocks.update(right_blocks)
+		energies += segment_energies
+	    return energies
+	finally:
+	    shutil.rmtree(directory)
+	    for history in histories:
+		history.start_worker()
+
+    def optimize_boundary(self, left_block_size, number_of_states_kept):
+	"""Optimizes a bond at the boundary between two segments.
+
+	Both the left block and the right block at the boundary are made
+	again, now using the new blocks made by the segments at each side
+	of the boundary.
+
+	Returns
+	-------
+	result : a list of doubles.
+	    The ground state energies.
+	"""
+	system = self.system
+	energies = []
+	set_up_system_at(system, self.left_blocks, self.right_blocks,
+		         left_block_size)
+	energy, entropy, error = system.finite_dmrg_step(
+		'left', left_block_size, number_of_states_kept)
+	energies.append(energy)
+	new_left_block = system.left_block
+	set_up_system_at(system, self.left_blocks, self.right_blocks,
+		         left_block_size)
+	energy, entropy, error = system.finite_dmrg_step(
+		'right', left_block_size, number_of_states_kept)
+	energies.append(energy)
+	self.left_blocks[left_block_size + 1] = new_left_block
+	self.right_blocks[system.number_of_sites - left_block_size - 1] = (
+		system.right_block)
+	return energies
@@ -65,6 +65,30 @@ def diagonalize(reduced_density_matrix):
 
     return (eigenvals, eigenvecs)
 
+def diagonalize_batch(reduced_density_matrices):
+    """Diagonalizes a stack of hermitian or symmetric matrices.
+
+    You use this function as :func:`diagonalize`, for the reduced
+    density matrices of several calculations run in lockstep. The numpy
+    versions we support don't diagonalize stacks of matrices, so each one
+    is diagonalized in its own call.
+
+    Parameters
+    ----------
+    reduced_density_matrices : a numpy array with ndim = 3.
+        The matrices, the first index labelling the calculation.
+
+    Returns
+    -------
+    eigenvals : a numpy array with ndim = 2.
+        The eigenvalues of each matrix, in increasing order.
+    eigenvecs : a numpy array with ndim = 3.
+        The eigenvectors of each matrix, as columns.
+    """
+    results = [diagonalize(matrix) for matrix in reduced_density_matrices]
+    return (np.array([eigenvals for eigenvals, eigenvecs in results]),
+	    np.array([eigenvecs for eigenvals, eigenvecs in results]))
+
 def truncate(reduced_density_matrix_eigenvals,
 	     reduced_density_matrix_eigenvecs, 
 	     number_of_states_to_keep):
@@ -171,3 +195,62 @@ def truncate(reduced_density_matrix_eigenvals,
     assert(transformation_matrix.shape == (number_of_states,
 	                                   number_of_states_to_keep))
     return (truncated_eigenvals, transformation_matrix)
+
+def truncate_batch(reduced_density_matrix_eigenvals,
+	           reduced_density_matrix_eigenvecs, 
+		   number_of_states_to_keep):
+    """Truncates the eigenvalues and eigenvectors of a batch of matrices.
+
+    You use this function as :func:`truncate`, when the reduced density
+    matrices of several calculations are diagonalized at once (see
+    :func:`diagonalize_batch`.) The eigenvalues must be in increasing
+    order, as `diagonalize_batch` gives them, and the order is not
+    changed.
+
+    Parameters
+    ----------
+    reduced_density_matrix_eigenvals : a numpy array with ndim = 2
+        The eigenvalues of each reduced density matrix, in increasing
+	order.
+    reduced_density_matrix_eigenvecs : a numpy array with ndim = 3
+        The eigenvectors of each reduced density matrix.
+    number_of_states_to_keep : an int 
+        The number of eigenvalues (or eigenvectors) kept.
+
+    Returns
+    -------
+    truncated_eigenvals : a numpy array with ndim = 2.
+        The eigenvalues kept.
+    transformation_matrices : a numpy array with ndim = 3.
+        The eigenvectors kept, i.e. the truncation matrix for each
+	calculation.
+
+    Raises
+    ------
+    DMRGException 
+        if the eigenvalues are not a 2-dim array, or the eigenvecs don't
+	fit them.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from dmrg101.core.reduced_DM import (diagonalize_batch,
+    ...     truncate_batch)
+    >>> rhos = np.array([np.diag([0.25, 0.75]), np.diag([0.9, 0.1])])
+    >>> evals, evecs = diagonalize_batch(rhos)
+    >>> truncated_evals, truncation_matrices = truncate_batch(evals, evecs, 1)
+    >>> print truncated_evals.ravel()
+    [ 0.75  0.9 ]
+    """
+    if reduced_density_matrix_eigenvals.ndim != 2:
+        raise DMRGException("Bad arg: reduced_density_matrix_eigenvals")
+    number_of_states = reduced_density_matrix_eigenvals.shape[1]
+    if (reduced_density_matrix_eigenvecs.shape != 
+	reduced_density_matrix_eigenvals.shape + (number_of_states,)):
+        raise DMRGException("Bad arg: reduced_density_matrix_eigenvecs")
+    number_of_states_to_keep = min(number_of_states_to_keep, number_of_states)
+    truncated_eigenvals = np.copy(
+	    reduced_density_matrix_eigenvals[:, -number_of_states_to_keep:])
+    transformation_matrices = np.copy(
+	    reduced_density_matrix_eigenvecs[:, :, -number_of_states_to_keep:])
+    return (truncated_eigenvals, transformation_matrices)
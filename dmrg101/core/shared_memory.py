@@ -0,0 +1,191 @@
+#
+# File: shared_memory.py
+# Author: Ivan Gonzalez
+#
+""" A module for arrays shared between processes.
+
+You use this module to pass blocks and wavefunctions to other processes
+without copying their matrices. The arrays live in files in a memory
+filesystem (`/dev/shm`, if there is one), which are mapped in memory
+(see :class:`SharedArray`.) When one of these arrays is pickled, only
+its file name, type and shape are, so the process unpickling it maps the
+same file, and both processes share the same memory.
+
+The files are kept in a directory made with
+:func:`make_shared_memory_directory`, which you remove (with
+`shutil.rmtree`) when all the processes have got their arrays. The
+arrays mapped already are still there after that, until they are
+garbage collected.
+"""
+import os
+import tempfile
+import numpy as np
+from dmrg101.core.dmrg_exceptions import DMRGException
+
+SHARED_MEMORY_DIRECTORY = '/dev/shm'
+
+def make_shared_memory_directory():
+    """Makes a directory for the shared arrays.
+
+    The directory is made in a memory filesystem, if there is one, or
+    in the default directory for temporary files otherwise.
+
+    Returns
+    -------
+    result : a string.
+        The path of the directory.
+    """
+    directory = None
+    if os.path.isdir(SHARED_MEMORY_DIRECTORY):
+	directory = SHARED_MEMORY_DIRECTORY
+    return tempfile.mkdtemp(prefix='dmrg101_shm_', dir=directory)
+
+class SharedArray(np.memmap):
+    """A numpy array in a file that other processes can map.
+
+    You use this class as any other numpy array. The only difference is
+    that when it's pickled, e.g. to send it to another process, the
+    matrix elements are not: the process unpickling the array maps the
+    same file instead (see :func:`attach_shared_array`.)
+
+    The views of the array are shared arrays too. If a view is not
+    contiguous, it's pickled as a copy.
+
+    You don't make shared arrays directly, but with
+    :func:`make_shared_array`.
+    """
+    def __array_finalize__(self, obj):
+	super(SharedArray, self).__array_finalize__(obj)
+	self.file_address = getattr(obj, 'file_address', None)
+
+    def __array_wrap__(self, arr, context=None):
+	# the results of operations with shared arrays are not shared
+	arr = super(SharedArray, self).__array_wrap__(arr, context)
+	if isinstance(arr, SharedArray) and arr.filename is None:
+	    return arr.view(np.ndarray)
+	return arr
+
+    def get_handle(self):
+	"""Gets what you need to map the array in another process.
+
+	Returns
+	-------
+	result : a tuple, or None.
+	    The arguments for :func:`attach_shared_array`, or None if the
+	    array is not in a file, or is not contiguous.
+	"""
+	if (self.filename is None or self.file_address is None or
+	    not self.flags.c_contiguous):
+	    return None
+	offset = self.ctypes.data - self.file_address
+	return (self.filename, self.dtype.str, self.shape, offset,
+		bool(self.flags.writeable))
+
+    def __reduce_ex__(self, protocol):
+	handle = self.get_handle()
+	if handle is None:
+	    return np.array(self).__reduce_ex__(protocol)
+	return (attach_shared_array, handle)
+
+    def __reduce__(self):
+	return self.__reduce_ex__(2)
+
+def attach_shared_array(filename, dtype, shape, offset=0, writeable=True):
+    """Maps a shared array made in another process.
+
+    Parameters
+    ----------
+    filename : a string.
+        The file of the array.
+    dtype : a numpy dtype.
+        The type of the elements.
+    shape : a tuple of ints.
+        The shape.
+    offset : an int (optional).
+        Where the array starts in the file, in bytes.
+    writeable : a bool (optional).
+        Whether you can change the array.
+
+    Returns
+    -------
+    result : a SharedArray.
+        The array, sharing its memory with the other process.
+    """
+    mode = 'r+' if writeable else 'r'
+    result = np.memmap(filename, dtype=dtype, mode=mode, shape=shape,
+		       offset=offset).view(SharedArray)
+    result.file_address = result.ctypes.data - offset
+    return result
+
+def make_shared_array(shape, dtype, directory):
+    """Makes a shared array full of zeros.
+
+    Parameters
+    ----------
+    shape : a tuple of ints.
+        The shape of the array.
+    dtype : a numpy dtype.
+        The type of the elements.
+    directory : a string.
+        The directory for the file, see
+	:func:`make_shared_memory_directory`.
+
+    Returns
+    -------
+    result : a SharedArray.
+        The array. If it has no elements, it can't be mapped, so it's
+	just a numpy array.
+
+    Raises
+    ------
+    DMRGException
+        if there is not enough room in the directory. A memory
+	filesystem gives no error when it's full, but kills the process
+	writing the array, so the room is checked first.
+
+    Examples
+    --------
+    >>> import pickle
+    >>> import shutil
+    >>> from dmrg101.core.shared_memory import (make_shared_array,
+    ...     make_shared_memory_directory)
+    >>> directory = make_shared_memory_directory()
+    >>> a = make_shared_array((2, 2), float, directory)
+    >>> b = pickle.loads(pickle.dumps(a, 2))
+    >>> b[0, 1] = 1.0
+    >>> print a[0, 1]
+    1.0
+    >>> shutil.rmtree(directory)
+    """
+    if np.prod(shape) == 0:
+	return np.zeros(shape, dtype)
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    stats = os.statvfs(directory)
+    if size > stats.f_bavail * stats.f_frsize:
+	raise DMRGException("Not enough shared memory")
+    fd, filename = tempfile.mkstemp(prefix='dmrg101_', dir=directory)
+    os.close(fd)
+    result = np.memmap(filename, dtype=dtype, mode='w+',
+		       shape=shape).view(SharedArray)
+    result.file_address = result.ctypes.data
+    return result
+
+def copy_to_shared_memory(array, directory):
+    """Copies an array to a new shared array.
+
+    Parameters
+    ----------
+    array : a numpy array.
+        The array.
+    directory : a string.
+        The directory for the file.
+
+    Returns
+    -------
+    result : a SharedArray.
+        The copy.
+    """
+    array = np.asarray(array)
+    result = make_shared_array(array.shape, array.dtype, directory)
+    result[...] = array
+    return result
@@ -6,6 +6,7 @@
 """
 import numpy as np
 from dmrg_exceptions import DMRGException
+from operator_bank import OperatorBank
 
 class Site(object):
     """A general single site
@@ -20,8 +21,10 @@ class Site(object):
 	Size of the Hilbert space. The dimension must be at least 1. A site of
         dim = 1  represents the vaccum (or something strange like that, it's
         used for demo purposes mostly.)
-    operators : a dictionary of string and numpy array (with ndim = 2).
-	Operators for the site.
+    operators : an OperatorBank.
+	Operators for the site. It works as a dictionary of string and
+	numpy array (with ndim = 2), but all the operators are stored
+	contiguously in a single array.
 
     Examples
     --------
@@ -52,7 +55,8 @@ class Site(object):
     	    raise DMRGException("Site dim must be at least 1")
     	super(Site, self).__init__()
     	self.dim = dim
-	self.operators = { "id" : np.eye(self.dim, self.dim) }
+	self.operators = OperatorBank(self.dim)
+	self.operators["id"] = np.eye(self.dim, self.dim)
     
     def add_operator(self, operator_name):
     	"""Adds an operator to the site.
@@ -83,16 +87,16 @@ class Site(object):
 	['id']
 	>>> new_site.add_operator('s_z')
 	>>> print new_site.operators.keys()
-	['s_z', 'id']
+	['id', 's_z']
 	>>> # note that the newly created op has all zeros
 	>>> print new_site.operators['s_z']
 	[[ 0.  0.]
 	 [ 0.  0.]]
         """
-	if str(operator_name) in self.operators.keys():
+	if str(operator_name) in self.operators:
     	    raise DMRGException("Operator name exists already")
     	else:
-    	    self.operators[str(operator_name)] = np.zeros((self.dim, self.dim))
+    	    self.operators.add(str(operator_name))
 
 class PauliSite(Site):
     """A site for spin 1/2 models.
@@ -117,7 +121,7 @@ class PauliSite(Site):
     >>> print pauli_site.dim
     2
     >>> print pauli_site.operators.keys()
-    ['s_p', 's_z', 's_m', 'id']
+    ['id', 's_z', 's_x']
     >>> print pauli_site.operators['s_z']
     [[-1.  0.]
      [ 0.  1.]]
@@ -169,7 +173,7 @@ class SpinOneHalfSite(Site):
     >>> print spin_one_half_site.dim
     2
     >>> print spin_one_half_site.operators.keys()
-    ['s_p', 's_z', 's_m', 'id']
+    ['id', 's_z', 's_p', 's_m', 's_x']
     >>> print spin_one_half_site.operators['s_z']
     [[-0.5  0. ]
      [ 0.   0.5]]
@@ -243,7 +247,7 @@ class ElectronicSite(Site):
     >>> print hubbard_site.dim
     4
     >>> print hubbard_site.operators.keys() # doctest: +ELLIPSIS
-    ['s_p', ...]
+    ['id', 'c_up', 'c_up_dag', 'c_down', 'c_down_dag', ...]
     >>> print hubbard_site.operators['n_down']
     [[ 0.  0.  0.  0.]
      [ 0.  1.  0.  0.]
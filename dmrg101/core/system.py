@@ -5,19 +5,63 @@
 """ A module for a DMRG system.
 """
 import numpy as np
-from copy import deepcopy
 from block import make_block_from_site, Block
+from block_history import BlockHistory, OutOfCoreBlockHistory
+from block_history import CompactBlockHistory
+from buffer_pool import get_buffer_pool
+from mps import make_matrix_product_state
 from dmrg_exceptions import DMRGException
+from distributed_operator import DistributedOperator
+from operator_bank import OperatorBank, PendingOperator, make_operator_bank
+from operator_bank import copy_to_operator_bank
 import lanczos 
 from make_tensor import make_tensor 
 from operators import CompositeOperator 
-from transform_matrix import transform_matrix 
+from thread_pools import limit_blas_threads, get_blas_threads_per_worker
+from transform_matrix import transform_matrix, transform_matrices
 from entropies import calculate_entropy, calculate_renyi
 from reduced_DM import diagonalize, truncate
 from truncation_error import calculate_truncation_error
 
+def make_tensor_later(block, block_op, site, site_op):
+    """Makes a recipe to calculate a tensor product of operators later.
+
+    You use this function to delay the calculation of the tensor product
+    of an operator of a block and an operator of a single site, until
+    someone actually needs it. 
+
+    Parameters
+    ----------
+    block : a Block.
+        The block with the small stride operator.
+    block_op : a string.
+        The name of an operator in the block.
+    site : a Site.
+        The site with the large stride operator.
+    site_op : a string.
+        The name of an operator in the site.
+
+    Returns
+    -------
+    result : a callable with no arguments.
+        Returns the tensor product of the operators.
+
+    Raises
+    ------
+    DMRGException 
+	if any of the operators are not in the corresponding site/block.
+    """
+    if block_op not in block.operators or site_op not in site.operators:
+	raise DMRGException("Operator not found")
+    def make_matrix():
+	return make_tensor(block.operators[block_op], site.operators[site_op])
+    return make_matrix
+
 def make_updated_block_for_site(transformation_matrix,
-		                operators_to_add_to_block):
+		                operators_to_add_to_block,
+				number_of_threads=1,
+				pending_operators_to_add_to_block=None,
+				adjoint_operators_to_add_to_block=None):
     """Make a new block for a list of operators.
 
     Takes a dictionary of operator names and matrices and makes a new
@@ -26,27 +70,66 @@ def make_updated_block_for_site(transformation_matrix,
     transformation matrix.
 
     You use this function everytime you want to create a new block by
-    transforming the current operators to a truncated basis. 
+    transforming the current operators to a truncated basis. All the
+    operators are stacked and transformed at once, see
+    :func:`transform_matrices`.
 
     Parameters
     ----------
     transformation_matrix : a numpy array of ndim = 2.
         The transformation matrix coming from a (truncated) unitary
 	transformation.
-    operators_to_add_to_block : a dict of strings and numpy arrays of ndim = 2.
-        The list of operators to transform.
+    operators_to_add_to_block : an OperatorBank.
+        The operators to transform. A dict of strings and numpy arrays
+	of ndim = 2 is also fine, but the operators have to be stacked.
+    number_of_threads : an int (optional).
+        The number of threads used to transform the operators.
+    pending_operators_to_add_to_block : a dict of strings and callables (optional).
+        The operators which are transformed only when someone uses them.
+	Each callable returns the operator to transform, see
+	:func:`make_tensor_later`.
+    adjoint_operators_to_add_to_block : a dict of strings (optional).
+        The operators which are the adjoint of other operator in the
+	block, and therefore are not transformed, with the name of this
+	other operator.
 
     Returns
     -------
     result : a Block.
         A block with the new transformed operators.
     """
+    if not isinstance(operators_to_add_to_block, OperatorBank):
+	operators_to_add_to_block = copy_to_operator_bank(
+		operators_to_add_to_block)
+    if pending_operators_to_add_to_block is None:
+	pending_operators_to_add_to_block = {}
     cols_of_transformation_matrix = transformation_matrix.shape[1]
     result = Block(cols_of_transformation_matrix)
-    for key in operators_to_add_to_block.keys():
-	result.add_operator(key)
-	result.operators[key] = transform_matrix(operators_to_add_to_block[key],
-			                         transformation_matrix)
+    result.transformation_matrix = transformation_matrix
+    keys = operators_to_add_to_block.keys()
+    #
+    # allocate the storage for the new block bank with one extra slot
+    # for the identity, and room for the pending operators, and transform
+    # all the operators straight into it.
+    #
+    identity = result.operators['id']
+    dtype = np.result_type(operators_to_add_to_block.dtype, 
+	                   transformation_matrix)
+    number_of_slots = len(keys) + 1 + len(pending_operators_to_add_to_block)
+    storage = np.empty((number_of_slots, cols_of_transformation_matrix,
+	                cols_of_transformation_matrix), dtype)
+    storage[0] = identity
+    if keys:
+	transform_matrices(operators_to_add_to_block.stack,
+		           transformation_matrix, number_of_threads,
+		           out=storage[1:len(keys) + 1])
+    result.operators = make_operator_bank(['id'] + keys, storage)
+    for key, make_matrix in pending_operators_to_add_to_block.items():
+	result.operators.add_pending(key, PendingOperator(make_matrix,
+		                     transformation_matrix))
+    if adjoint_operators_to_add_to_block is not None:
+	for key, adjoint_of in adjoint_operators_to_add_to_block.items():
+	    result.operators.add_adjoint(key, adjoint_of)
     return result
 
 class System(object):
@@ -59,6 +142,11 @@ class System(object):
 
     You use this class as a convenience class.
 
+    If you set `number_of_threads` to more than one, the operators are
+    transformed, and the terms of the hamiltonian applied in the Lanczos
+    iterations, in a pool of threads. In the latter, the threads of the
+    BLAS are limited, so all the threads together use all the cores.
+
     Examples
     --------
     >>> from dmrg101.core.sites import SpinOneHalfSite
@@ -120,9 +208,12 @@ class System(object):
 	    self.right_block = make_block_from_site(left_site)
 
 	self.h = CompositeOperator(self.get_left_dim(), self.get_right_dim())
-	self.operators_to_add_to_block = {}
-	self.old_left_blocks = []
-	self.old_right_blocks = []
+	self.operators_to_add_to_block = OperatorBank()
+	self.pending_operators_to_add_to_block = {}
+	self.adjoint_operators_to_add_to_block = {}
+	self.recipes_to_add_to_block = {}
+	self.old_left_blocks = BlockHistory()
+	self.old_right_blocks = BlockHistory()
 	# 
 	# start growing on the left, which may look as random as start
 	# growing on the right, but however the latter will ruin the
@@ -131,11 +222,216 @@ class System(object):
 	self.set_growing_side('left')
 	self.number_of_sites = None
 	self.model = None
+	self.number_of_threads = 1
+	self.number_of_processes = 1
+	self.distributed_hamiltonian = None
+	self.lazy_renormalization = False
+	self.left_block_size = None
+	self.ground_state_energy = None
+	self.ground_state_wf = None
+	self.initial_wf = None
+	self.lanczos_vectors_directory = None
+	self.buffer_pool = get_buffer_pool()
+	self.tensor_cache = {}
+
+    def keep_old_blocks_on_disk(self, directory=None, cache_size=2,
+		                background=False):
+	"""Keeps the old versions of the blocks on disk.
+
+	You use this function, before starting the DMRG algorithm, when
+	the blocks for all the lengths don't fit in memory. The old blocks
+	are saved to disk, and only the last `cache_size` blocks used on
+	each side are kept in memory. The blocks are loaded back (as
+	memory-mapped arrays) when you set a block to an old version.
+
+	If `background` is True, the blocks are saved in a background
+	thread, and in the finite algorithm the block needed in the next
+	step is loaded while the ground state is calculated, so the disk
+	I/O does not slow down the DMRG steps.
+
+	Parameters
+	----------
+	directory : a string (optional).
+	    The directory where the blocks are saved. If None, a temporary
+	    directory is used.
+	cache_size : an int (optional).
+	    The number of blocks of each side kept in memory.
+	background : a bool (optional).
+	    Whether the blocks are saved and loaded in a background thread.
+
+	Raises
+	------
+	DMRGException
+	    if there are old blocks already.
+	"""
+	if len(self.old_left_blocks) or len(self.old_right_blocks):
+	    raise DMRGException("Cannot move the old blocks once started")
+	self.old_left_blocks = OutOfCoreBlockHistory(directory, cache_size,
+		                                     'left', background)
+	self.old_right_blocks = OutOfCoreBlockHistory(directory, cache_size,
+		                                      'right', background)
+
+    def keep_compact_block_history(self, cache_size=2):
+	"""Keeps only the truncation matrices of the old blocks.
+
+	You use this function, before starting the DMRG algorithm, to
+	trade some recalculation for memory. Instead of all the operators
+	of the old blocks, only the truncation matrix and the block
+	Hamiltonian are kept for each length. The other operators are
+	rebuilt from the single site operators (see
+	:class:`CompactBlockHistory`) when you set a block to an old
+	version.
+
+	Parameters
+	----------
+	cache_size : an int (optional).
+	    The number of rebuilt blocks of each side kept in memory.
+
+	Raises
+	------
+	DMRGException
+	    if there are old blocks already.
+	"""
+	if len(self.old_left_blocks) or len(self.old_right_blocks):
+	    raise DMRGException("Cannot change the old blocks once started")
+	self.old_left_blocks = CompactBlockHistory(self.left_site, cache_size)
+	self.old_right_blocks = CompactBlockHistory(self.right_site,
+		                                    cache_size)
 
     def clear_hamiltonian(self):
         """Makes a brand new hamiltonian.
+
+	As this starts a new DMRG step, the tensor products made in the
+	last step are forgotten (see :meth:`get_tensor`.) Their matrices,
+	which include the ones of the old hamiltonian, are given back to
+	the buffer pool, so you must not keep using the old hamiltonian.
 	"""
+	self.clear_tensor_cache()
 	self.h = CompositeOperator(self.get_left_dim(), self.get_right_dim())
+	self.h.number_of_threads = self.number_of_threads
+
+    def get_tensor(self, block, block_op, site, site_op):
+	"""Gets the tensor product of an operator of a block and one of a site.
+
+	You use this function to get the tensor products for the
+	hamiltonian, the block hamiltonian, and the operators to update.
+	The same products are used a few times in each DMRG step (as the
+	identity times the block hamiltonian), so they are kept in
+	`self.tensor_cache`, and calculated only once. The cache is keyed
+	by the version of the block, so a product for a block which was
+	replaced is never used, and it's cleared when a new hamiltonian
+	is made.
+
+	Parameters
+	----------
+	block : a Block.
+	    The block with the small stride operator.
+	block_op : a string.
+	    The name of an operator in the block.
+	site : a Site.
+	    The site with the large stride operator.
+	site_op : a string.
+	    The name of an operator in the site.
+
+	Returns
+	-------
+	result : a numpy array of ndim = 2.
+	    The tensor product. It's shared, so you must not change it.
+	"""
+	key = (block.version, block_op, id(site), site_op)
+	if key not in self.tensor_cache:
+	    self.tensor_cache[key] = self.make_tensor_from_pool(
+		    block.operators[block_op], site.operators[site_op])
+	return self.tensor_cache[key]
+
+    def get_tensor_sum(self, block, site, side):
+	"""Gets a sum of tensor products of block and site operators.
+
+	The sum is kept in `self.tensor_cache`, as the tensor products,
+	keyed by the version of the block and the `side` itself, so it's
+	calculated only once in each DMRG step.
+
+	Parameters
+	----------
+	block : a Block.
+	    The block with the small stride operators.
+	site : a Site.
+	    The site with the large stride operators.
+	side : a tuple of tuples.
+	    Each product, as a tuple of the names of the block and site
+	    operators and its coefficient.
+
+	Returns
+	-------
+	result : a numpy array of ndim = 2.
+	    The sum. It's shared, so you must not change it.
+	param : a double/complex.
+	    A parameter which multiplies the sum. A single product is not
+	    scaled, and this is its coefficient.
+	"""
+	if len(side) == 1:
+	    block_op, site_op, param = side[0]
+	    return self.get_tensor(block, block_op, site, site_op), param
+	key = (block.version, id(site), id(side))
+	if key not in self.tensor_cache:
+	    self.tensor_cache[key] = self.make_tensor_sum_from_pool(
+		    [(self.get_tensor(block, block_op, site, site_op), param)
+		     for block_op, site_op, param in side])
+	return self.tensor_cache[key], 1.0
+
+    def make_tensor_sum_from_pool(self, tensors):
+	"""Makes a sum of tensor products in an array from the buffer pool.
+
+	Parameters
+	----------
+	tensors : a list of tuples.
+	    Each tensor product, and the parameter which multiplies it.
+	"""
+	dtype = np.result_type(*[item for pair in tensors for item in pair])
+	result = self.buffer_pool.get_zeros(tensors[0][0].shape, dtype)
+	for tensor, param in tensors:
+	    self.add_scaled_tensor(result, tensor, param)
+	return result
+
+    def add_scaled_tensor(self, result, tensor, param):
+	"""Adds a tensor product times a parameter to a matrix.
+
+	Parameters
+	----------
+	result : a numpy array of ndim = 2.
+	    The matrix you add the product to.
+	tensor : a numpy array of ndim = 2.
+	    The tensor product.
+	param : a double/complex.
+	    A parameter which multiplies the product.
+	"""
+	if param == 1.0:
+	    result += tensor
+	else:
+	    scaled = self.buffer_pool.get(tensor.shape,
+		                          np.result_type(tensor, param))
+	    np.multiply(tensor, param, out=scaled)
+	    result += scaled
+	    self.buffer_pool.release(scaled)
+
+    def clear_tensor_cache(self):
+	"""Forgets the tensor products, giving their matrices to the pool.
+	"""
+	self.buffer_pool.release_all(self.tensor_cache.values())
+	self.tensor_cache = {}
+
+    def make_tensor_from_pool(self, block_matrix, site_matrix):
+	"""Makes a tensor product in an array from the buffer pool.
+
+	You use this function to make the temporary tensor products in a
+	DMRG step. Give the result back to `self.buffer_pool` when you are
+	done with it.
+	"""
+	shape = (block_matrix.shape[0] * site_matrix.shape[0],
+		 block_matrix.shape[1] * site_matrix.shape[1])
+	out = self.buffer_pool.get(shape, np.result_type(block_matrix,
+		                                         site_matrix))
+	return make_tensor(block_matrix, site_matrix, out)
 
     def get_left_dim(self):
 	"""Gets the dimension of the Hilbert space of the left block
@@ -255,12 +551,73 @@ class System(object):
         >>> ising_fm_in_field.add_to_hamiltonian(right_site_op='s_z', param=-h)
         >>> ising_fm_in_field.add_to_hamiltonian(right_block_op='s_z', param=-h)
 	"""
-	left_side_op = make_tensor(self.left_block.operators[left_block_op],
-		                   self.left_site.operators[left_site_op])
-	right_side_op = make_tensor(self.right_block.operators[right_block_op],
-		                    self.right_site.operators[right_site_op])
+	if (self.is_pruned(self.left_block, left_block_op, 'left') or
+	    self.is_pruned(self.right_block, right_block_op, 'right')):
+	    return
+	left_side_op = self.get_tensor(self.left_block, left_block_op,
+		                       self.left_site, left_site_op)
+	right_side_op = self.get_tensor(self.right_block, right_block_op,
+		                        self.right_site, right_site_op)
 	self.h.add(left_side_op, right_side_op, param)
 	
+    def add_terms_to_hamiltonian(self, terms):
+	"""Adds a few terms to the hamiltonian.
+
+	You use this function to add the terms of a model compiled in a
+	table (see :class:`TermTable`), so the terms are not parsed again
+	at each step.
+
+	Parameters
+	----------
+	terms : a list of tuples.
+	    Each term, as a tuple of the four operators and the parameter,
+	    in the same order as the arguments of :meth:`add_to_hamiltonian`.
+	"""
+	for term in terms:
+	    self.add_to_hamiltonian(*term)
+
+    def add_compiled_terms_to_hamiltonian(self, entries):
+	"""Adds the terms of a compiled model to the hamiltonian.
+
+	You use this function to add the terms of a model compiled in a
+	table (see :class:`TermTable`) and grouped in entries (see
+	:func:`compile_terms`.) Each entry is a single tensor product, of a
+	sum of operators on the left side of the system and a sum on the
+	right side, so the hamiltonian has fewer components to apply in
+	the Lanczos iterations. The table has only the terms of the bonds
+	in the interaction graph of the model, so there's nothing pruned,
+	and the operators of the terms are not checked.
+
+	Parameters
+	----------
+	entries : a list of tuples.
+	    Each entry, as a tuple with its left and right sides, see
+	    :meth:`get_tensor_sum`.
+	"""
+	for left_side, right_side in entries:
+	    left_side_op, left_param = self.get_tensor_sum(self.left_block,
+		                                           self.left_site,
+							   left_side)
+	    right_side_op, right_param = self.get_tensor_sum(self.right_block,
+		                                             self.right_site,
+							     right_side)
+	    self.h.add(left_side_op, right_side_op, left_param * right_param)
+
+    def add_terms_to_block_hamiltonian(self, tmp_matrix_for_bh, terms):
+	"""Adds a few terms to the block hamiltonian.
+
+	Parameters
+	----------
+	tmp_matrix_for_bh : a numpy array of ndim = 2.
+	    An auxiliary matrix to keep track of the result.
+	terms : a list of tuples.
+	    Each term, as a tuple of the block and site operators and the
+	    parameter, see :meth:`add_to_block_hamiltonian`.
+	"""
+	for block_op, site_op, param in terms:
+	    self.add_to_block_hamiltonian(tmp_matrix_for_bh, block_op, site_op,
+		                          param)
+
     def add_to_operators_to_update(self, name, block_op='id', site_op='id'):
 	"""Adds a term to the hamiltonian.
 
@@ -269,6 +626,13 @@ class System(object):
 	going to be part of a term in the Hamiltonian in any later step in
 	the current sweep.
 
+	If `self.lazy_renormalization` is True, the operator is not
+	calculated now: the new block just keeps a recipe to calculate it,
+	and it's renormalized only if someone uses it, see
+	:func:`make_tensor_later`. In any case, the recipe is kept in the
+	`recipes` of the new block, so the operator can be rebuilt later
+	(see :class:`CompactBlockHistory`).
+
 	Parameters
 	----------
 	name : a string.
@@ -298,9 +662,92 @@ class System(object):
 	>>> print ising_fm_in_field.operators_to_add_to_block.keys()
 	('s_z')
 	"""
-	tmp = make_tensor(self.growing_block.operators[block_op],
-		          self.growing_site.operators[site_op])
-	self.operators_to_add_to_block[name] = tmp
+	self.recipes_to_add_to_block[name] = (block_op, site_op)
+	if self.lazy_renormalization:
+	    self.pending_operators_to_add_to_block[name] = make_tensor_later(
+		    self.growing_block, block_op, self.growing_site, site_op)
+	    return
+	self.operators_to_add_to_block[name] = self.get_tensor(
+		self.growing_block, block_op, self.growing_site, site_op)
+
+    def add_sum_to_operators_to_update(self, name, terms):
+	"""Adds a sum of terms to the list of operators to update.
+
+	You use this function to update an operator that is a sum of
+	operators in the block and the site, as the complementary
+	operators of long-range interactions, which keep in a single
+	operator the sum over all the sites of the block, see
+	:class:`LongRangeModel`. The sum is calculated now, even if
+	`self.lazy_renormalization` is True, and it has no recipe, so it's
+	always kept in the block history, as the block hamiltonian.
+
+	Parameters
+	----------
+	name : a string.
+	    The name of the operator you are including in the list to
+	    update.
+	terms : a list of tuples.
+	    Each term, as a tuple of the block and site operators and the
+	    parameter, see :meth:`add_to_block_hamiltonian`.
+
+	Examples
+	--------
+        >>> from dmrg101.core.sites import SpinOneHalfSite
+        >>> from dmrg101.core.system import System
+        >>> spin_one_half_site = SpinOneHalfSite()
+        >>> ising_fm = System(spin_one_half_site)
+	>>> # the total s_z of the block and the site
+        >>> ising_fm.add_sum_to_operators_to_update('s_z_total',
+	...     [('s_z', 'id', 1.0), ('id', 's_z', 1.0)])
+	"""
+	if self.growing_side == 'left':
+	    tmp_matrix_size = self.get_left_dim()
+        else:
+	    tmp_matrix_size = self.get_right_dim()
+	tmp_matrix = self.buffer_pool.get_zeros((tmp_matrix_size,
+		                                 tmp_matrix_size))
+	self.add_terms_to_block_hamiltonian(tmp_matrix, terms)
+	self.operators_to_add_to_block[name] = tmp_matrix
+	self.buffer_pool.release(tmp_matrix)
+
+    def add_adjoint_to_operators_to_update(self, name, adjoint_of):
+	"""Adds the adjoint of an operator to the list of operators to update.
+
+	You use this function instead of `add_to_operators_to_update` when
+	the operator you need is the adjoint (hermitian conjugate) of other
+	operator you are already updating, as the creation and annihilation
+	operators. The new block stores only one of them, and gives you a
+	transposed view for the other, so you save the memory and the
+	renormalization for one of them.
+
+	Parameters
+	----------
+	name : a string.
+	    The name of the operator you are including in the list to
+	    update.
+	adjoint_of : a string.
+	    The name of the operator in the list to update whose adjoint is
+	    `name`.
+
+	Raises
+	------
+	DMRGException 
+	    if `adjoint_of` is not in the list of operators to update.
+
+	Examples
+	--------
+        >>> from dmrg101.core.sites import SpinOneHalfSite
+        >>> from dmrg101.core.system import System
+        >>> spin_one_half_site = SpinOneHalfSite()
+        >>> heisenberg = System(spin_one_half_site)
+        >>> heisenberg.add_to_operators_to_update('s_p', site_op='s_p')
+        >>> heisenberg.add_adjoint_to_operators_to_update('s_m', 's_p')
+	"""
+	if (adjoint_of not in self.operators_to_add_to_block and
+	    adjoint_of not in self.pending_operators_to_add_to_block):
+	    raise DMRGException("Cannot update the adjoint of a missing "
+		                "operator")
+	self.adjoint_operators_to_add_to_block[name] = adjoint_of
 
     def add_to_block_hamiltonian(self, tmp_matrix_for_bh, block_op='id', 
 		                 site_op='id', param=1.0):
@@ -338,15 +785,21 @@ class System(object):
 	>>> # ... and then add the term coming from eating the current site.
         >>> ising_fm_in_field.add_to_block_hamiltonian('s_z', 's_z')
 	"""
-	tmp = make_tensor(self.growing_block.operators[block_op],
-		          self.growing_site.operators[site_op])
-	tmp_matrix_for_bh += param * tmp
+	if self.is_pruned(self.growing_block, block_op, self.growing_side):
+	    return
+	tmp = self.get_tensor(self.growing_block, block_op, self.growing_site,
+		              site_op)
+	self.add_scaled_tensor(tmp_matrix_for_bh, tmp, param)
 
     def update_all_operators(self, transformation_matrix):
 	"""Updates the operators and puts them in the block.
 
 	You use this function to actually create the operators that are
-	going to make the block after a DMRG iteration. 
+	going to make the block after a DMRG iteration. The old block is
+	kept to be used in the finite algorithm, as a read-only snapshot
+	that shares its operators with the block, so nothing is copied. If
+	the model has an interaction graph, the operators that won't be
+	used anymore are not updated, and are removed from the old block.
 
 	Parameters
 	----------
@@ -358,14 +811,143 @@ class System(object):
 	   A new block
 	"""
 	if self.growing_side == 'left':
-	    self.old_left_blocks.append(deepcopy(self.left_block))
-	    self.left_block = make_updated_block_for_site(
-		    transformation_matrix, self.operators_to_add_to_block)
+	    old_blocks = self.old_left_blocks
+	    old_block = self.left_block
+	else:
+	    old_blocks = self.old_right_blocks
+	    old_block = self.right_block
+	# the pruned operators are not needed to make the new block either
+	self.prune_block(old_block, self.growing_side, len(old_blocks) + 1)
+	old_blocks.append(old_block.snapshot())
+	self.prune_operators_to_add_to_block(len(old_blocks) + 1)
+	new_block = make_updated_block_for_site(
+		transformation_matrix, self.operators_to_add_to_block,
+		self.number_of_threads,
+		self.pending_operators_to_add_to_block,
+		self.adjoint_operators_to_add_to_block)
+	new_block.recipes = self.recipes_to_add_to_block
+	new_block.number_of_sites = len(old_blocks) + 1
+	if self.growing_side == 'left':
+	    self.left_block = new_block
 	else:
-	    self.old_right_blocks.append(deepcopy(self.right_block))
-	    self.right_block = make_updated_block_for_site(
-		    transformation_matrix, self.operators_to_add_to_block)
- 
+	    self.right_block = new_block
+	# the operators for the next step are a different size
+	self.operators_to_add_to_block = OperatorBank()
+	self.pending_operators_to_add_to_block = {}
+	self.adjoint_operators_to_add_to_block = {}
+	self.recipes_to_add_to_block = {}
+
+    def find_operators_not_needed(self, names, adjoints, side, block_size):
+	"""Finds which operators of a block won't be needed anymore.
+
+	Uses the interaction graph of the model (if the model has one) to
+	find out which operators don't have any interaction partner
+	outside a block. If an operator is needed, the one it is the
+	adjoint of is needed too.
+
+	Parameters
+	----------
+	names : a list of strings.
+	    The names of the operators of the block.
+	adjoints : a dict of strings.
+	    The operators which are adjoints, with the name of the operator
+	    they are the adjoint of.
+	side : a string.
+	    Which side, left or right, the block is.
+	block_size : an int.
+	    The number of sites of the block.
+
+	Returns
+	-------
+	result : a list of strings.
+	    The names of the operators not needed, with the adjoints first.
+	"""
+	graph = getattr(self.model, 'interaction_graph', None)
+	if graph is None or self.number_of_sites is None:
+	    return []
+	needed = set(name for name in names if 
+		     graph.is_needed(name, side, block_size, 
+			             self.number_of_sites))
+	for name, adjoint_of in adjoints.items():
+	    if name in needed:
+		needed.add(adjoint_of)
+	result = [name for name in names if name not in needed]
+	result.sort(key=lambda name: name not in adjoints)
+	return result
+
+    def is_pruned(self, block, name, side):
+	"""Finds out whether an operator was removed from a block.
+
+	An operator was removed (see :meth:`prune_block`) if it's not in
+	the block, and the interaction graph of the model says it's not
+	needed. The terms of the hamiltonian with this operator are for
+	bonds that are not in the graph, so they are skipped.
+
+	Parameters
+	----------
+	block : a Block.
+	    The block.
+	name : a string.
+	    The name of the operator.
+	side : a string.
+	    Which side, left or right, the block is.
+
+	Returns
+	-------
+	result : a bool.
+	    Whether the operator was removed.
+	"""
+	if name in block.operators:
+	    return False
+	graph = getattr(self.model, 'interaction_graph', None)
+	if (graph is None or self.number_of_sites is None or
+	    block.number_of_sites is None):
+	    return False
+	return not graph.is_needed(name, side, block.number_of_sites,
+		                   self.number_of_sites)
+
+    def prune_block(self, block, side, block_size):
+	"""Removes from a block the operators it won't need anymore.
+
+	Parameters
+	----------
+	block : a Block.
+	    The block you want to prune.
+	side : a string.
+	    Which side, left or right, the block is.
+	block_size : an int.
+	    The number of sites of the block.
+	"""
+	not_needed = self.find_operators_not_needed(block.operators.keys(),
+		                                    block.operators.adjoints,
+						    side, block_size)
+	for name in not_needed:
+	    del block.operators[name]
+
+    def prune_operators_to_add_to_block(self, new_block_size):
+	"""Removes the operators to update that the new block won't need.
+
+	You use this function before updating the operators, so you don't
+	transform operators that are not going to be used anymore.
+
+	Parameters
+	----------
+	new_block_size : an int.
+	    The number of sites of the new block.
+	"""
+	names = (self.operators_to_add_to_block.keys() + 
+		 self.pending_operators_to_add_to_block.keys() +
+		 self.adjoint_operators_to_add_to_block.keys())
+	not_needed = self.find_operators_not_needed(names, 
+		self.adjoint_operators_to_add_to_block, self.growing_side,
+		new_block_size)
+	for name in not_needed:
+	    if name in self.operators_to_add_to_block:
+		del self.operators_to_add_to_block[name]
+	    self.pending_operators_to_add_to_block.pop(name, None)
+	    self.adjoint_operators_to_add_to_block.pop(name, None)
+	    self.recipes_to_add_to_block.pop(name, None)
+
     def set_block_to_old_version(self, shrinking_size):
 	"""Sets the block for the shriking block to an old version.
 
@@ -387,6 +969,28 @@ class System(object):
 	else:
 	    self.right_block = self.old_right_blocks[shrinking_size-1]
 
+    def prefetch_old_block(self, shrinking_size):
+	"""Starts loading the old version of the shrinking block.
+
+	You use this function in the finite version of the DMRG algorithm
+	to tell the history of the shrinking block which old version is
+	going to be set in the next step, so it can be loaded while the
+	current step goes on. It does nothing if the old blocks are in
+	memory.
+
+	Parameters
+	----------
+	shrinking_size : an int.
+	    The size (not including the single site) of the shrinking side
+	    in the *next* step of the finite algorithm.
+	"""
+	if shrinking_size == 0:
+	    return
+	if self.shrinking_side == 'left':
+	    self.old_left_blocks.prefetch(shrinking_size-1)
+	else:
+	    self.old_right_blocks.prefetch(shrinking_size-1)
+
     def calculate_ground_state(self, initial_wf=None, min_lanczos_iterations=3, 
 		               too_many_iterations=1000, precision=0.000001):
 	"""Calculates the ground state of the system Hamiltonian.
@@ -394,7 +998,15 @@ class System(object):
 	You use this function to calculate the ground state energy and
 	wavefunction for the Hamiltonian of the system. The ground state
 	is calculated using the Lanczos algorithm. This is again a
-	convenience function.
+	convenience function. The results are also kept in
+	`self.ground_state_energy` and `self.ground_state_wf`, so they can
+	be saved in a checkpoint. If `self.lanczos_vectors_directory` is
+	not None, the Lanczos vectors are kept in files in that directory.
+	If `self.number_of_processes` is more than one, the hamiltonian is
+	applied in that many processes (see
+	:meth:`get_distributed_hamiltonian`.)
+	If `initial_wf` is None, and `self.initial_wf` has the right
+	dimensions, it is used as seed, only once (see :meth:`warm_start`.)
 	
         Parameters
         ----------
@@ -416,9 +1028,84 @@ class System(object):
         gs_wf : a Wavefunction.
             The ground state wavefunction (normalized.)
 	"""
-	return lanczos.calculate_ground_state(self.h, initial_wf, 
-			                      min_lanczos_iterations, 
-		                              too_many_iterations, precision)
+	if initial_wf is None and self.initial_wf is not None:
+	    if (self.initial_wf.as_matrix.shape == 
+		(self.get_left_dim(), self.get_right_dim())):
+		initial_wf = self.initial_wf
+	    self.initial_wf = None
+	if self.number_of_processes > 1:
+	    self.ground_state_energy, self.ground_state_wf = (
+		    lanczos.calculate_ground_state(
+			self.get_distributed_hamiltonian(), initial_wf,
+			min_lanczos_iterations, too_many_iterations,
+			precision, self.lanczos_vectors_directory) )
+	    return self.ground_state_energy, self.ground_state_wf
+	number_of_workers = min(self.h.number_of_threads,
+		                len(self.h.list_of_components))
+	blas_threads = None
+	if number_of_workers > 1:
+	    blas_threads = get_blas_threads_per_worker(number_of_workers)
+	with limit_blas_threads(blas_threads):
+	    self.ground_state_energy, self.ground_state_wf = (
+		    lanczos.calculate_ground_state(self.h, initial_wf,
+			                           min_lanczos_iterations,
+						   too_many_iterations, precision,
+						   self.lanczos_vectors_directory) )
+	return self.ground_state_energy, self.ground_state_wf
+
+    def get_distributed_hamiltonian(self):
+	"""Gets the hamiltonian, applied in several processes.
+
+	The processes are started the first time, and kept running for
+	the next DMRG steps, until you call :meth:`stop_processes`, or
+	change `self.number_of_processes`.
+
+	Returns
+	-------
+	result : a DistributedOperator.
+	    The hamiltonian.
+	"""
+	hamiltonian = self.distributed_hamiltonian
+	if (hamiltonian is not None and
+	    hamiltonian.number_of_processes == self.number_of_processes):
+	    hamiltonian.set_operator(self.h)
+	else:
+	    self.stop_processes()
+	    self.distributed_hamiltonian = DistributedOperator(
+		    self.h, self.number_of_processes)
+	return self.distributed_hamiltonian
+
+    def stop_processes(self):
+	"""Stops the processes applying the hamiltonian, if any.
+	"""
+	if self.distributed_hamiltonian is not None:
+	    self.distributed_hamiltonian.close()
+	    self.distributed_hamiltonian = None
+
+    def get_matrix_product_state(self, wf=None):
+	"""Gets a state of the system as a matrix product state.
+
+	You use this function at the end of a DMRG calculation to keep the
+	state, so you can measure it later without running DMRG again (see
+	:class:`MatrixProductState`).
+
+	Parameters
+	----------
+	wf : a Wavefunction (optional).
+	    A wavefunction for the current blocks of the system. If None,
+	    the ground state for the current blocks is calculated, as the
+	    last ground state calculated by the DMRG step was for the
+	    blocks *before* the step.
+
+	Returns
+	-------
+	result : a MatrixProductState.
+	    The state.
+	"""
+	if wf is None:
+	    self.set_hamiltonian()
+	    energy, wf = self.calculate_ground_state()
+	return make_matrix_product_state(self, wf)
 
     def get_truncation_matrix(self, ground_state_wf, number_of_states_kept):
         """Grows one side of the system by one site.
@@ -489,9 +1176,11 @@ class System(object):
 	    tmp_matrix_size = self.get_left_dim()
         else: 
 	    tmp_matrix_size = self.get_right_dim()
-	tmp_matrix_for_bh = np.zeros((tmp_matrix_size, tmp_matrix_size))
+	tmp_matrix_for_bh = self.buffer_pool.get_zeros((tmp_matrix_size,
+		                                        tmp_matrix_size))
 	self.model.set_block_hamiltonian(tmp_matrix_for_bh, self)
 	self.operators_to_add_to_block['bh'] = tmp_matrix_for_bh
+	self.buffer_pool.release(tmp_matrix_for_bh)
     
     def set_operators_to_update(self):
         """Sets the operators to update to be what you need to AF Heisenberg.
@@ -539,6 +1228,7 @@ class System(object):
         about precision at this stage.
         """
         self.set_growing_side('left')
+	self.left_block_size = left_block_size
         self.set_hamiltonian()
         ground_state_energy, ground_state_wf = self.calculate_ground_state()
         truncation_matrix, entropy, truncation_error = (
@@ -549,7 +1239,101 @@ class System(object):
 	else:
             self.grow_block_by_one_site(truncation_matrix)
         return ground_state_energy, entropy, truncation_error
-    
+
+    def get_symmetric_right_block_size(self, left_block_size):
+	"""Gets the size of the right block in the symmetric infinite DMRG.
+
+	The right block is as long as the left one, unless the chain has
+	an odd number of sites and this is the last step.
+	"""
+	return min(left_block_size,
+		   self.number_of_sites - left_block_size - 2)
+
+    def symmetric_infinite_dmrg_step(self, left_block_size,
+		                     number_of_states_kept):
+        """Performs one step of the symmetric infinite DMRG algorithm.
+
+	As :meth:`infinite_dmrg_step`, but the right block is the mirror
+	of the left one, so the system has `2 * left_block_size + 2`
+	sites, and grows two sites at each step for the cost of a single
+	truncation. The left block is grown with the truncation matrix,
+	and the right block is just a snapshot of the new left block,
+	sharing its operators. The old blocks of both sides are kept, so
+	the finite algorithm can start from the last step.
+
+	You use this function only for models that are the same when the
+	chain is reflected, and whose terms don't depend on the position
+	along the chain, with the same site at both sides.
+
+        Parameters
+        ----------
+	left_block_size : an int.
+	    The number of sites of the left block, not including the single site.
+        number_of_states_kept : an int.
+            The number of states you want to keep in each block after the
+    	    truncation.
+
+        Returns
+        -------
+        energy : a double.
+            The energy for the current size.
+        entropy : a double.
+            The Von Neumann entropy for the cut that splits the chain into two
+    	    equal halves.
+        truncation_error : a double.
+            The truncation error, i.e. the sum of the discarded eigenvalues of
+    	    the reduced density matrix.
+
+	Raises
+	------
+	DMRGException
+	    if the sites at both sides are different, or the system is
+	    longer than the chain.
+
+	Notes
+	-----
+	In the last step the system is the whole chain, with a left block
+	of `(number_of_sites - 1) // 2` sites (the right block is one
+	site shorter for an odd number of sites), and the blocks are not
+	grown. You start the finite algorithm from there, growing to the
+	left.
+
+	Examples
+	--------
+        >>> from dmrg101.core.sites import SpinOneHalfSite
+        >>> from dmrg101.core.system import System
+        >>> from dmrg101.utils.models.heisenberg_model import HeisenbergModel
+        >>> system = System(SpinOneHalfSite())
+        >>> system.model = HeisenbergModel()
+        >>> system.number_of_sites = 12
+        >>> for left_block_size in range(1, 6):
+        ...     energy, entropy, error = system.symmetric_infinite_dmrg_step(
+        ...         left_block_size, 16)
+        >>> for left_block_size in range(5, 10):
+        ...     energy, entropy, error = system.finite_dmrg_step(
+        ...         'left', left_block_size, 16)
+	"""
+	if self.left_site is not self.right_site:
+	    raise DMRGException("The sites at both sides must be the same")
+	right_block_size = self.get_symmetric_right_block_size(left_block_size)
+	if right_block_size < 1:
+	    raise DMRGException("System longer than the chain")
+        self.set_growing_side('left')
+	self.left_block_size = left_block_size
+        self.set_hamiltonian()
+        ground_state_energy, ground_state_wf = self.calculate_ground_state()
+        truncation_matrix, entropy, truncation_error = (
+	    self.get_truncation_matrix(ground_state_wf,
+		                       number_of_states_kept) )
+	if left_block_size + right_block_size + 2 == self.number_of_sites:
+	    return ground_state_energy, entropy, truncation_error
+	self.grow_block_by_one_site(truncation_matrix)
+	if self.get_symmetric_right_block_size(left_block_size + 1) > (
+		right_block_size):
+	    self.old_right_blocks.append(self.right_block)
+	    self.right_block = self.left_block.snapshot()
+        return ground_state_energy, entropy, truncation_error
+
     def finite_dmrg_step(self, growing_side, left_block_size, 
 		         number_of_states_kept):
         """Performs one step of the finite DMRG algorithm.
@@ -600,12 +1384,14 @@ class System(object):
     	    raise DMRGException('Growing side must be left or right.')
     
         self.set_growing_side(growing_side)
+	self.left_block_size = left_block_size
         self.set_hamiltonian()
+	shrinking_size = self.get_shriking_block_next_step_size(left_block_size)
+	self.prefetch_old_block(shrinking_size)
         ground_state_energy, ground_state_wf = self.calculate_ground_state()
         truncation_matrix, entropy, truncation_error = (
 	    self.get_truncation_matrix(ground_state_wf,
 		                       number_of_states_kept) )
-	shrinking_size = self.get_shriking_block_next_step_size(left_block_size)
 	if shrinking_size == 0:
 	    self.turn_around(self.shrinking_side)
 	else:
@@ -630,7 +1416,147 @@ class System(object):
 	"""
 	if new_growing_side == 'left':
 	    self.left_block = make_block_from_site(self.left_site)
-	    self.old_left_blocks = []
+	    self.old_left_blocks.clear()
 	else:
 	    self.right_block = make_block_from_site(self.right_site)
-	    self.old_right_blocks = []
+	    self.old_right_blocks.clear()
+
+    def warm_start(self, model):
+	"""Sets a new model, keeping the blocks made with the old one.
+
+	You use this function to run the finite algorithm for a model with
+	parameters close to the ones you just finished with, e.g. the next
+	point of a scan, starting from the blocks you have instead of from
+	single sites. The truncation matrices, and the operators that don't
+	depend on the parameters, are kept, and only the block hamiltonians
+	are made again with the new model (see
+	:meth:`rebuild_block_hamiltonians`.) The last ground state is the
+	seed of the Lanczos in the next step, so you continue sweeping
+	where you stopped, and a few sweeps are enough. You can warm start
+	anywhere in a sweep.
+
+	The new model must use the same operators as the old one, i.e.
+	only the parameters can change.
+
+	Parameters
+	----------
+	model : a model object.
+	    The new model.
+	"""
+	self.model = model
+	growing_side = getattr(self, 'growing_side', None)
+	left_block_size = self.left_block_size
+	for side in ('left', 'right'):
+	    self.rebuild_block_hamiltonians(side)
+	self.left_block_size = left_block_size
+	if growing_side is not None:
+	    self.set_growing_side(growing_side)
+	self.initial_wf = self.ground_state_wf
+
+    def rebuild_block_hamiltonians(self, side):
+	"""Makes again the block hamiltonians of one side with the model.
+
+	The block hamiltonian of each old block, and of the current one, is
+	made from the one of the block with one site less, as when the
+	blocks were grown, and transformed with the same truncation matrix.
+	The blocks are replaced by copies with the new block hamiltonian
+	(see :meth:`Block.copy`), so the old ones are not changed.
+
+	The blocks are matched by their number of sites, as the old block
+	with `i` sites is at the index `i` - 1 of the history. In the middle
+	of a sweep, the shrinking block is one of the old blocks, and it's
+	replaced by the same copy as in the history.
+
+	Parameters
+	----------
+	side : a string.
+	    Which side, left or right.
+
+	Raises
+	------
+	DMRGException 
+	    if `side` is not 'left' or 'right', or a block made by a DMRG
+	    transformation is missing the block with one site less.
+	"""
+	if side == 'left':
+	    history, site, block = (self.old_left_blocks, self.left_site,
+		                    self.left_block)
+	elif side == 'right':
+	    history, site, block = (self.old_right_blocks, self.right_site,
+		                    self.right_block)
+	else:
+	    raise DMRGException('Side must be left or right.')
+	blocks = dict((size, old_block) for size, old_block in
+		      enumerate(history, 1) if old_block is not None)
+	current_size = block.number_of_sites
+	if current_size is None:
+	    current_size = len(history) + 1
+	if current_size not in blocks or blocks[current_size] is block:
+	    blocks[current_size] = block
+	else:
+	    raise DMRGException("The current block is not in the history")
+	new_blocks = {}
+	for size in sorted(blocks):
+	    old_block = blocks[size]
+	    if old_block.transformation_matrix is not None:
+		if size - 1 not in new_blocks:
+		    raise DMRGException("Cannot rebuild the block hamiltonian "
+			                "without the previous block")
+		new_block = old_block.copy()
+		new_block.operators['bh'] = self.make_block_hamiltonian(
+			new_blocks[size - 1], site, old_block.transformation_matrix,
+			side)
+		old_block = new_block
+	    new_blocks[size] = old_block
+	new_history = [new_blocks.get(size) for size in
+		       range(1, len(history) + 1)]
+	history.clear()
+	for old_block in new_history:
+	    history.append(old_block)
+	if side == 'left':
+	    self.left_block = new_blocks[current_size]
+	else:
+	    self.right_block = new_blocks[current_size]
+
+    def make_block_hamiltonian(self, block, site, transformation_matrix,
+		               side='left'):
+	"""Makes the block hamiltonian for a block grown by one site.
+
+	The system is set as in the DMRG step where the block grew, i.e.
+	the growing side and the size of the left block, so models whose
+	couplings depend on the position get the right ones.
+
+	Parameters
+	----------
+	block : a Block.
+	    The block before growing.
+	site : a Site.
+	    The site added to the block.
+	transformation_matrix : a numpy array of ndim = 2.
+	    The truncation matrix of the grown block.
+	side : a string (optional).
+	    Which side, left or right, the block is.
+
+	Returns
+	-------
+	result : a numpy array of ndim = 2.
+	    The block hamiltonian of the grown block.
+	"""
+	self.set_growing_side(side)
+	if side == 'left':
+	    self.left_block_size = block.number_of_sites
+	elif self.number_of_sites is not None:
+	    self.left_block_size = (self.number_of_sites - 
+		                    block.number_of_sites - 2)
+	else:
+	    self.left_block_size = None
+	self.growing_block = block
+	self.growing_site = site
+	tmp_matrix_size = block.dim * site.dim
+	tmp_matrix_for_bh = self.buffer_pool.get_zeros((tmp_matrix_size,
+		                                        tmp_matrix_size))
+	self.model.set_block_hamiltonian(tmp_matrix_for_bh, self)
+	result = transform_matrix(tmp_matrix_for_bh, transformation_matrix)
+	self.buffer_pool.release(tmp_matrix_for_bh)
+	self.clear_tensor_cache()
+	return result
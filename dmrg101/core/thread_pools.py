@@ -0,0 +1,190 @@
+#
+# File: thread_pools.py
+# Author: Ivan Gonzalez
+#
+""" A module to share thread pools among the numerical routines.
+
+The module also limits the number of threads of the BLAS numpy is linked
+to, so the threads (or processes) of a pool don't oversubscribe the
+cores (see :func:`limit_blas_threads`.)
+"""
+import ctypes
+import importlib
+import warnings
+from contextlib import contextmanager
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+_thread_pools = {}
+
+# the numpy modules linked to the BLAS, in the numpy versions we know
+BLAS_LINKED_MODULES = ['numpy.core._multiarray_umath', 'numpy.core._dotblas',
+                       'numpy.core.multiarray', 'numpy.linalg.lapack_lite']
+# the functions to get and set the number of threads of the BLAS, for
+# OpenBLAS and MKL
+BLAS_THREAD_FUNCTIONS = [('openblas_get_num_threads',
+                          'openblas_set_num_threads'),
+                         ('MKL_Get_Max_Threads', 'MKL_Set_Num_Threads')]
+_blas_thread_functions = []
+
+def get_thread_pool(number_of_threads):
+    """Gets a thread pool with a given number of threads.
+
+    You use this function to get a pool of threads to spread some
+    numerical work, typically a few large matrix multiplications, which
+    release the GIL inside numpy. The pools are created the first time
+    you ask for them and reused afterwards, so you don't pay for
+    starting the threads at every DMRG step.
+
+    Parameters
+    ----------
+    number_of_threads : an int.
+        The number of threads in the pool.
+
+    Returns
+    -------
+    result : a multiprocessing.pool.ThreadPool.
+        A pool with `number_of_threads` threads.
+    """
+    if number_of_threads not in _thread_pools:
+        _thread_pools[number_of_threads] = ThreadPool(number_of_threads)
+    return _thread_pools[number_of_threads]
+
+def reset_thread_pools():
+    """Forgets the thread pools, without stopping their threads.
+
+    You use this function in a process started with `fork`. The pools
+    are copied from the parent process, but not their threads, so any
+    work sent to them would wait forever. New pools are created when
+    you ask for them again.
+    """
+    _thread_pools.clear()
+
+def split_in_chunks(number_of_items, number_of_chunks):
+    """Splits a range of items in contiguous chunks.
+
+    Parameters
+    ----------
+    number_of_items : an int.
+        The number of items to split.
+    number_of_chunks : an int.
+        The (maximum) number of chunks.
+
+    Returns
+    -------
+    result : a list of tuples of two ints.
+        The (begin, end) of each chunk. Empty chunks are not included.
+
+    Examples
+    --------
+    >>> from dmrg101.core.thread_pools import split_in_chunks
+    >>> print split_in_chunks(5, 2)
+    [(0, 3), (3, 5)]
+    """
+    number_of_chunks = max(1, min(number_of_chunks, number_of_items))
+    size, remainder = divmod(number_of_items, number_of_chunks)
+    result = []
+    begin = 0
+    for i in range(number_of_chunks):
+        end = begin + size + (1 if i < remainder else 0)
+        result.append((begin, end))
+        begin = end
+    return result
+
+@contextmanager
+def no_limits():
+    yield
+
+def find_blas_thread_functions():
+    """Finds the functions to get and set the number of threads of the BLAS.
+
+    The functions are looked up (with `ctypes`) in the libraries of the
+    numpy modules linked to the BLAS, which works for OpenBLAS and MKL.
+    They are looked up only once.
+
+    Returns
+    -------
+    result : a tuple of two ctypes functions, or None.
+        The functions to get and set the number of threads, or None if
+        they are not found.
+    """
+    if not _blas_thread_functions:
+        result = None
+        for module_name in BLAS_LINKED_MODULES:
+            try:
+                library = ctypes.CDLL(importlib.import_module(
+                    module_name).__file__)
+            except (ImportError, OSError, AttributeError):
+                continue
+            for get_name, set_name in BLAS_THREAD_FUNCTIONS:
+                if hasattr(library, get_name) and hasattr(library, set_name):
+                    result = (getattr(library, get_name),
+                              getattr(library, set_name))
+                    break
+            if result is not None:
+                break
+        _blas_thread_functions.append(result)
+    return _blas_thread_functions[0]
+
+@contextmanager
+def set_blas_threads(functions, number_of_threads):
+    """Sets the number of threads of the BLAS, and sets it back afterwards.
+    """
+    get_number_of_threads, set_number_of_threads = functions
+    old_number_of_threads = get_number_of_threads()
+    set_number_of_threads(number_of_threads)
+    try:
+        yield
+    finally:
+        set_number_of_threads(old_number_of_threads)
+
+def limit_blas_threads(number_of_threads):
+    """Limits the number of threads used by the BLAS.
+
+    You use this function when you run numerical work in a pool of
+    threads, or of processes, so each one calling the BLAS does not start
+    as many threads as cores, and the cores are not oversubscribed. The
+    limit is set with `threadpoolctl`, if it's installed, or calling
+    the BLAS directly, if it's OpenBLAS or MKL (see
+    :func:`find_blas_thread_functions`.)
+
+    Otherwise, you get a warning, and the limit is not set. Then you
+    set the number of threads of the BLAS with the environment variables
+    (as OMP_NUM_THREADS or OPENBLAS_NUM_THREADS) before starting python.
+
+    The number of threads of the BLAS is the same for all the threads
+    of the process, so you set the limit in the thread which starts the
+    pool, not in the threads of the pool.
+
+    Parameters
+    ----------
+    number_of_threads : an int.
+        The number of threads used by the BLAS. If None, there is no
+        limit.
+
+    Returns
+    -------
+    result : a context manager.
+        The limit holds inside the `with` block.
+    """
+    if number_of_threads is None:
+        return no_limits()
+    if threadpool_limits is not None:
+        return threadpool_limits(limits=number_of_threads, user_api='blas')
+    functions = find_blas_thread_functions()
+    if functions is None:
+        warnings.warn("Cannot limit the number of threads of the BLAS",
+                      RuntimeWarning)
+        return no_limits()
+    return set_blas_threads(functions, number_of_threads)
+
+def get_blas_threads_per_worker(number_of_workers):
+    """Gets the number of BLAS threads for each thread in a pool.
+
+    That is the number of cores split evenly among the threads.
+    """
+    return max(1, cpu_count() // number_of_workers)
@@ -2,10 +2,12 @@
 # File: transform_matrix.py
 # Author: Ivan Gonzalez
 #
-""" A function to transform a matrix to a new (truncated) basis.
+""" Functions to transform matrices to a new (truncated) basis.
 """
 import numpy as np
 from dmrg_exceptions import DMRGException
+from thread_pools import get_thread_pool, split_in_chunks
+from buffer_pool import get_buffer_pool
 
 def transform_matrix(matrix_to_transform, transformation_matrix):
     """Transforms a matrix to a new (truncated) basis.
@@ -47,11 +49,230 @@ def transform_matrix(matrix_to_transform, transformation_matrix):
     >>> transformed_matrix = transform_matrix(original_matrix, evecs)
     >>> print transformed_matrix
     [[ 1.  0.]
-     [ 0.  1.]] 
+     [ 0.  1.]]
     """
     if matrix_to_transform.shape[0] != matrix_to_transform.shape[1]:
 	raise DMRGException("Cannot transform a non-square matrix")
     if matrix_to_transform.shape[0] != transformation_matrix.shape[0]:
 	raise DMRGException("Matrix and transformation don't fit")
-    tmp = np.dot(matrix_to_transform, transformation_matrix)
-    return np.dot(np.conj(transformation_matrix.transpose()), tmp)
+    buffer_pool = get_buffer_pool()
+    tmp = buffer_pool.get((matrix_to_transform.shape[0],
+	                   transformation_matrix.shape[1]),
+			  np.result_type(matrix_to_transform,
+			                 transformation_matrix))
+    np.dot(matrix_to_transform, transformation_matrix, out=tmp)
+    result = np.dot(np.conj(transformation_matrix.transpose()), tmp)
+    buffer_pool.release(tmp)
+    return result
+
+def get_adjoint(transformation_matrix):
+    """Gets the hermitian conjugate of the transformation matrix.
+
+    For real matrices it is just a transposed view, i.e. no copy is made.
+    """
+    if np.iscomplexobj(transformation_matrix):
+        return np.conj(transformation_matrix.transpose())
+    return transformation_matrix.transpose()
+
+def transform_stack(matrices_to_transform, transformation_matrix, 
+		    adjoint_of_transformation_matrix, out=None):
+    """Transforms a stack of matrices using two large matrix products.
+
+    The stack of matrices is multiplied as a whole by the transformation
+    matrix on the right, and the result is reshuffled in a single
+    (rows, matrices * cols) matrix to be multiplied by the adjoint of the
+    transformation on the left. The intermediate results are kept in
+    arrays from the buffer pool (see :func:`get_buffer_pool`.)
+
+    Parameters
+    ----------
+    matrices_to_transform : a numpy array of ndim = 3.
+        The matrices you want to transform. The first index labels the
+	matrix.
+    transformation_matrix : a numpy array of ndim = 2.
+        The transformation matrix.
+    adjoint_of_transformation_matrix : a numpy array of ndim = 2.
+        The hermitian conjugate of `transformation_matrix`.
+    out : a numpy array of ndim = 3 (optional).
+        Where to put the result. If None, a new array is created.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 3.
+        The matrices transformed to the new (truncated) basis.
+    """
+    number_of_matrices, rows, cols = matrices_to_transform.shape
+    new_dim = transformation_matrix.shape[1]
+    buffer_pool = get_buffer_pool()
+    dtype = np.result_type(matrices_to_transform, transformation_matrix)
+    tmp = buffer_pool.get((number_of_matrices * rows, new_dim), dtype)
+    np.dot(matrices_to_transform.reshape(number_of_matrices * rows, cols),
+	   transformation_matrix, out=tmp)
+    shuffled = buffer_pool.get((rows, number_of_matrices, new_dim), dtype)
+    shuffled[...] = tmp.reshape(number_of_matrices, rows, 
+	                        new_dim).transpose(1, 0, 2)
+    buffer_pool.release(tmp)
+    dtype = np.result_type(adjoint_of_transformation_matrix, shuffled)
+    result = buffer_pool.get((new_dim, number_of_matrices * new_dim), dtype)
+    np.dot(adjoint_of_transformation_matrix, 
+	   shuffled.reshape(rows, number_of_matrices * new_dim), out=result)
+    buffer_pool.release(shuffled)
+    if out is None:
+	out = np.empty((number_of_matrices, new_dim, new_dim), dtype)
+    out[...] = result.reshape(new_dim, number_of_matrices, 
+	                      new_dim).transpose(1, 0, 2)
+    buffer_pool.release(result)
+    return out
+
+def transform_matrices(matrices_to_transform, transformation_matrix,
+		       number_of_threads=1, out=None):
+    """Transforms a stack of matrices to a new (truncated) basis.
+
+    You use this function to perform the same change of basis to a bunch
+    of matrices at once, as when you renormalize all the operators of a
+    block. Instead of doing two matrix products per matrix, the whole
+    stack is transformed with a couple of large products, which use
+    the BLAS much more efficiently, and the adjoint of the transformation
+    matrix is calculated only once.
+    
+    If `number_of_threads` is larger than one, the stack is split in
+    chunks which are transformed in a pool of threads.
+
+    Parameters
+    ----------
+    matrices_to_transform : a numpy array of ndim = 3.
+        The matrices you want to transform. The first index labels the
+	matrix.
+    transformation_matrix : a numpy array of ndim = 2.
+        The transformation matrix.
+    number_of_threads : an int (optional).
+        The number of threads used to perform the transformation.
+    out : a numpy array of ndim = 3 (optional).
+        Where to put the result, e.g. the storage of an operator bank. If
+	None, a new array is created.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 3.
+        The matrices transformed to the new (truncated) basis. The first
+	index labels the matrices in the same order as in
+	`matrices_to_transform`.
+
+    Raises
+    ------
+    DMRGException
+        if `matrices_to_transform` are not square, or
+	`transformation_matrix` don't fit `matrices_to_transform`.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from dmrg101.core.reduced_DM import diagonalize
+    >>> from dmrg101.core.transform_matrix import transform_matrices
+    >>> original_matrices = np.array([np.eye(2), 2 * np.eye(2)])
+    >>> symmetric_matrix = np.array([[0.8, 0.5],
+    ...                              [0.5, -0.25]])
+    >>> evals, evecs = diagonalize(symmetric_matrix)
+    >>> transformed_matrices = transform_matrices(original_matrices, evecs)
+    >>> print transformed_matrices[1]
+    [[ 2.  0.]
+     [ 0.  2.]]
+    """
+    matrices_to_transform = np.asarray(matrices_to_transform)
+    if matrices_to_transform.ndim != 3:
+	raise DMRGException("Need a stack of matrices to transform")
+    if matrices_to_transform.shape[1] != matrices_to_transform.shape[2]:
+	raise DMRGException("Cannot transform a non-square matrix")
+    if matrices_to_transform.shape[1] != transformation_matrix.shape[0]:
+	raise DMRGException("Matrix and transformation don't fit")
+
+    adjoint = get_adjoint(transformation_matrix)
+    number_of_matrices = matrices_to_transform.shape[0]
+    if number_of_threads <= 1 or number_of_matrices <= 1:
+	return transform_stack(matrices_to_transform, transformation_matrix,
+			       adjoint, out)
+
+    if out is None:
+	new_dim = transformation_matrix.shape[1]
+	out = np.empty((number_of_matrices, new_dim, new_dim),
+		       np.result_type(matrices_to_transform, 
+			              transformation_matrix))
+
+    def transform_chunk(chunk):
+	begin, end = chunk
+	transform_stack(matrices_to_transform[begin:end],
+			transformation_matrix, adjoint, out[begin:end])
+
+    chunks = split_in_chunks(number_of_matrices, number_of_threads)
+    get_thread_pool(number_of_threads).map(transform_chunk, chunks)
+    return out
+
+def multiply_stacks(a, b):
+    """Multiplies two stacks of matrices, matrix by matrix.
+
+    You use this function as `np.matmul`, which is not in the numpy
+    versions we support. A matrix with ndim = 2 multiplies all the
+    matrices of the other stack.
+
+    Parameters
+    ----------
+    a : a numpy array of ndim = 3 or 2.
+        The matrices on the left.
+    b : a numpy array of ndim = 3 or 2.
+        The matrices on the right.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 3.
+        The products.
+    """
+    if b.ndim == 2:
+	# a single product for the whole stack
+	return np.dot(a.reshape(-1, a.shape[-1]), b).reshape(
+		a.shape[:-1] + (b.shape[-1],))
+    if a.ndim == 2:
+	return np.array([np.dot(a, matrix) for matrix in b])
+    return np.array([np.dot(left, right) for left, right in zip(a, b)])
+
+def transform_batch(matrices_to_transform, transformation_matrices):
+    """Transforms a batch of matrices, each with its own transformation.
+
+    You use this function when you run several DMRG calculations in
+    lockstep (see :class:`BatchSystem`), so the matrices of all of them
+    are transformed at once (see :func:`multiply_stacks`.)
+
+    Parameters
+    ----------
+    matrices_to_transform : a numpy array of ndim = 3 or 2.
+        The matrices you want to transform. The first index labels the
+	calculation. A matrix with ndim = 2 is the same for all of them.
+    transformation_matrices : a numpy array of ndim = 3.
+        The transformation matrices, the first index labelling the
+	calculation.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 3.
+        The matrices transformed to the new (truncated) bases.
+
+    Raises
+    ------
+    DMRGException
+        if the matrices are not square, or the transformations don't fit
+	them.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from dmrg101.core.transform_matrix import transform_batch
+    >>> transformations = np.array([np.eye(2)[:, :1], np.eye(2)[:, 1:]])
+    >>> print transform_batch(np.diag([1., 2.]), transformations).ravel()
+    [ 1.  2.]
+    """
+    if matrices_to_transform.shape[-1] != matrices_to_transform.shape[-2]:
+	raise DMRGException("Cannot transform a non-square matrix")
+    if matrices_to_transform.shape[-1] != transformation_matrices.shape[-2]:
+	raise DMRGException("Matrix and transformation don't fit")
+    tmp = multiply_stacks(matrices_to_transform, transformation_matrices)
+    return multiply_stacks(np.conj(transformation_matrices.transpose(0, 2, 1)),
+	                   tmp)
@@ -4,12 +4,43 @@
 #
 """ A module for the wavefunctions.
 """
+import tempfile
 from math import sqrt
 import numpy as np
+from scipy.linalg.blas import get_blas_funcs
 from dmrg_exceptions import DMRGException
 from braket import braket
+from shared_memory import copy_to_shared_memory
 
-def create_empty_like(wf):
+def make_memory_mapped_matrix(shape, num_type, directory=None):
+    """Makes a matrix backed by a temporary file.
+
+    You use this function to get a matrix that lives on disk rather
+    than in memory. The file is removed right away, so you don't have to
+    clean up anything: the disk space is freed when the matrix is
+    garbage collected.
+
+    Parameters
+    ----------
+    shape : a tuple of ints.
+        The shape of the matrix.
+    num_type : a numpy dtype.
+        The type of the matrix elements.
+    directory : a string (optional).
+        The directory for the file. If None, the default directory for
+	temporary files is used.
+
+    Returns
+    -------
+    result : a numpy memmap.
+        The matrix, full of zeros.
+    """
+    with tempfile.NamedTemporaryFile(dir=directory, 
+	                             prefix='dmrg101_wf_') as f:
+	result = np.memmap(f, dtype=num_type, mode='w+', shape=shape)
+    return result
+
+def create_empty_like(wf, directory=None):
     """Creates an new wavefunction empty but like the argument.
 
     You use this function to create wavefunctions with the same shape
@@ -20,6 +51,10 @@ def create_empty_like(wf):
     ----------
     wf : a Wavefunction.
         The wavefunction you want to 'empty_like'.
+    directory : a string (optional).
+        If not None, the new wavefunction is backed by a file in this
+	directory (see :func:`make_memory_mapped_matrix`), instead of
+	living in memory.
     
     Returns
     -------
@@ -36,6 +71,9 @@ def create_empty_like(wf):
     >>> print (wf.as_matrix.shape == empty_like_wf.as_matrix.shape)
     True
     """
+    if directory is not None:
+	return Wavefunction(wf.left_dim, wf.right_dim, wf.as_matrix.dtype,
+		            directory)
     result = Wavefunction(wf.left_dim, wf.right_dim, wf.num_type)
     result.as_matrix = np.empty_like(wf.as_matrix)
     return result
@@ -47,9 +85,21 @@ class Wavefunction(object):
     stored as matrices, the rows corresponding to the states of the
     left block, and the columns corresponding to the states of the
     right block. 
+
+    The matrix can be backed by a file instead of living in memory, see
+    :meth:`move_to_disk`. As any other numpy array, you can use it as
+    usual, but keep in mind that assigning a new matrix to `as_matrix`
+    brings the wavefunction back to memory.
+
+    The functions :meth:`axpy`, :meth:`scale`, and :meth:`dot` work in
+    place, i.e. without allocating any temporary matrix, so you use them
+    in loops that run many times, as the Lanczos iterations.
     
     """
-    def __init__(self, left_dim, right_dim, num_type='double'):
+    __slots__ = ('as_matrix', 'left_dim', 'right_dim', 'num_type')
+
+    def __init__(self, left_dim, right_dim, num_type='double', 
+		 directory=None):
     	"""Creates an empty wavefunction
     
     	The wavefunction has the correct dimensions, but their
@@ -64,6 +114,9 @@ class Wavefunction(object):
             The dimension of the Hilbert space of the right block
         num_type : a double or complex 
             The type of the wavefunction matrix elements.
+	directory : a string (optional).
+	    If not None, the matrix is backed by a file in this directory
+	    (see :func:`make_memory_mapped_matrix`).
     
     	Raises
 	------
@@ -72,8 +125,11 @@ class Wavefunction(object):
     	"""
     	super(Wavefunction, self).__init__()
     	try:
-    	    self.as_matrix = np.empty((left_dim, right_dim), 
-    				       num_type)
+	    if directory is None:
+		self.as_matrix = np.empty((left_dim, right_dim), num_type)
+	    else:
+		self.as_matrix = make_memory_mapped_matrix(
+			(left_dim, right_dim), num_type, directory)
     	except TypeError:
     	    raise DMRGException("Bad args for wavefunction")
 
@@ -81,6 +137,129 @@ class Wavefunction(object):
     	self.right_dim = right_dim
 	self.num_type = num_type
 
+    def __getstate__(self):
+	return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __setstate__(self, state):
+	for name, value in state.items():
+	    setattr(self, name, value)
+
+    def axpy(self, a, x):
+	"""Adds another wavefunction times a number, in place.
+
+	That is `self` becomes `self` + `a` * `x`. The matrix of `self` is
+	not reallocated, and no temporary matrix is made.
+
+	Parameters
+	----------
+	a : a double/complex.
+	    The number.
+	x : a Wavefunction.
+	    The other wavefunction.
+
+	Raises
+	------
+	DMRGException
+	    if the wavefunctions are not in the same Hilbert space.
+
+	Examples
+	--------
+	>>> import numpy as np
+        >>> from dmrg101.core.wavefunction import Wavefunction
+	>>> wf = Wavefunction(1, 2)
+	>>> wf.as_matrix = np.array([[1.0, 2.0]])
+	>>> other_wf = Wavefunction(1, 2)
+	>>> other_wf.as_matrix = np.array([[1.0, 1.0]])
+	>>> wf.axpy(-2.0, other_wf)
+	>>> print wf.as_matrix
+	[[-1.  0.]]
+	"""
+	y = self.as_matrix
+	if x.as_matrix.shape != y.shape:
+	    raise DMRGException("Wavefunctions are not in the same Hilbert "
+		                "space")
+	if (y.flags.c_contiguous and x.as_matrix.flags.c_contiguous and
+	    x.as_matrix.dtype == y.dtype and 
+	    np.result_type(a, y) == y.dtype):
+	    blas_axpy = get_blas_funcs('axpy', (x.as_matrix, y))
+	    # both are contiguous and of the same type, so y is updated
+	    blas_axpy(x.as_matrix.reshape(-1), y.reshape(-1), a=a)
+	else:
+	    y += a * x.as_matrix
+
+    def scale(self, a):
+	"""Multiplies the wavefunction by a number, in place.
+
+	Parameters
+	----------
+	a : a double/complex.
+	    The number.
+	"""
+	self.as_matrix *= a
+
+    def dot(self, other):
+	"""Calculates the braket with another wavefunction.
+
+	The same as `braket(self, other)`, i.e. `self` is hermitian
+	conjugated.
+
+	Parameters
+	----------
+	other : a Wavefunction.
+	    The ket.
+
+	Returns
+	-------
+	result : a double/complex.
+	    The braket.
+	"""
+	return braket(self, other)
+
+    def move_to_disk(self, directory=None):
+	"""Moves the matrix of the wavefunction to a file.
+
+	You use this function to keep wavefunctions that you won't need
+	for a while, as the Lanczos vectors, out of memory. The elements
+	are copied to a temporary file (see
+	:func:`make_memory_mapped_matrix`), which is used as the matrix
+	from now on.
+
+	Parameters
+	----------
+	directory : a string (optional).
+	    The directory for the file. If None, the default directory for
+	    temporary files is used.
+
+	Examples
+	--------
+	>>> import numpy as np
+        >>> from dmrg101.core.wavefunction import Wavefunction
+	>>> wf = Wavefunction(2, 2)
+	>>> wf.as_matrix = np.eye(2)
+	>>> wf.move_to_disk()
+	>>> print isinstance(wf.as_matrix, np.memmap), wf.as_matrix[1, 1]
+	True 1.0
+	"""
+	on_disk = make_memory_mapped_matrix(self.as_matrix.shape,
+		                            self.as_matrix.dtype, directory)
+	on_disk[:] = self.as_matrix
+	self.as_matrix = on_disk
+
+    def move_to_shared_memory(self, directory):
+	"""Moves the matrix of the wavefunction to shared memory.
+
+	You use this function before sending the wavefunction to another
+	process, so the matrix is mapped, and not copied, by the other
+	process (see :class:`SharedArray`.)
+
+	Parameters
+	----------
+	directory : a string.
+	    The directory for the shared memory, see
+	    :func:`make_shared_memory_directory`.
+	"""
+	self.as_matrix = copy_to_shared_memory(self.as_matrix, directory)
+
     def build_reduced_density_matrix(self, block_to_be_traced_over):
 	"""Constructs the reduced DM for this wavefunction.
 
@@ -159,7 +338,7 @@ class Wavefunction(object):
 
 	# get rid of the complex part, which should be 0.0, for complex wfs
 	if np.iscomplexobj(self.as_matrix):
-	    norm_squared = double(norm_squared.real)
+	    norm_squared = float(norm_squared.real)
 
 	result = sqrt(norm_squared)
 	return result
@@ -221,7 +400,8 @@ class Wavefunction(object):
 	>>> print norm
 	1.0
 	"""
-	self.as_matrix = 2 * np.random.rand(self.left_dim, self.right_dim) - 1
+	self.as_matrix[...] = 2 * np.random.rand(self.left_dim,
+		                                 self.right_dim) - 1
 	self.normalize()
     
     def set_to_zero(self):
@@ -239,4 +419,4 @@ class Wavefunction(object):
 	[[ 0.  0.]
          [ 0.  0.]]
 	"""
-	self.as_matrix = np.zeros((self.left_dim, self.right_dim))
+	self.as_matrix.fill(0)
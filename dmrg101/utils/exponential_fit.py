@@ -0,0 +1,97 @@
+#
+# File: exponential_fit.py
+# Author: Ivan Gonzalez
+#
+"""Fits couplings that depend on the distance to a sum of exponentials.
+
+You use this module to write a long-range coupling, as a power law, as
+a sum of a few exponentials:
+
+.. math::
+    J(r)\simeq\sum_{k}a_{k}\lambda_{k}^{r}
+
+Each exponential is easy to handle in DMRG, as the interaction of all
+the sites of a block with a site outside is just one operator of the
+block, see :class:`LongRangeModel`.
+
+The fit is done with the matrix pencil method: the exponentials are the
+ones of the largest singular values of the Hankel matrix made with the
+couplings, and the amplitudes are the least squares solution for them.
+"""
+import numpy as np
+from dmrg101.core.dmrg_exceptions import DMRGException
+
+def fit_exponential_sum(couplings, number_of_exponentials):
+    """Fits the couplings at each distance to a sum of exponentials.
+
+    Parameters
+    ----------
+    couplings : a list of doubles.
+        The coupling at each distance, starting at distance one.
+    number_of_exponentials : an int.
+        The number of exponentials in the sum.
+
+    Returns
+    -------
+    amplitudes : a numpy array of ndim = 1.
+        The amplitude of each exponential.
+    decays : a numpy array of ndim = 1.
+        The ratio of each exponential between consecutive distances.
+
+    Raises
+    ------
+    DMRGException
+        if there are not enough couplings for the fit, or the fit needs
+	complex exponentials.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from dmrg101.utils.exponential_fit import fit_exponential_sum
+    >>> distances = np.arange(1, 20)
+    >>> amplitudes, decays = fit_exponential_sum(0.5**distances +
+    ...                                          0.9**distances, 2)
+    >>> print np.round(sorted(decays), 6)
+    [ 0.5  0.9]
+    """
+    couplings = np.asarray(couplings, dtype=float)
+    if number_of_exponentials < 1:
+	raise DMRGException("Need at least one exponential")
+    if len(couplings) < 2 * number_of_exponentials:
+	raise DMRGException("Not enough couplings for the fit")
+    pencil_size = len(couplings) // 2
+    rows = len(couplings) - pencil_size
+    hankel = np.array([couplings[i:i + pencil_size + 1] for i in range(rows)])
+    u, s, vh = np.linalg.svd(hankel)
+    right_vectors = np.conj(vh[:number_of_exponentials]).transpose()
+    decays = np.linalg.eigvals(np.dot(np.linalg.pinv(right_vectors[:-1]),
+	                              right_vectors[1:]))
+    if np.any(np.abs(decays.imag) > 1e-10 * np.abs(decays)):
+	raise DMRGException("The fit needs complex exponentials")
+    decays = decays.real
+    distances = np.arange(1, len(couplings) + 1)
+    vandermonde = decays[np.newaxis, :] ** distances[:, np.newaxis]
+    # rcond=-1 (the machine precision) is understood by all numpy versions
+    amplitudes = np.linalg.lstsq(vandermonde, couplings, rcond=-1)[0]
+    return amplitudes, decays
+
+def calculate_exponential_sum(amplitudes, decays, distances):
+    """Calculates the couplings of a sum of exponentials.
+
+    Parameters
+    ----------
+    amplitudes : a numpy array of ndim = 1.
+        The amplitude of each exponential.
+    decays : a numpy array of ndim = 1.
+        The ratio of each exponential between consecutive distances.
+    distances : a numpy array of ndim = 1.
+        The distances.
+
+    Returns
+    -------
+    result : a numpy array of ndim = 1.
+        The coupling at each distance.
+    """
+    distances = np.asarray(distances)
+    return np.dot(np.asarray(decays)[np.newaxis, :] **
+		  distances[:, np.newaxis], amplitudes)
@@ -0,0 +1,429 @@
+"""A model for chains described by their terms, compiled in a table.
+
+You use this module to describe the hamiltonian of a chain by its on-site
+terms and its nearest-neighbour bonds, each one with a coefficient that
+can change from site to site, as a random coupling or a field at the
+boundary:
+
+.. math::
+    H=\sum_{i}\sum_{a}h^{a}_{i}O^{a}_{i}+
+    \sum_{i}\sum_{b}J^{b}_{i}A^{b}_{i}B^{b}_{i+1}
+
+The description is compiled once into a table with the terms of the
+hamiltonian and the block hamiltonian for each step of the DMRG
+algorithm, which the system adds as they are (see
+:meth:`System.add_compiled_terms_to_hamiltonian`.)
+
+Examples
+--------
+>>> from dmrg101.core.sites import SpinOneHalfSite
+>>> from dmrg101.core.system import System
+>>> from dmrg101.utils.models.chain_model import make_heisenberg_chain
+>>> # a Heisenberg chain with a field on the first site
+>>> model = make_heisenberg_chain()
+>>> model.add_site_term('s_z', [0.1, 0., 0., 0., 0., 0.])
+>>> system = System(SpinOneHalfSite())
+>>> system.model = model
+>>> system.number_of_sites = 6
+>>> for left_block_size in range(1, 4):
+...     energy, entropy, error = system.infinite_dmrg_step(left_block_size,
+...                                                        8)
+"""
+import numpy as np
+from collections import OrderedDict
+from dmrg101.core.dmrg_exceptions import DMRGException
+from dmrg101.core.interaction_graph import InteractionGraph
+
+def compile_terms(terms):
+    """Groups the terms of a hamiltonian into entries.
+
+    The terms with the same operators on the left side of the system
+    (the block and the site) are grouped in a single entry, with the sum
+    of their right sides, and so are the terms with the identity on the
+    whole right side, with the sum of their left sides. The system adds
+    each entry to the hamiltonian as a single tensor product (see
+    :meth:`System.add_compiled_terms_to_hamiltonian`.)
+
+    Parameters
+    ----------
+    terms : a list of tuples.
+        Each term, as a tuple of the four operators and the coefficient
+	(see :meth:`System.add_to_hamiltonian`.)
+
+    Returns
+    -------
+    result : a list of tuples.
+        Each entry, as a tuple with its left and right sides, and each
+	side a tuple of products, as tuples of the names of the block and
+	site operators and the coefficient.
+
+    Examples
+    --------
+    >>> from dmrg101.utils.models.chain_model import compile_terms
+    >>> entries = compile_terms([('s_z', 's_z', 'id', 'id', 1.0),
+    ...                          ('id', 's_z', 'id', 'id', 0.5),
+    ...                          ('id', 's_p', 's_m', 'id', 0.5),
+    ...                          ('id', 's_p', 's_z', 'id', 0.2)])
+    >>> for left_side, right_side in entries:
+    ...     print left_side, right_side
+    (('s_z', 's_z', 1.0), ('id', 's_z', 0.5)) (('id', 'id', 1.0),)
+    (('id', 's_p', 1.0),) (('id', 's_m', 0.5), ('id', 's_z', 0.2))
+    """
+    groups = OrderedDict()
+    for left_block_op, left_site_op, right_site_op, right_block_op, c in terms:
+	if right_block_op == 'id' and right_site_op == 'id':
+	    key = ('right', 'id', 'id')
+	    side = (left_block_op, left_site_op, c)
+	else:
+	    key = ('left', left_block_op, left_site_op)
+	    side = (right_block_op, right_site_op, c)
+	groups.setdefault(key, []).append(side)
+    result = []
+    for (grouped_by, block_op, site_op), sides in groups.items():
+	fixed_side = ((block_op, site_op, 1.0),)
+	if grouped_by == 'right':
+	    result.append((tuple(sides), fixed_side))
+	else:
+	    result.append((fixed_side, tuple(sides)))
+    return result
+
+class TermTable(object):
+    """The terms of a chain model for each step of the DMRG algorithm.
+
+    All the lists are indexed by the size of the left block in the step.
+    The sites are numbered from the left end of the chain, so in a step
+    with a left block of `l` sites, the single sites are `l` and `l+1`,
+    and the right block starts at site `l+2`. In the infinite algorithm,
+    the right block is a single site, so the hamiltonian is the one of
+    the first `l+3` sites of the chain.
+
+    Parameters
+    ----------
+    hamiltonian : a list of lists of tuples.
+        The terms of the hamiltonian not in the block hamiltonians,
+	grouped in entries (see :func:`compile_terms`.)
+    left_block : a list of lists of tuples.
+        The entries of the hamiltonian for a left block made of a single
+	site, which has no block hamiltonian.
+    right_block : a list of lists of tuples.
+        The same for the right block.
+    left_site_block_hamiltonian : a list of lists of tuples.
+        The on-site terms of a left block made of a single site, as terms
+	of the block hamiltonian when the block grows.
+    right_site_block_hamiltonian : a list of lists of tuples.
+        The same for the right block.
+    left_block_hamiltonian : a list of lists of tuples.
+        The terms of the block hamiltonian when the left block grows, as
+	tuples of the block and site operators and the coefficient (see
+	:meth:`System.add_to_block_hamiltonian`.)
+    right_block_hamiltonian : a list of lists of tuples.
+        The same when the right block grows.
+    left_operators : a list of strings.
+        The operators the left block needs for the bonds.
+    right_operators : a list of strings.
+        The operators the right block needs for the bonds.
+    """
+    def __init__(self, number_of_sites):
+	super(TermTable, self).__init__()
+	self.number_of_sites = number_of_sites
+	self.hamiltonian = []
+	self.left_block = []
+	self.right_block = []
+	self.left_site_block_hamiltonian = []
+	self.right_site_block_hamiltonian = []
+	self.left_block_hamiltonian = []
+	self.right_block_hamiltonian = []
+	self.left_operators = []
+	self.right_operators = []
+
+class ChainModel(object):
+    """A chain model described by its on-site terms and bonds.
+
+    You use this class to make a model for any chain with nearest
+    neighbour interactions, adding its terms with :meth:`add_site_term`
+    and :meth:`add_bond_term`. The coefficients are the same for all the
+    sites, or a list with one for each site (or bond), so you can make
+    chains with disorder, or fields at the boundaries. A coefficient can
+    also be a numpy array with one value per system of a
+    :class:`BatchSystem`, or a list of them.
+
+    The terms are compiled into a :class:`TermTable` the first time the
+    model is used in a chain with a given number of sites, and each DMRG
+    step just adds the terms in the table.
+
+    The blocks keep the operators of their last site needed for the
+    bonds, and the interaction graph of the model (see
+    :class:`InteractionGraph`) tells the system where the bonds are.
+    """
+    def __init__(self):
+	super(ChainModel, self).__init__()
+	self.site_terms = []
+	self.bond_terms = []
+	self.term_table = None
+	self.graph = None
+
+    def add_site_term(self, operator, coefficient=1.0):
+	"""Adds an on-site term.
+
+	Parameters
+	----------
+	operator : a string.
+	    The name of the single site operator.
+	coefficient : a double, or a list with one for each site (optional).
+	    The coefficient of the term.
+	"""
+	self.site_terms.append((operator, coefficient))
+	self.term_table = None
+	self.graph = None
+
+    def add_bond_term(self, left_operator, right_operator, coefficient=1.0):
+	"""Adds a term between nearest neighbours.
+
+	Parameters
+	----------
+	left_operator : a string.
+	    The name of the single site operator acting on the left site.
+	right_operator : a string.
+	    The name of the single site operator acting on the right site.
+	coefficient : a double, or a list with one for each bond (optional).
+	    The coefficient of the term, the bond `i` joining the sites `i`
+	    and `i+1`.
+	"""
+	self.bond_terms.append((left_operator, right_operator, coefficient))
+	self.term_table = None
+	self.graph = None
+
+    @property
+    def interaction_graph(self):
+	"""The interaction graph, with the bonds that are not zero.
+
+	The graph is read a few times in each DMRG step, so it's made once,
+	and kept until the model changes.
+	"""
+	if self.graph is None:
+	    self.graph = self.make_interaction_graph()
+	return self.graph
+
+    def make_interaction_graph(self):
+	"""Makes the interaction graph, with the bonds that are not zero.
+	"""
+	result = InteractionGraph()
+	for left_op, right_op, coefficient in self.bond_terms:
+	    if np.ndim(coefficient) == 0:
+		result.add_bond(left_op, right_op)
+	    else:
+		result.add_bond(left_op, right_op, 1,
+			        [i for i, c in enumerate(coefficient)
+				 if np.any(np.asarray(c) != 0)])
+	    result.add_block_operator(left_op, left_op)
+	    result.add_block_operator(right_op, right_op)
+	return result
+
+    def get_coefficients(self, coefficient, number_of_positions):
+	"""Gets the coefficient of a term at each position.
+
+	Raises
+	------
+	DMRGException
+	    if there's not one coefficient for each position.
+	"""
+	if np.ndim(coefficient) == 0:
+	    return [coefficient] * number_of_positions
+	if len(coefficient) != number_of_positions:
+	    raise DMRGException("Need one coefficient for each position")
+	return list(coefficient)
+
+    def compile(self, number_of_sites):
+	"""Compiles the terms for a chain into a table.
+
+	Parameters
+	----------
+	number_of_sites : an int.
+	    The number of sites of the chain.
+
+	Returns
+	-------
+	result : a TermTable.
+	    The table.
+	"""
+	def is_zero(coefficient):
+	    return np.all(np.asarray(coefficient) == 0)
+	def get_site_terms(i):
+	    if i < 0 or i >= number_of_sites:
+		return []
+	    return [(operator, c[i]) for operator, c in site_terms
+		    if not is_zero(c[i])]
+	def get_bond_terms(i):
+	    if i < 0 or i >= number_of_sites - 1:
+		return []
+	    return [(left_op, right_op, c[i]) for left_op, right_op, c
+		    in bond_terms if not is_zero(c[i])]
+	site_terms = [(operator, self.get_coefficients(c, number_of_sites))
+		      for operator, c in self.site_terms]
+	bond_terms = [(left_op, right_op,
+		       self.get_coefficients(c, number_of_sites - 1))
+		      for left_op, right_op, c in self.bond_terms]
+	result = TermTable(number_of_sites)
+	for l in range(number_of_sites - 2):
+	    hamiltonian = []
+	    hamiltonian += [('id', operator, 'id', 'id', c)
+		            for operator, c in get_site_terms(l)]
+	    hamiltonian += [('id', 'id', operator, 'id', c)
+		            for operator, c in get_site_terms(l + 1)]
+	    hamiltonian += [(left_op, right_op, 'id', 'id', c)
+		            for left_op, right_op, c in get_bond_terms(l - 1)]
+	    hamiltonian += [('id', left_op, right_op, 'id', c)
+		            for left_op, right_op, c in get_bond_terms(l)]
+	    hamiltonian += [('id', 'id', left_op, right_op, c)
+		            for left_op, right_op, c in get_bond_terms(l + 1)]
+	    result.hamiltonian.append(compile_terms(hamiltonian))
+	    result.left_block.append(compile_terms(
+		    [(operator, 'id', 'id', 'id', c)
+		     for operator, c in get_site_terms(l - 1)]))
+	    result.right_block.append(compile_terms(
+		    [('id', 'id', 'id', operator, c)
+		     for operator, c in get_site_terms(l + 2)]))
+	    result.left_site_block_hamiltonian.append(
+		    [(operator, 'id', c) for operator, c in get_site_terms(l - 1)])
+	    result.right_site_block_hamiltonian.append(
+		    [(operator, 'id', c) for operator, c in get_site_terms(l + 2)])
+	    result.left_block_hamiltonian.append(
+		    [(left_op, right_op, c)
+		     for left_op, right_op, c in get_bond_terms(l - 1)] +
+		    [('id', operator, c) for operator, c in get_site_terms(l)])
+	    result.right_block_hamiltonian.append(
+		    [(right_op, left_op, c)
+		     for left_op, right_op, c in get_bond_terms(l + 1)] +
+		    [('id', operator, c)
+		     for operator, c in get_site_terms(l + 1)])
+	result.left_operators = sorted(set(left_op for left_op, right_op, c
+		                           in self.bond_terms))
+	result.right_operators = sorted(set(right_op for left_op, right_op, c
+		                            in self.bond_terms))
+	return result
+
+    def get_term_table(self, system):
+	"""Gets the term table for the chain of a system.
+
+	The table is compiled if the model changed, or the chain has a
+	different number of sites.
+
+	Raises
+	------
+	DMRGException
+	    if the number of sites of the system is not set.
+	"""
+	if system.number_of_sites is None:
+	    raise DMRGException("The model needs the number of sites")
+	if (self.term_table is None or
+	    self.term_table.number_of_sites != system.number_of_sites):
+	    self.term_table = self.compile(system.number_of_sites)
+	return self.term_table
+
+    def set_hamiltonian(self, system):
+        """Sets a system Hamiltonian to the model Hamiltonian.
+
+        Parameters
+        ----------
+        system : a System.
+            The System you want to set the Hamiltonian for.
+        """
+	table = self.get_term_table(system)
+	l = system.left_block_size
+        system.clear_hamiltonian()
+        if 'bh' in system.left_block.operators.keys():
+            system.add_to_hamiltonian(left_block_op='bh')
+	else:
+	    system.add_compiled_terms_to_hamiltonian(table.left_block[l])
+        if 'bh' in system.right_block.operators.keys():
+            system.add_to_hamiltonian(right_block_op='bh')
+	else:
+	    system.add_compiled_terms_to_hamiltonian(table.right_block[l])
+	system.add_compiled_terms_to_hamiltonian(table.hamiltonian[l])
+
+    def set_block_hamiltonian(self, tmp_matrix_for_bh, system):
+        """Sets the block Hamiltonian to the model block Hamiltonian.
+
+	A block made of a single site has no block hamiltonian, so the
+	on-site terms of that site are added instead.
+
+        Parameters
+        ----------
+	tmp_matrix_for_bh : a numpy array of ndim = 2.
+	    An auxiliary matrix to keep track of the result.
+        system : a System.
+            The System you want to set the Hamiltonian for.
+        """
+	table = self.get_term_table(system)
+	l = system.left_block_size
+	if system.growing_side == 'left':
+	    site_block_hamiltonian = table.left_site_block_hamiltonian[l]
+	    block_hamiltonian = table.left_block_hamiltonian[l]
+	else:
+	    site_block_hamiltonian = table.right_site_block_hamiltonian[l]
+	    block_hamiltonian = table.right_block_hamiltonian[l]
+        if 'bh' in system.growing_block.operators.keys():
+            system.add_to_block_hamiltonian(tmp_matrix_for_bh, 'bh', 'id')
+	else:
+	    system.add_terms_to_block_hamiltonian(tmp_matrix_for_bh,
+		                                  site_block_hamiltonian)
+	system.add_terms_to_block_hamiltonian(tmp_matrix_for_bh,
+		                              block_hamiltonian)
+
+    def set_operators_to_update(self, system):
+        """Sets the operators to update to the ones for the bonds.
+
+        Parameters
+        ----------
+        system : a System.
+            The System you want to set the Hamiltonian for.
+        """
+	table = self.get_term_table(system)
+	if system.growing_side == 'left':
+	    names = table.left_operators
+	else:
+	    names = table.right_operators
+	for name in names:
+	    system.add_to_operators_to_update(name, site_op=name)
+
+def make_heisenberg_chain(couplings=1.0):
+    """Makes the Heisenberg chain.
+
+    Parameters
+    ----------
+    couplings : a double, or a list with one for each bond (optional).
+        The exchange couplings.
+
+    Returns
+    -------
+    result : a ChainModel.
+        The model, so you can add other terms.
+    """
+    result = ChainModel()
+    couplings = np.asarray(couplings)
+    result.add_bond_term('s_z', 's_z', couplings)
+    result.add_bond_term('s_p', 's_m', .5 * couplings)
+    result.add_bond_term('s_m', 's_p', .5 * couplings)
+    return result
+
+def make_transverse_field_ising_chain(H, couplings=1.0):
+    """Makes the Ising chain in a transverse field.
+
+    The signs are the ones of :class:`TranverseFieldIsingModel`.
+
+    Parameters
+    ----------
+    H : a double, or a list with one for each site.
+        The transverse field.
+    couplings : a double, or a list with one for each bond (optional).
+        The ferromagnetic couplings.
+
+    Returns
+    -------
+    result : a ChainModel.
+        The model, so you can add other terms.
+    """
+    result = ChainModel()
+    result.add_bond_term('s_z', 's_z', -np.asarray(couplings))
+    result.add_site_term('s_x', H)
+    return result
@@ -0,0 +1,116 @@
+"""A few convenience functions to setup the Heisenberg model with random
+couplings.
+
+.. math::
+    H=\sum_{i}J_{i}\vec{S}_{i}\cdot\vec{S}_{i+1}
+
+You use this model with a :class:`BatchSystem`, where each system of the
+batch is a disorder realization, i.e. has its own couplings.
+"""
+import numpy as np
+from dmrg101.core.dmrg_exceptions import DMRGException
+
+class DisorderedHeisenbergModel(object):
+    """Implements a few convenience functions for random-bond Heisenberg.
+
+    The sites are numbered from the left end of the chain, so in a DMRG
+    step with a left block of `l` sites, the left single site is the site
+    `l`, and the bonds in the hamiltonian are the ones with the left
+    block, between the single sites, and with the right block, i.e. the
+    bonds `l-1`, `l`, and `l+1`. In the infinite algorithm, the right
+    block is the site after the single sites, so the hamiltonian is the
+    one of the first sites of the chain.
+
+    Parameters
+    ----------
+    couplings : a numpy array of ndim = 2.
+        The coupling of each bond, the bond `i` being between the sites
+	`i` and `i+1`, for each realization, i.e. with shape
+	(batch_size, number_of_sites - 1).
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from dmrg101.utils.models.disordered_heisenberg_model import (
+    ...     DisorderedHeisenbergModel)
+    >>> couplings = np.random.uniform(0.5, 1.5, (100, 19))
+    >>> model = DisorderedHeisenbergModel(couplings)
+    """
+    def __init__(self, couplings):
+        super(DisorderedHeisenbergModel, self).__init__()
+	self.couplings = np.asarray(couplings)
+	if self.couplings.ndim != 2:
+	    raise DMRGException("Couplings must be one row per realization")
+
+    def get_couplings(self, bond):
+	"""Gets the couplings of a bond for all the realizations.
+
+	Raises
+	------
+	DMRGException
+	    if there is no such a bond.
+	"""
+	if bond < 0 or bond >= self.couplings.shape[1]:
+	    raise DMRGException("No coupling for this bond")
+	return self.couplings[:, bond]
+
+    def set_hamiltonian(self, system):
+        """Sets a system Hamiltonian to the random-bond Heisenberg one.
+
+        Parameters
+        ----------
+        system : a BatchSystem.
+            The System you want to set the Hamiltonian for.
+        """
+	system.clear_hamiltonian()
+	left_block_size = system.left_block_size
+        if 'bh' in system.left_block.operators.keys():
+            system.add_to_hamiltonian(left_block_op='bh')
+        if 'bh' in system.right_block.operators.keys():
+            system.add_to_hamiltonian(right_block_op='bh')
+	j = self.get_couplings(left_block_size + 1)
+        system.add_to_hamiltonian('id', 'id', 's_z', 's_z', j)
+        system.add_to_hamiltonian('id', 'id', 's_p', 's_m', .5 * j)
+        system.add_to_hamiltonian('id', 'id', 's_m', 's_p', .5 * j)
+	j = self.get_couplings(left_block_size)
+        system.add_to_hamiltonian('id', 's_z', 's_z', 'id', j)
+        system.add_to_hamiltonian('id', 's_p', 's_m', 'id', .5 * j)
+        system.add_to_hamiltonian('id', 's_m', 's_p', 'id', .5 * j)
+	j = self.get_couplings(left_block_size - 1)
+        system.add_to_hamiltonian('s_z', 's_z', 'id', 'id', j)
+        system.add_to_hamiltonian('s_p', 's_m', 'id', 'id', .5 * j)
+        system.add_to_hamiltonian('s_m', 's_p', 'id', 'id', .5 * j)
+
+    def set_block_hamiltonian(self, tmp_matrix_for_bh, system):
+        """Sets the block Hamiltonian to the random-bond Heisenberg one.
+
+	The new bond is the one between the block and the growing site.
+
+        Parameters
+        ----------
+	tmp_matrix_for_bh : a numpy array of ndim = 3.
+	    An auxiliary array to keep track of the result.
+        system : a BatchSystem.
+            The System you want to set the Hamiltonian for.
+        """
+	if system.growing_side == 'left':
+	    j = self.get_couplings(system.left_block_size - 1)
+	else:
+	    j = self.get_couplings(system.left_block_size + 1)
+        if 'bh' in system.growing_block.operators.keys():
+            system.add_to_block_hamiltonian(tmp_matrix_for_bh, 'bh', 'id')
+        system.add_to_block_hamiltonian(tmp_matrix_for_bh, 's_z', 's_z', j)
+        system.add_to_block_hamiltonian(tmp_matrix_for_bh, 's_p', 's_m', .5 * j)
+        system.add_to_block_hamiltonian(tmp_matrix_for_bh, 's_m', 's_p', .5 * j)
+
+    def set_operators_to_update(self, system):
+        """Sets the operators to update for random-bond Heisenberg.
+
+        Parameters
+        ----------
+        system : a BatchSystem.
+            The System you want to set the Hamiltonian for.
+        """
+        system.add_to_operators_to_update('s_z', site_op='s_z')
+        system.add_to_operators_to_update('s_p', site_op='s_p')
+        system.add_adjoint_to_operators_to_update('s_m', 's_p')
@@ -7,6 +7,8 @@
     S^{-}_{i}S^{\dagger}_{i+1}\right)\right]
 
 """
+from dmrg101.core.interaction_graph import make_nearest_neighbour_graph
+
 class HeisenbergModel(object):
     """Implements a few convenience functions for AF Heisenberg.
     
@@ -14,6 +16,8 @@ class HeisenbergModel(object):
     """
     def __init__(self):
         super(HeisenbergModel, self).__init__()
+	self.interaction_graph = make_nearest_neighbour_graph(
+		[('s_z', 's_z'), ('s_p', 's_m'), ('s_m', 's_p')])
 		
     def set_hamiltonian(self, system):
         """Sets a system Hamiltonian to the AF Heisenberg Hamiltonian.
@@ -70,8 +74,9 @@ class HeisenbergModel(object):
 	Notes
 	-----
 	The block Hamiltonian, althought needs to be updated, is treated
-	separately by the very functions in the `System` class.
+	separately by the very functions in the `System` class. The
+	operator `s_m` is the adjoint of `s_p`, so it's not stored.
         """
         system.add_to_operators_to_update('s_z', site_op='s_z')
         system.add_to_operators_to_update('s_p', site_op='s_p')
-        system.add_to_operators_to_update('s_m', site_op='s_m')
+        system.add_adjoint_to_operators_to_update('s_m', 's_p')
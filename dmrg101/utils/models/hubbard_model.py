@@ -7,6 +7,8 @@
     S^{-}_{i}S^{\dagger}_{i+1}\right)\right]
 
 """
+from dmrg101.core.interaction_graph import make_nearest_neighbour_graph
+
 class HubbardModel(object):
     """Implements a few convenience functions for Hubbard model.
     
@@ -14,6 +16,9 @@ class HubbardModel(object):
     """
     def __init__(self):
         super(HubbardModel, self).__init__()
+	self.interaction_graph = make_nearest_neighbour_graph(
+		[('c_up', 'c_up_dag'), ('c_up_dag', 'c_up'),
+		 ('c_down', 'c_down_dag'), ('c_down_dag', 'c_down')])
 	self.U = 0.
 		
     def set_hamiltonian(self, system):
@@ -81,10 +86,12 @@ class HubbardModel(object):
 	Notes
 	-----
 	The block Hamiltonian, althought needs to be updated, is treated
-	separately by the very functions in the `System` class.
+	separately by the very functions in the `System` class. The
+	creation operators are the adjoints of the annihilation ones, so
+	they are not stored.
         """
         system.add_to_operators_to_update('c_up', site_op='c_up')
-        system.add_to_operators_to_update('c_up_dag', site_op='c_up_dag')
+        system.add_adjoint_to_operators_to_update('c_up_dag', 'c_up')
         system.add_to_operators_to_update('c_down', site_op='c_down')
-        system.add_to_operators_to_update('c_down_dag', site_op='c_down_dag')
+        system.add_adjoint_to_operators_to_update('c_down_dag', 'c_down')
         system.add_to_operators_to_update('u', site_op='u')
@@ -0,0 +1,194 @@
+"""A few convenience functions to setup chains with long-range interactions.
+
+.. math::
+    H=\sum_{i<j}J(j-i)\sum_{b}c_{b}A^{b}_{i}B^{b}_{j}
+
+The coupling is written as a sum of exponentials (see
+:func:`fit_exponential_sum`):
+
+.. math::
+    J(r)=\sum_{k}a_{k}\lambda_{k}^{r}
+
+so the interactions of all the sites of a block with the sites outside
+are given by a few complementary operators, which keep the sum of the
+single site operators over all the sites of the block:
+
+.. math::
+    C^{b}_{k}=\sum_{i\in\textrm{block}}\lambda_{k}^{d_{i}}A^{b}_{i}
+
+where :math:`d_{i}` is the distance from the site `i` to the edge of
+the block. These operators are updated when the block grows, as
+:math:`C'=\lambda_{k}C\otimes 1+1\otimes A`, so each block keeps a
+number of operators that depends on the number of exponentials, but not
+on the range of the interaction.
+"""
+import numpy as np
+from dmrg101.core.dmrg_exceptions import DMRGException
+from dmrg101.utils.exponential_fit import (fit_exponential_sum,
+	calculate_exponential_sum)
+
+class LongRangeModel(object):
+    """Implements a few convenience functions for long-range interactions.
+
+    Parameters
+    ----------
+    interactions : a list of tuples.
+        Each interaction, as a tuple of the single site operator acting on
+	the left site, the one acting on the right site, and a coefficient.
+    amplitudes : a list of doubles.
+        The amplitude of each exponential of the coupling.
+    decays : a list of doubles.
+        The ratio of each exponential between consecutive distances.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from dmrg101.core.sites import SpinOneHalfSite
+    >>> from dmrg101.core.system import System
+    >>> from dmrg101.utils.models.long_range_model import (
+    ...     make_long_range_heisenberg_model)
+    >>> # a dipolar chain, with couplings fitted to two exponentials
+    >>> distances = np.arange(1, 6)
+    >>> model = make_long_range_heisenberg_model(1.0 / distances**3, 2)
+    >>> system = System(SpinOneHalfSite())
+    >>> system.model = model
+    >>> system.number_of_sites = 6
+    >>> for left_block_size in range(1, 4):
+    ...     energy, entropy, error = system.infinite_dmrg_step(left_block_size,
+    ...                                                        8)
+    >>> # the block keeps one operator per exponential, whatever its size
+    >>> print sorted(system.left_block.operators.keys())
+    ['bh', 'id', 's_m_sum_0', 's_m_sum_1', 's_p_sum_0', 's_p_sum_1', 's_z_sum_0', 's_z_sum_1']
+    """
+    def __init__(self, interactions, amplitudes, decays):
+        super(LongRangeModel, self).__init__()
+	if len(amplitudes) != len(decays):
+	    raise DMRGException("Need one amplitude for each exponential")
+	self.interactions = list(interactions)
+	self.amplitudes = np.asarray(amplitudes, dtype=float)
+	self.decays = np.asarray(decays, dtype=float)
+
+    def get_coupling(self, distance):
+	"""Gets the coupling between two sites at a given distance.
+	"""
+	return calculate_exponential_sum(self.amplitudes, self.decays,
+		                         [distance])[0]
+
+    def get_complementary_operator(self, block, operator, k):
+	"""Gets the name of a complementary operator in a block.
+
+	A block made of a single site has no complementary operators, as
+	they are just the single site operators.
+	"""
+	name = '%s_sum_%d' % (operator, k)
+	if name in block.operators.keys():
+	    return name
+	return operator
+
+    def set_hamiltonian(self, system):
+        """Sets a system Hamiltonian to the long-range Hamiltonian.
+
+	The interactions between the blocks and the sites, and between
+	the blocks, are given by the complementary operators.
+
+        Parameters
+        ----------
+        system : a System.
+            The System you want to set the Hamiltonian for.
+        """
+        system.clear_hamiltonian()
+        if 'bh' in system.left_block.operators.keys():
+            system.add_to_hamiltonian(left_block_op='bh')
+        if 'bh' in system.right_block.operators.keys():
+            system.add_to_hamiltonian(right_block_op='bh')
+	terms = []
+	for left_op, right_op, coefficient in self.interactions:
+	    terms.append(('id', left_op, right_op, 'id',
+		          coefficient * self.get_coupling(1)))
+	    for k, (amplitude, decay) in enumerate(zip(self.amplitudes,
+		                                       self.decays)):
+		c = coefficient * amplitude
+		left = self.get_complementary_operator(system.left_block,
+			                               left_op, k)
+		right = self.get_complementary_operator(system.right_block,
+			                                right_op, k)
+		terms.append((left, right_op, 'id', 'id', c * decay))
+		terms.append((left, 'id', right_op, 'id', c * decay**2))
+		terms.append(('id', left_op, 'id', right, c * decay**2))
+		terms.append(('id', 'id', left_op, right, c * decay))
+		terms.append((left, 'id', 'id', right, c * decay**3))
+	system.add_terms_to_hamiltonian(terms)
+
+    def set_block_hamiltonian(self, tmp_matrix_for_bh, system):
+        """Sets the block Hamiltonian to the long-range one.
+
+	The growing site interacts with all the sites of the block through
+	the complementary operators.
+
+        Parameters
+        ----------
+	tmp_matrix_for_bh : a numpy array of ndim = 2.
+	    An auxiliary matrix to keep track of the result.
+        system : a System.
+            The System you want to set the Hamiltonian for.
+        """
+        if 'bh' in system.growing_block.operators.keys():
+            system.add_to_block_hamiltonian(tmp_matrix_for_bh, 'bh', 'id')
+	terms = []
+	for left_op, right_op, coefficient in self.interactions:
+	    for k, (amplitude, decay) in enumerate(zip(self.amplitudes,
+		                                       self.decays)):
+		c = coefficient * amplitude * decay
+		if system.growing_side == 'left':
+		    terms.append((self.get_complementary_operator(
+			system.growing_block, left_op, k), right_op, c))
+		else:
+		    terms.append((self.get_complementary_operator(
+			system.growing_block, right_op, k), left_op, c))
+	system.add_terms_to_block_hamiltonian(tmp_matrix_for_bh, terms)
+
+    def set_operators_to_update(self, system):
+        """Sets the operators to update to the complementary operators.
+
+	Each complementary operator is updated from the one of the block,
+	as :math:`C'=\lambda_{k}C\otimes 1+1\otimes A`.
+
+        Parameters
+        ----------
+        system : a System.
+            The System you want to set the Hamiltonian for.
+        """
+	if system.growing_side == 'left':
+	    operators = set(left_op for left_op, right_op, coefficient
+		            in self.interactions)
+	else:
+	    operators = set(right_op for left_op, right_op, coefficient
+		            in self.interactions)
+	for operator in sorted(operators):
+	    for k, decay in enumerate(self.decays):
+		block_op = self.get_complementary_operator(
+			system.growing_block, operator, k)
+		system.add_sum_to_operators_to_update(
+			'%s_sum_%d' % (operator, k),
+			[(block_op, 'id', decay), ('id', operator, 1.0)])
+
+def make_long_range_heisenberg_model(couplings, number_of_exponentials):
+    """Makes the Heisenberg model with long-range couplings.
+
+    Parameters
+    ----------
+    couplings : a list of doubles.
+        The coupling at each distance, starting at distance one, as many
+	as you want to fit.
+    number_of_exponentials : an int.
+        The number of exponentials used to fit the couplings.
+
+    Returns
+    -------
+    result : a LongRangeModel.
+        The model.
+    """
+    amplitudes, decays = fit_exponential_sum(couplings,
+	                                     number_of_exponentials)
+    return LongRangeModel([('s_z', 's_z', 1.0), ('s_p', 's_m', 0.5),
+	                   ('s_m', 's_p', 0.5)], amplitudes, decays)
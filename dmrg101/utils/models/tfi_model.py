@@ -5,6 +5,8 @@ TFIM stands for Ising model in a transverse field, i.e.:
 .. math::
     H=\sum_{i}\left[S^{z}_{i}S^{z}_{i+1} + h S^{x}_{i}\right)\right]
 """
+from dmrg101.core.interaction_graph import make_nearest_neighbour_graph
+
 class TranverseFieldIsingModel(object):
     """Implements a few convenience functions for the TFIM.
     
@@ -12,6 +14,8 @@ class TranverseFieldIsingModel(object):
     """
     def __init__(self, H = 0):
         super(TranverseFieldIsingModel, self).__init__()
+	self.interaction_graph = make_nearest_neighbour_graph(
+		[('s_z', 's_z')])
 	self.H = H
 		
     def set_hamiltonian(self, system):
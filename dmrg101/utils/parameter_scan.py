@@ -0,0 +1,364 @@
+#
+# File: parameter_scan.py
+# Author: Ivan Gonzalez
+#
+""" A module to run DMRG for many values of the parameters of a model.
+
+You use this module to scan the parameters of a model, as the field in
+the transverse field Ising model, or the U in the Hubbard model. Each
+point of the scan is run in a pool of processes, so you use all the cores
+of a node, and the results are written to a single file.
+
+Examples
+--------
+>>> import os, shutil, tempfile
+>>> from dmrg101.core.sites import SpinOneHalfSite
+>>> from dmrg101.utils.models.tfi_model import TranverseFieldIsingModel
+>>> from dmrg101.utils.parameter_scan import make_grid, run_scan
+>>> grid = make_grid(H=[0.5, 1.0])
+>>> directory = tempfile.mkdtemp()
+>>> filename = os.path.join(directory, 'scan.json')
+>>> results = run_scan(TranverseFieldIsingModel, grid, SpinOneHalfSite,
+...                    8, 8, filename, number_of_processes=2)
+>>> print [result['parameters']['H'] for result in results]
+[0.5, 1.0]
+>>> shutil.rmtree(directory)
+"""
+import itertools
+import json
+import multiprocessing
+from multiprocessing import cpu_count
+import os
+import time
+import numpy as np
+from dmrg101.core.system import System
+from dmrg101.core.thread_pools import limit_blas_threads, split_in_chunks
+
+def make_grid(**values):
+    """Makes all the combinations of the values of some parameters.
+
+    Parameters
+    ----------
+    values : lists of values.
+        The values for each parameter, with the name of the parameter as
+	the keyword.
+
+    Returns
+    -------
+    result : a list of dicts.
+        The parameters for each point of the grid.
+
+    Examples
+    --------
+    >>> from dmrg101.utils.parameter_scan import make_grid
+    >>> grid = make_grid(U=[1.0, 2.0], t=[1.0])
+    >>> print [(point['U'], point['t']) for point in grid]
+    [(1.0, 1.0), (2.0, 1.0)]
+    """
+    names = sorted(values)
+    return [dict(zip(names, point)) for point in
+	    itertools.product(*[values[name] for name in names])]
+
+def make_system(site, model, number_of_sites):
+    """Makes a system for a model, with single sites as blocks.
+    """
+    system = System(site)
+    system.model = model
+    system.number_of_sites = number_of_sites
+    return system
+
+def run_infinite_dmrg(system, number_of_states_kept):
+    """Runs the infinite algorithm, until the blocks fill the chain.
+
+    Returns
+    -------
+    energy : a double.
+        The ground state energy in the last step.
+    entropy : a double.
+        The entanglement entropy in the last step.
+    truncation_error : a double.
+        The truncation error in the last step.
+    """
+    for left_block_size in range(1, system.number_of_sites - 2):
+	energy, entropy, truncation_error = system.infinite_dmrg_step(
+		left_block_size, number_of_states_kept)
+    return energy, entropy, truncation_error
+
+def run_finite_sweeps(system, number_of_states_kept, number_of_sweeps):
+    """Runs a few sweeps of the finite algorithm.
+
+    The system must be where the infinite algorithm, or the last sweep,
+    stopped, i.e. with the right block about to grow.
+
+    Returns
+    -------
+    energy : a double.
+        The ground state energy in the last step.
+    entropy : a double.
+        The entanglement entropy in the last step.
+    truncation_error : a double.
+        The truncation error in the last step.
+    """
+    last = system.number_of_sites - 3
+    for sweep in range(number_of_sweeps):
+	for left_block_size in range(last, 0, -1):
+	    energy, entropy, truncation_error = system.finite_dmrg_step(
+		    'right', left_block_size, number_of_states_kept)
+	for left_block_size in range(1, last + 1):
+	    energy, entropy, truncation_error = system.finite_dmrg_step(
+		    'left', left_block_size, number_of_states_kept)
+    return energy, entropy, truncation_error
+
+def run_dmrg(site, model, number_of_sites, number_of_states_kept,
+	     number_of_sweeps=1):
+    """Runs the infinite algorithm and a few sweeps of the finite one.
+
+    Parameters
+    ----------
+    site : a Site.
+        The single site.
+    model : a model object.
+        The model.
+    number_of_sites : an int.
+        The number of sites of the chain.
+    number_of_states_kept : an int.
+        The number of states kept in the blocks.
+    number_of_sweeps : an int (optional).
+        The number of sweeps, each one to the right and back.
+
+    Returns
+    -------
+    energy : a double.
+        The ground state energy in the last step.
+    entropy : a double.
+        The entanglement entropy in the last step.
+    truncation_error : a double.
+        The truncation error in the last step.
+    """
+    system = make_system(site, model, number_of_sites)
+    run_infinite_dmrg(system, number_of_states_kept)
+    return run_finite_sweeps(system, number_of_states_kept, number_of_sweeps)
+
+def make_model_for(make_model, parameters):
+    """Makes a model, and sets the parameters as its attributes.
+    """
+    model = make_model()
+    for name, value in parameters.items():
+	setattr(model, name, value)
+    return model
+
+def run_point(task):
+    """Runs DMRG for a point of a scan.
+
+    This is what the processes do. If anything fails, the error message
+    is returned in the result, so the rest of the scan goes on.
+
+    Returns
+    -------
+    index : an int.
+        The index of the point in the grid.
+    result : a dict.
+        The parameters, and the energy, entropy, and truncation error,
+	or the error message, and the time spent.
+    """
+    (index, make_model, parameters, make_site, number_of_sites,
+     number_of_states_kept, number_of_sweeps, blas_threads, seed) = task
+    result = {'parameters': parameters}
+    start = time.time()
+    try:
+	np.random.seed(seed)
+	model = make_model_for(make_model, parameters)
+	with limit_blas_threads(blas_threads):
+	    energy, entropy, truncation_error = run_dmrg(
+		    make_site(), model, number_of_sites,
+		    number_of_states_kept, number_of_sweeps)
+	result.update(energy=float(energy), entropy=float(entropy),
+		      truncation_error=float(truncation_error))
+    except Exception as e:
+	result['error'] = str(e)
+    result['seconds'] = time.time() - start
+    return index, result
+
+def run_points(tasks):
+    """Runs DMRG for a few points of a scan, each one from scratch.
+
+    Returns
+    -------
+    result : a list of tuples of an int and a dict.
+        The index of each point in the grid, and its result (see
+	:func:`run_point`.)
+    """
+    return [run_point(task) for task in tasks]
+
+def run_warm_started_points(task):
+    """Runs DMRG for a few points, each one warm started from the last.
+
+    This is what the processes do when the scan is warm started. The
+    first point is run from scratch, and the next ones start from the
+    blocks of the point before, running only a few sweeps (see
+    :meth:`System.warm_start`.) If anything fails at a point, the next
+    one is run from scratch.
+
+    Returns
+    -------
+    result : a list of tuples of an int and a dict.
+        The index of each point in the grid, and its result (see
+	:func:`run_point`.)
+    """
+    (points, make_model, make_site, number_of_sites, number_of_states_kept,
+     number_of_sweeps, warm_start_sweeps, blas_threads, seed) = task
+    results = []
+    system = None
+    for index, parameters in points:
+	result = {'parameters': parameters}
+	start = time.time()
+	try:
+	    np.random.seed(index if seed is None else seed)
+	    model = make_model_for(make_model, parameters)
+	    with limit_blas_threads(blas_threads):
+		warm_started = system is not None
+		if warm_started:
+		    system.warm_start(model)
+		    sweeps = warm_start_sweeps
+		else:
+		    system = make_system(make_site(), model, number_of_sites)
+		    run_infinite_dmrg(system, number_of_states_kept)
+		    sweeps = number_of_sweeps
+		energy, entropy, truncation_error = run_finite_sweeps(
+			system, number_of_states_kept, sweeps)
+	    result.update(energy=float(energy), entropy=float(entropy),
+			  truncation_error=float(truncation_error),
+			  warm_started=warm_started)
+	except Exception as e:
+	    result['error'] = str(e)
+	    system = None
+	result['seconds'] = time.time() - start
+	results.append((index, result))
+    return results
+
+def scan_parameters(make_model, grid, make_site, number_of_sites,
+		    number_of_states_kept, number_of_sweeps=1,
+		    number_of_processes=None, blas_threads=1, seed=None,
+		    warm_start_sweeps=None):
+    """Runs DMRG for each point of a grid of parameters, in processes.
+
+    You use this function to get the results of a scan as soon as each
+    point is done. The points are run in a pool of processes, and the
+    number of threads of the BLAS in each process is limited, so the
+    processes don't oversubscribe the cores (see
+    :func:`limit_blas_threads`.) If `number_of_processes` is 1, the
+    points are run one after the other in this process.
+
+    Neighbouring points of a scan have almost the same ground state, so
+    if `warm_start_sweeps` is not None, the grid is split in one chunk of
+    consecutive points per process, and in each chunk a point starts from
+    the blocks of the point before, running only a few sweeps, instead of
+    the infinite algorithm and all the sweeps (see
+    :func:`run_warm_started_points`.) The block hamiltonians of all the
+    lengths are made again for the new parameters, so this works for
+    models with terms depending on the site too.
+
+    Parameters
+    ----------
+    make_model : a callable.
+        Makes the model with no arguments, e.g. the model class. The
+	parameters of each point are set as attributes of the model.
+    grid : a list of dicts.
+        The parameters for each point, see :func:`make_grid`.
+    make_site : a callable.
+        Makes the single site with no arguments, e.g. the site class.
+    number_of_sites : an int.
+        The number of sites of the chain.
+    number_of_states_kept : an int.
+        The number of states kept in the blocks.
+    number_of_sweeps : an int (optional).
+        The number of sweeps of the finite algorithm.
+    number_of_processes : an int (optional).
+        The number of processes. If None, one per core.
+    blas_threads : an int (optional).
+        The number of threads of the BLAS in each process.
+    seed : an int (optional).
+        The seed for the random numbers at each point. If None, each
+	point uses its index in the grid, so the results don't depend on
+	which process runs it.
+    warm_start_sweeps : an int (optional).
+        If not None, the number of sweeps for the points warm started
+	from the point before.
+
+    Returns
+    -------
+    result : a generator of tuples of an int and a dict.
+        The index of the point in the grid, and the results for that
+	point (see :func:`run_point`), in the order they finish.
+    """
+    if warm_start_sweeps is None:
+	run = run_points
+	tasks = [[(index, make_model, parameters, make_site, number_of_sites,
+		   number_of_states_kept, number_of_sweeps, blas_threads,
+		   index if seed is None else seed)]
+		 for index, parameters in enumerate(grid)]
+    else:
+	run = run_warm_started_points
+	points = list(enumerate(grid))
+	chunks = split_in_chunks(len(points),
+		                 number_of_processes or cpu_count())
+	tasks = [(points[begin:end], make_model, make_site, number_of_sites,
+		  number_of_states_kept, number_of_sweeps, warm_start_sweeps,
+		  blas_threads, seed) for begin, end in chunks]
+    if number_of_processes == 1:
+	for task in tasks:
+	    for index, result in run(task):
+		yield index, result
+	return
+    pool = multiprocessing.Pool(number_of_processes)
+    try:
+	for results in pool.imap_unordered(run, tasks):
+	    for index, result in results:
+		yield index, result
+	pool.close()
+    finally:
+	pool.terminate()
+	pool.join()
+
+def run_scan(make_model, grid, make_site, number_of_sites,
+	     number_of_states_kept, filename, number_of_sweeps=1,
+	     number_of_processes=None, blas_threads=1, seed=None,
+	     callback=None, warm_start_sweeps=None):
+    """Runs a scan and writes all the results to a JSON file.
+
+    The arguments are the same as for :func:`scan_parameters`. The file
+    is written when all the points are done, replacing any old file only
+    at the end.
+
+    Parameters
+    ----------
+    filename : a string.
+        The name of the file.
+    callback : a callable (optional).
+        Called with the index and the result of each point as soon as
+	it's done, e.g. to print the progress.
+
+    Returns
+    -------
+    result : a list of dicts.
+        The results for each point, in the order of the grid.
+    """
+    results = [None] * len(grid)
+    for index, result in scan_parameters(make_model, grid, make_site,
+	                                 number_of_sites,
+					 number_of_states_kept,
+					 number_of_sweeps,
+					 number_of_processes, blas_threads,
+					 seed, warm_start_sweeps):
+	results[index] = result
+	if callback is not None:
+	    callback(index, result)
+    scan = {'number_of_sites': number_of_sites,
+	    'number_of_states_kept': number_of_states_kept,
+	    'number_of_sweeps': number_of_sweeps,
+	    'warm_start_sweeps': warm_start_sweeps,
+	    'results': results}
+    with open(filename + '.new', 'w') as f:
+	json.dump(scan, f, indent=1)
+    os.rename(filename + '.new', filename)
+    return results
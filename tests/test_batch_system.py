@@ -0,0 +1,87 @@
+'''
+File: test_batch_system.py
+Author: Ivan Gonzalez
+Description: Tests for running a batch of systems in lockstep
+'''
+import numpy as np
+import unittest
+from nose.tools import assert_true, eq_
+
+from dmrg101.core.batch_lanczos import calculate_ground_states
+from dmrg101.core.batch_operators import BatchCompositeOperator
+from dmrg101.core.batch_system import BatchSystem
+from dmrg101.core.operators import CompositeOperator
+from dmrg101.core.sites import SpinOneHalfSite
+from dmrg101.core.wavefunction import Wavefunction
+from dmrg101.utils.models.disordered_heisenberg_model import (
+	DisorderedHeisenbergModel)
+
+def calculate_exact_energy(couplings):
+    """Diagonalizes the random-bond Heisenberg chain exactly.
+    """
+    site = SpinOneHalfSite()
+    number_of_sites = len(couplings) + 1
+    def get_operator(name, i):
+	return np.kron(np.kron(np.eye(2**i), site.operators[name]),
+		       np.eye(2**(number_of_sites - i - 1)))
+    h = 0
+    for i, j in enumerate(couplings):
+	h = h + j * (np.dot(get_operator('s_z', i), get_operator('s_z', i+1)) +
+		     .5 * np.dot(get_operator('s_p', i), get_operator('s_m', i+1)) +
+		     .5 * np.dot(get_operator('s_m', i), get_operator('s_p', i+1)))
+    return np.linalg.eigvalsh(h)[0]
+
+class TestBatchCompositeOperator(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1)
+        self.left_ops = np.random.rand(3, 4, 4)
+        self.right_op = np.random.rand(2, 2)
+        self.parameters = np.array([1.0, -2.0, 0.5])
+        self.wfs = np.random.rand(3, 4, 2)
+
+    def test_same_as_each_composite(self):
+	batch = BatchCompositeOperator(3, 4, 2)
+	batch.add(self.left_ops, self.right_op, self.parameters)
+	batch.add(np.eye(4), self.right_op)
+	result = batch.apply(self.wfs)
+	for i in range(3):
+	    composite = CompositeOperator(4, 2)
+	    composite.add(self.left_ops[i], self.right_op, self.parameters[i])
+	    composite.add(np.eye(4), self.right_op)
+	    wf = Wavefunction(4, 2)
+	    wf.as_matrix = self.wfs[i]
+	    assert_true(np.allclose(result[i], composite.apply(wf).as_matrix))
+
+    def test_ground_states(self):
+	batch = BatchCompositeOperator(3, 4, 2)
+	symmetric = self.left_ops + self.left_ops.transpose(0, 2, 1)
+	batch.add(symmetric, np.eye(2))
+	energies, wfs = calculate_ground_states(batch)
+	for i in range(3):
+	    assert_true(abs(energies[i] - 
+		            np.linalg.eigvalsh(symmetric[i])[0]) < 1e-8)
+	    assert_true(abs(np.linalg.norm(wfs[i]) - 1.0) < 1e-10)
+
+class TestBatchSystem(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(2)
+        self.number_of_sites = 8
+        self.couplings = np.random.uniform(0.5, 1.5, (4, 7))
+        self.batch = BatchSystem(SpinOneHalfSite(), 4)
+        self.batch.model = DisorderedHeisenbergModel(self.couplings)
+        self.batch.number_of_sites = self.number_of_sites
+
+    def test_same_energies_as_exact(self):
+	last = self.number_of_sites - 3
+	for left_block_size in range(1, last + 1):
+	    self.batch.infinite_dmrg_step(left_block_size, 64)
+	for left_block_size in range(last, 0, -1):
+	    energies, entropies, errors = self.batch.finite_dmrg_step(
+		    'right', left_block_size, 64)
+	eq_(energies.shape, (4,))
+	for i, couplings in enumerate(self.couplings):
+	    assert_true(abs(energies[i] - calculate_exact_energy(couplings)) < 
+		        1e-5)
+	assert_true(np.all(np.abs(errors) < 1e-10))
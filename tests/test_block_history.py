@@ -0,0 +1,138 @@
+'''
+File: test_block_history.py
+Author: Ivan Gonzalez
+Description: Tests for the old versions of the blocks kept on disk
+'''
+import numpy as np
+import unittest
+from nose.tools import assert_true, assert_false, eq_
+
+from dmrg101.core.block import Block
+from dmrg101.core.block_history import OutOfCoreBlockHistory
+from dmrg101.core.block_history import CompactBlockHistory
+from dmrg101.core.sites import SpinOneHalfSite
+from dmrg101.core.system import System
+from dmrg101.utils.models.heisenberg_model import HeisenbergModel
+
+def run_finite_heisenberg(on_disk, background=False, compact=False):
+    np.random.seed(1)
+    system = System(SpinOneHalfSite())
+    if on_disk:
+        system.keep_old_blocks_on_disk(cache_size=1, background=background)
+    if compact:
+        system.keep_compact_block_history(cache_size=1)
+    system.model = HeisenbergModel()
+    system.number_of_sites = 8
+    for left_block_size in range(1, 6):
+        energy, entropy, error = system.infinite_dmrg_step(left_block_size, 8)
+    for left_block_size in range(5, 0, -1):
+        energy, entropy, error = system.finite_dmrg_step('right',
+                                                         left_block_size, 8)
+    return energy
+
+class TestOutOfCoreBlockHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.history = OutOfCoreBlockHistory(cache_size=2)
+        for i in range(4):
+            block = Block(2)
+            block.operators['s_z'] = i * np.eye(2)
+            block.operators.add_adjoint('s_z_dag', 's_z')
+            block.transformation_matrix = i * np.ones((2, 2))
+            self.history.append(block)
+
+    def tearDown(self):
+	self.history.close()
+
+    def test_only_a_few_blocks_in_memory(self):
+	eq_(len(self.history), 4)
+	eq_(self.history.cache.keys(), [2, 3])
+	block = self.history[0]
+	eq_(self.history.cache.keys(), [3, 0])
+	eq_(block.operators['s_z'][0, 0], 0.0)
+
+    def test_blocks_are_loaded_back(self):
+	self.history.cache.clear()
+	block = self.history[1]
+	eq_(block.dim, 2)
+	assert_true(np.all(block.operators['s_z_dag'] == np.eye(2)))
+	assert_true(np.all(block.transformation_matrix == 1.0))
+
+    def test_loaded_blocks_are_copied_on_write(self):
+	self.history.cache.clear()
+	block = self.history[1]
+	block.operators['s_z'] = np.zeros((2, 2))
+	self.history.cache.clear()
+	eq_(self.history[1].operators['s_z'][0, 0], 1.0)
+
+    def test_clear(self):
+	self.history.clear()
+	eq_(len(self.history), 0)
+	assert_false(self.history.cache)
+
+class TestInTheBackground(unittest.TestCase):
+
+    def setUp(self):
+        self.history = OutOfCoreBlockHistory(cache_size=1, background=True)
+        for i in range(3):
+            block = Block(2)
+            block.operators['s_z'] = i * np.eye(2)
+            self.history.append(block)
+
+    def tearDown(self):
+	self.history.close()
+
+    def test_blocks_are_saved(self):
+	self.history.flush()
+	assert_false(self.history.unsaved)
+	self.history.cache.clear()
+	eq_(self.history[1].operators['s_z'][0, 0], 1.0)
+
+    def test_prefetch(self):
+	self.history.flush()
+	self.history.prefetch(0)
+	self.history.flush()
+	eq_(self.history.cache.keys(), [0])
+	eq_(self.history[0].operators['s_z'][1, 1], 0.0)
+
+class TestSystemWithBlocksOnDisk(unittest.TestCase):
+
+    def test_same_energy(self):
+	in_memory = run_finite_heisenberg(False)
+	on_disk = run_finite_heisenberg(True)
+	assert_true(abs(in_memory - on_disk) < 1e-10)
+
+    def test_same_energy_in_the_background(self):
+	in_memory = run_finite_heisenberg(False)
+	on_disk = run_finite_heisenberg(True, background=True)
+	assert_true(abs(in_memory - on_disk) < 1e-10)
+
+class TestCompactBlockHistory(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1)
+        self.system = System(SpinOneHalfSite())
+        self.system.keep_compact_block_history(cache_size=1)
+        self.system.model = HeisenbergModel()
+        self.system.number_of_sites = 8
+        for left_block_size in range(1, 4):
+            self.system.infinite_dmrg_step(left_block_size, 8)
+
+    def test_only_the_block_hamiltonian_is_kept(self):
+	history = self.system.old_left_blocks
+	eq_(len(history), 3)
+	eq_(history.entries[2]['names'], ['bh'])
+	eq_(sorted(history.entries[2]['recipes']), ['s_p', 's_z'])
+
+    def test_operators_are_rebuilt(self):
+	block = self.system.left_block
+	self.system.infinite_dmrg_step(4, 8)
+	rebuilt = self.system.old_left_blocks[3]
+	for name in ('id', 'bh', 's_z', 's_p', 's_m'):
+	    assert_true(np.allclose(rebuilt.operators[name], 
+		                    block.operators[name]))
+
+    def test_same_energy(self):
+	in_memory = run_finite_heisenberg(False)
+	compact = run_finite_heisenberg(False, compact=True)
+	assert_true(abs(in_memory - compact) < 1e-8)
@@ -0,0 +1,101 @@
+'''
+File: test_buffer_pool.py
+Author: Ivan Gonzalez
+Description: Tests for the pool of arrays reused in the DMRG steps
+'''
+import numpy as np
+import unittest
+from nose.tools import assert_true, assert_false, eq_
+
+from dmrg101.core.buffer_pool import BufferPool, get_buffer_pool
+from dmrg101.core.buffer_pool import DEFAULT_MAX_BYTES
+from dmrg101.core.sites import SpinOneHalfSite
+from dmrg101.core.system import System
+from dmrg101.utils.models.heisenberg_model import HeisenbergModel
+
+class TestBufferPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = BufferPool(max_arrays_per_shape=2)
+
+    def test_arrays_are_reused(self):
+	a = self.pool.get((3, 2))
+	self.pool.release(a)
+	assert_true(self.pool.get((3, 2)) is a)
+	assert_false(self.pool.get((2, 3)) is a)
+	eq_(self.pool.stats['hits'], 1)
+	eq_(self.pool.stats['misses'], 2)
+
+    def test_shape_and_type_are_the_key(self):
+	a = self.pool.get((3, 2), complex)
+	self.pool.release(a)
+	assert_false(self.pool.get((3, 2)) is a)
+	assert_true(self.pool.get((3, 2), complex) is a)
+
+    def test_get_zeros(self):
+	a = self.pool.get((2, 2))
+	a.fill(1.0)
+	self.pool.release(a)
+	assert_true(np.all(self.pool.get_zeros((2, 2)) == 0.0))
+
+    def test_limits(self):
+	self.pool.release_all(np.empty((2, 2)) for i in range(3))
+	eq_(self.pool.stats['released'], 2)
+	eq_(self.pool.stats['dropped'], 1)
+	eq_(self.pool.bytes_kept, 2 * 32)
+	small_pool = BufferPool(max_bytes=40)
+	small_pool.release_all(np.empty((2, 2)) for i in range(2))
+	eq_(small_pool.bytes_kept, 32)
+
+    def test_least_recently_used_are_dropped(self):
+	pool = BufferPool(max_bytes=64)
+	old = np.empty((2, 2))
+	pool.release(old)
+	middle = np.empty(4)
+	pool.release(middle)
+	eq_(pool.bytes_kept, 64)
+	new = np.empty((1, 4))
+	pool.release(new)
+	eq_(pool.bytes_kept, 64)
+	assert_false(pool.get((2, 2)) is old)
+	assert_true(pool.get((4,)) is middle)
+	assert_true(pool.get((1, 4)) is new)
+	# too large to keep
+	pool.release(np.empty(16))
+	eq_(pool.stats['dropped'], 2)
+
+    def test_default_limit(self):
+	eq_(BufferPool().max_bytes, DEFAULT_MAX_BYTES)
+	eq_(get_buffer_pool().max_bytes, DEFAULT_MAX_BYTES)
+
+    def test_views_are_ignored(self):
+	a = np.empty((4, 4))
+	self.pool.release(a[:2])
+	self.pool.release(a.T)
+	eq_(self.pool.bytes_kept, 0)
+
+    def test_clear(self):
+	self.pool.release(np.empty((2, 2)))
+	self.pool.clear()
+	eq_(self.pool.bytes_kept, 0)
+	eq_(self.pool.stats['misses'], 0)
+	self.pool.get((2, 2))
+	eq_(self.pool.stats['misses'], 1)
+
+class TestBufferPoolInSweeps(unittest.TestCase):
+
+    def test_arrays_are_reused_in_the_sweeps(self):
+	system = System(SpinOneHalfSite())
+	system.model = HeisenbergModel()
+	system.number_of_sites = 8
+	for left_block_size in range(1, 6):
+	    system.infinite_dmrg_step(left_block_size, 8)
+	for left_block_size in range(5, 0, -1):
+	    system.finite_dmrg_step('right', left_block_size, 8)
+	hits = get_buffer_pool().stats['hits']
+	misses = get_buffer_pool().stats['misses']
+	for left_block_size in range(1, 6):
+	    system.finite_dmrg_step('left', left_block_size, 8)
+	new_hits = get_buffer_pool().stats['hits'] - hits
+	new_misses = get_buffer_pool().stats['misses'] - misses
+	assert_true(new_hits > 10 * new_misses)
@@ -0,0 +1,118 @@
+'''
+File: test_chain_model.py
+Author: Ivan Gonzalez
+Description: Tests for the chain models compiled in a term table
+'''
+import numpy as np
+import unittest
+from nose.tools import assert_true, eq_
+
+from dmrg101.core.batch_system import BatchSystem
+from dmrg101.core.sites import SpinOneHalfSite
+from dmrg101.core.system import System
+from dmrg101.utils.models.chain_model import (make_heisenberg_chain,
+	make_transverse_field_ising_chain)
+
+def calculate_exact_energy(site_terms, bond_terms, number_of_sites):
+    """Diagonalizes a chain exactly.
+
+    The terms are lists of tuples with the operators and the
+    coefficients at each site or bond.
+    """
+    site = SpinOneHalfSite()
+    def get_operator(name, i):
+	return np.kron(np.kron(np.eye(2**i), site.operators[name]),
+		       np.eye(2**(number_of_sites - i - 1)))
+    h = 0
+    for name, coefficients in site_terms:
+	for i, c in enumerate(coefficients):
+	    h = h + c * get_operator(name, i)
+    for left_name, right_name, coefficients in bond_terms:
+	for i, c in enumerate(coefficients):
+	    h = h + c * np.dot(get_operator(left_name, i),
+		               get_operator(right_name, i+1))
+    return np.linalg.eigvalsh(h)[0]
+
+def run_dmrg(system, number_of_sites, number_of_states_kept):
+    """Runs the infinite algorithm and a sweep.
+
+    Each step of the last half-sweep gives an upper bound of the energy,
+    so the lowest one is returned.
+    """
+    system.number_of_sites = number_of_sites
+    last = number_of_sites - 3
+    for left_block_size in range(1, last + 1):
+	energy = system.infinite_dmrg_step(left_block_size,
+		                           number_of_states_kept)[0]
+    for left_block_size in range(last, 0, -1):
+	energy = system.finite_dmrg_step('right', left_block_size,
+		                         number_of_states_kept)[0]
+    energies = [system.finite_dmrg_step('left', left_block_size,
+	                                number_of_states_kept)[0]
+	        for left_block_size in range(1, last + 1)]
+    return np.min(energies, axis=0)
+
+class TestChainModel(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(3)
+        self.number_of_sites = 8
+        self.couplings = np.random.uniform(0.5, 1.5, 7)
+        self.fields = np.zeros(8)
+        self.fields[0] = 0.3
+        self.fields[-1] = -0.2
+        self.system = System(SpinOneHalfSite())
+
+    def test_zero_terms_are_skipped(self):
+	model = make_heisenberg_chain()
+	model.add_site_term('s_z', self.fields)
+	table = model.compile(self.number_of_sites)
+	# the bonds in the blocks are grouped, so there are 5 entries
+	entries = table.hamiltonian[1]
+	eq_(sum(len(left) * len(right) for left, right in entries), 9)
+	eq_(len(entries), 5)
+	eq_(len(table.left_block[1]), 1)
+	eq_(len(table.right_block[1]), 0)
+	eq_(table.left_operators, ['s_m', 's_p', 's_z'])
+
+    def test_interaction_graph_is_kept(self):
+	model = make_heisenberg_chain(self.couplings)
+	graph = model.interaction_graph
+	assert_true(model.interaction_graph is graph)
+	model.add_bond_term('s_z', 's_z', 0.1)
+	assert_true(model.interaction_graph is not graph)
+
+    def test_same_energy_as_exact(self):
+	model = make_heisenberg_chain(self.couplings)
+	model.add_site_term('s_z', self.fields)
+	self.system.model = model
+	energy = run_dmrg(self.system, self.number_of_sites, 64)
+	exact = calculate_exact_energy(
+		[('s_z', self.fields)],
+		[('s_z', 's_z', self.couplings),
+		 ('s_p', 's_m', .5 * self.couplings),
+		 ('s_m', 's_p', .5 * self.couplings)], self.number_of_sites)
+	assert_true(abs(energy - exact) < 1e-5)
+
+    def test_transverse_field_ising(self):
+	fields = np.random.uniform(0.2, 0.8, self.number_of_sites)
+	self.system.model = make_transverse_field_ising_chain(fields)
+	energy = run_dmrg(self.system, self.number_of_sites, 64)
+	exact = calculate_exact_energy(
+		[('s_x', fields)],
+		[('s_z', 's_z', -np.ones(self.number_of_sites - 1))],
+		self.number_of_sites)
+	assert_true(abs(energy - exact) < 1e-5)
+
+    def test_batch_of_couplings(self):
+	couplings = np.random.uniform(0.5, 1.5, (7, 2))
+	batch = BatchSystem(SpinOneHalfSite(), 2)
+	batch.model = make_heisenberg_chain(list(couplings))
+	energies = run_dmrg(batch, self.number_of_sites, 64)
+	for i in range(2):
+	    exact = calculate_exact_energy([],
+		    [('s_z', 's_z', couplings[:, i]),
+		     ('s_p', 's_m', .5 * couplings[:, i]),
+		     ('s_m', 's_p', .5 * couplings[:, i])],
+		    self.number_of_sites)
+	    assert_true(abs(energies[i] - exact) < 1e-5)
@@ -0,0 +1,60 @@
+'''
+File: test_checkpoint.py
+Author: Ivan Gonzalez
+Description: Tests for saving and resuming a system
+'''
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+from nose.tools import assert_true, eq_
+
+from dmrg101.core.checkpoint import save_checkpoint, load_checkpoint
+from dmrg101.core.sites import SpinOneHalfSite
+from dmrg101.core.system import System
+from dmrg101.utils.models.heisenberg_model import HeisenbergModel
+
+def sweep_to_the_right(system):
+    for left_block_size in range(5, 0, -1):
+        energy, entropy, error = system.finite_dmrg_step('right',
+                                                         left_block_size, 8)
+    return energy
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1)
+        self.system = System(SpinOneHalfSite())
+        self.system.model = HeisenbergModel()
+        self.system.number_of_sites = 8
+        for left_block_size in range(1, 6):
+            self.system.infinite_dmrg_step(left_block_size, 8)
+        self.directory = os.path.join(tempfile.mkdtemp(), 'checkpoint')
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.directory))
+
+    def test_resume(self):
+	save_checkpoint(self.system, self.directory)
+	resumed = load_checkpoint(self.directory, SpinOneHalfSite(),
+		                  model=HeisenbergModel())
+	eq_(resumed.left_block_size, 5)
+	eq_(resumed.growing_side, self.system.growing_side)
+	eq_(len(resumed.old_left_blocks), len(self.system.old_left_blocks))
+	assert_true(np.allclose(resumed.ground_state_wf.as_matrix,
+		                self.system.ground_state_wf.as_matrix))
+	np.random.seed(2)
+	energy = sweep_to_the_right(self.system)
+	np.random.seed(2)
+	eq_(sweep_to_the_right(resumed), energy)
+
+    def test_save_over_the_same_checkpoint(self):
+	save_checkpoint(self.system, self.directory)
+	resumed = load_checkpoint(self.directory, SpinOneHalfSite(),
+		                  model=HeisenbergModel())
+	resumed.finite_dmrg_step('right', 5, 8)
+	save_checkpoint(resumed, self.directory)
+	eq_(load_checkpoint(self.directory, SpinOneHalfSite()).left_block_size,
+	    5)
+	eq_(os.listdir(os.path.dirname(self.directory)), ['checkpoint'])
@@ -0,0 +1,100 @@
+'''
+File: test_interaction_graph.py
+Author: Ivan Gonzalez
+Description: Tests for the interaction graph and the pruning of blocks
+'''
+import numpy as np
+import unittest
+from nose.tools import assert_true, assert_false, eq_
+
+from dmrg101.core.interaction_graph import InteractionGraph
+from dmrg101.core.interaction_graph import make_nearest_neighbour_graph
+from dmrg101.core.sites import SpinOneHalfSite
+from dmrg101.core.system import System
+from dmrg101.utils.models.chain_model import ChainModel
+from dmrg101.utils.models.chain_model import make_heisenberg_chain
+from dmrg101.utils.models.heisenberg_model import HeisenbergModel
+from dmrg101.utils.parameter_scan import make_system, run_infinite_dmrg
+from dmrg101.utils.parameter_scan import run_finite_sweeps
+
+class UnprunedChainModel(ChainModel):
+    interaction_graph = None
+
+class TestInteractionGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.dimers = InteractionGraph()
+        self.dimers.add_bond('s_z', 's_z', 1, [0, 2, 4, 6])
+        self.dimers.add_block_operator('s_z', 's_z')
+
+    def test_nearest_neighbours_always_needed(self):
+	graph = make_nearest_neighbour_graph([('s_z', 's_z')])
+	for size in range(1, 8):
+	    assert_true(graph.is_needed('s_z', 'left', size, 10))
+	    assert_true(graph.is_needed('s_z', 'right', size, 10))
+	assert_true(graph.is_needed('bh', 'left', 3, 10))
+
+    def test_left_dimers(self):
+	assert_true(self.dimers.is_needed('s_z', 'left', 1, 8))
+	assert_false(self.dimers.is_needed('s_z', 'left', 2, 8))
+	assert_true(self.dimers.is_needed('s_z', 'left', 3, 8))
+
+    def test_right_dimers(self):
+	# the right block with two sites has sites 6, 7 and the edge is 6
+	assert_false(self.dimers.is_needed('s_z', 'right', 2, 8))
+	assert_true(self.dimers.is_needed('s_z', 'right', 3, 8))
+
+class TestPruning(unittest.TestCase):
+
+    def setUp(self):
+        self.model = HeisenbergModel()
+        self.model.interaction_graph = InteractionGraph()
+        for left_op, right_op in (('s_z', 's_z'), ('s_p', 's_m'),
+                                  ('s_m', 's_p')):
+            self.model.interaction_graph.add_bond(left_op, right_op, 1,
+                                                  [0, 1, 3, 5, 7])
+            self.model.interaction_graph.add_block_operator(left_op, left_op)
+        self.system = System(SpinOneHalfSite())
+        self.system.model = self.model
+        self.system.number_of_sites = 10
+
+    def test_blocks_are_pruned(self):
+	self.system.infinite_dmrg_step(1, 8)
+	self.system.infinite_dmrg_step(2, 8)
+	# the block has three sites, and the bond (2, 3) is missing
+	assert_false('s_z' in self.system.left_block.operators)
+	assert_false('s_m' in self.system.left_block.operators)
+	assert_true('bh' in self.system.left_block.operators)
+	eq_(len(self.system.old_left_blocks), 2)
+	assert_true('s_z' in self.system.old_left_blocks[1].operators)
+
+    def test_full_run_with_missing_bonds(self):
+	np.random.seed(3)
+	system = make_system(SpinOneHalfSite(), self.model, 10)
+	run_infinite_dmrg(system, 8)
+	energy = run_finite_sweeps(system, 8, 1)[0]
+	assert_true(np.isfinite(energy))
+
+class TestPrunedChain(unittest.TestCase):
+
+    def setUp(self):
+        # the bonds (2, 3), (4, 5), (6, 7) and (8, 9) are missing
+        self.couplings = [1., 1., 0., 1., 0., 1., 0., 1., 0.]
+
+    def run_dmrg(self, model):
+	np.random.seed(3)
+	for bond_term in make_heisenberg_chain(self.couplings).bond_terms:
+	    model.add_bond_term(*bond_term)
+	system = make_system(SpinOneHalfSite(), model, 10)
+	run_infinite_dmrg(system, 8)
+	energy = run_finite_sweeps(system, 8, 1)[0]
+	return system, energy
+
+    def test_same_energy_as_unpruned(self):
+	pruned, pruned_energy = self.run_dmrg(ChainModel())
+	unpruned, unpruned_energy = self.run_dmrg(UnprunedChainModel())
+	assert_false(all('s_z' in block.operators
+		         for block in pruned.old_left_blocks))
+	assert_true(all('s_z' in block.operators
+		        for block in unpruned.old_left_blocks))
+	assert_true(abs(pruned_energy - unpruned_energy) < 1e-6)
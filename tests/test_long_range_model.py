@@ -0,0 +1,77 @@
+'''
+File: test_long_range_model.py
+Author: Ivan Gonzalez
+Description: Tests for long-range interactions with complementary operators
+'''
+import numpy as np
+import unittest
+from nose.tools import assert_true, eq_
+
+from dmrg101.core.sites import SpinOneHalfSite
+from dmrg101.core.system import System
+from dmrg101.utils.exponential_fit import (fit_exponential_sum,
+	calculate_exponential_sum)
+from dmrg101.utils.models.long_range_model import (
+	make_long_range_heisenberg_model)
+
+def calculate_exact_energy(model, number_of_sites):
+    """Diagonalizes the long-range Heisenberg chain exactly.
+    """
+    site = SpinOneHalfSite()
+    def get_operator(name, i):
+	return np.kron(np.kron(np.eye(2**i), site.operators[name]),
+		       np.eye(2**(number_of_sites - i - 1)))
+    h = 0
+    for i in range(number_of_sites):
+	for j in range(i + 1, number_of_sites):
+	    for left_op, right_op, c in model.interactions:
+		h = h + c * model.get_coupling(j - i) * np.dot(
+			get_operator(left_op, i), get_operator(right_op, j))
+    return np.linalg.eigvalsh(h)[0]
+
+class TestExponentialFit(unittest.TestCase):
+
+    def setUp(self):
+        self.distances = np.arange(1, 50)
+
+    def test_exponentials_are_exact(self):
+	couplings = 2.0 * 0.3**self.distances - 0.5 * 0.8**self.distances
+	amplitudes, decays = fit_exponential_sum(couplings, 2)
+	fitted = calculate_exponential_sum(amplitudes, decays, self.distances)
+	assert_true(np.allclose(fitted, couplings))
+
+    def test_dipolar(self):
+	couplings = 1.0 / self.distances**3
+	amplitudes, decays = fit_exponential_sum(couplings, 5)
+	fitted = calculate_exponential_sum(amplitudes, decays, self.distances)
+	assert_true(np.abs(fitted - couplings).max() < 1e-5)
+
+class TestLongRangeModel(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(4)
+        self.number_of_sites = 8
+        self.model = make_long_range_heisenberg_model(
+		1.0 / np.arange(1, self.number_of_sites)**2, 3)
+        self.system = System(SpinOneHalfSite())
+        self.system.model = self.model
+        self.system.number_of_sites = self.number_of_sites
+
+    def test_same_energy_as_exact(self):
+	last = self.number_of_sites - 3
+	for left_block_size in range(1, last + 1):
+	    self.system.infinite_dmrg_step(left_block_size, 64)
+	for left_block_size in range(last, 0, -1):
+	    self.system.finite_dmrg_step('right', left_block_size, 64)
+	for left_block_size in range(1, last + 1):
+	    energy = self.system.finite_dmrg_step('left', left_block_size,
+		                                  64)[0]
+	exact = calculate_exact_energy(self.model, self.number_of_sites)
+	assert_true(abs(energy - exact) < 1e-5)
+
+    def test_operators_do_not_grow_with_the_block(self):
+	last = self.number_of_sites - 3
+	for left_block_size in range(1, last + 1):
+	    self.system.infinite_dmrg_step(left_block_size, 64)
+	    if left_block_size > 1:
+		eq_(len(self.system.left_block.operators.keys()), 11)
@@ -0,0 +1,63 @@
+'''
+File: test_mps.py
+Author: Ivan Gonzalez
+Description: Tests for the matrix product states
+'''
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+from nose.tools import assert_true, eq_, raises
+
+from dmrg101.core.dmrg_exceptions import DMRGException
+from dmrg101.core.mps import MatrixProductState, load_matrix_product_state
+from dmrg101.core.sites import SpinOneHalfSite
+from dmrg101.core.system import System
+from dmrg101.utils.models.heisenberg_model import HeisenbergModel
+
+class TestMatrixProductStateFromSystem(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1)
+        self.site = SpinOneHalfSite()
+        self.system = System(self.site)
+        self.system.model = HeisenbergModel()
+        self.system.number_of_sites = 8
+        for left_block_size in range(1, 6):
+            self.system.infinite_dmrg_step(left_block_size, 8)
+        for left_block_size in range(5, 2, -1):
+            self.system.finite_dmrg_step('right', left_block_size, 8)
+        self.mps = self.system.get_matrix_product_state()
+
+    def test_normalized(self):
+	eq_(len(self.mps), 8)
+	assert_true(abs(self.mps.norm() - 1.0) < 1e-10)
+
+    def test_energy(self):
+	operators = self.site.operators
+	# the state is real, so the s_p s_m and s_m s_p terms are equal
+	energy = 0.0
+	for i in range(7):
+	    energy += self.mps.expectation_value({i: operators['s_z'], 
+		                                  i+1: operators['s_z']})
+	    energy += self.mps.expectation_value({i: operators['s_p'], 
+		                                  i+1: operators['s_m']})
+	assert_true(abs(energy - self.system.ground_state_energy) < 1e-4)
+
+    def test_save_and_load(self):
+	directory = tempfile.mkdtemp()
+	try:
+	    filename = os.path.join(directory, 'gs.npz')
+	    self.mps.save(filename)
+	    loaded = load_matrix_product_state(filename)
+	finally:
+	    shutil.rmtree(directory)
+	eq_(loaded.center, self.mps.center)
+	assert_true(abs(loaded.overlap(self.mps) - 1.0) < 1e-10)
+
+class TestMatrixProductState(unittest.TestCase):
+
+    @raises(DMRGException)
+    def test_bonds_must_match(self):
+	MatrixProductState([np.ones((1, 2, 2)), np.ones((3, 2, 1))])
@@ -0,0 +1,150 @@
+'''
+File: test_operator_bank.py
+Author: Ivan Gonzalez
+Description: Tests for the operator banks
+'''
+import numpy as np
+import unittest
+from copy import deepcopy
+from nose.tools import assert_true, assert_false, eq_, raises
+
+from dmrg101.core.dmrg_exceptions import DMRGException
+from dmrg101.core.operator_bank import OperatorBank, make_operator_bank
+from dmrg101.core.operator_bank import PendingOperator
+from dmrg101.core.sites import SpinOneHalfSite
+
+class TestOperatorBank(unittest.TestCase):
+
+    def setUp(self):
+        self.bank = OperatorBank(2)
+        self.bank['id'] = np.eye(2)
+        self.bank.add('s_z')
+
+    def test_operators_are_views(self):
+	s_z = self.bank['s_z']
+	s_z[1, 1] = 0.5
+	eq_(self.bank.stack[1, 1, 1], 0.5)
+
+    def test_grows(self):
+	for i in range(10):
+	    self.bank['op_%d' % i] = i * np.ones((2, 2))
+	eq_(len(self.bank), 12)
+	eq_(self.bank.stack.shape, (12, 2, 2))
+	assert_true(np.all(self.bank['op_7'] == 7.0))
+
+    def test_delete_keeps_it_contiguous(self):
+	self.bank['s_x'] = np.ones((2, 2))
+	del self.bank['id']
+	eq_(sorted(self.bank.keys()), ['s_x', 's_z'])
+	assert_true(np.all(self.bank['s_x'] == 1.0))
+	eq_(self.bank.stack.shape, (2, 2, 2))
+
+    def test_complex_operators(self):
+	self.bank['s_y'] = np.array([[0, -0.5j], [0.5j, 0]])
+	assert_true(np.iscomplexobj(self.bank['id']))
+	assert_true(np.allclose(self.bank['id'], np.eye(2)))
+
+    @raises(DMRGException)
+    def test_wrong_size(self):
+	self.bank['big'] = np.eye(3)
+
+    def test_deepcopy_is_a_copy(self):
+	copied = deepcopy(self.bank)
+	copied['s_z'][0, 0] = 1.0
+	eq_(self.bank['s_z'][0, 0], 0.0)
+
+    def test_make_operator_bank_does_not_copy(self):
+	stack = np.zeros((2, 3, 3))
+	bank = make_operator_bank(['a', 'b'], stack)
+	bank['b'][0, 0] = 1.0
+	eq_(stack[1, 0, 0], 1.0)
+
+    def test_site_operators(self):
+	site = SpinOneHalfSite()
+	assert_true('s_p' in site.operators)
+	assert_false('c_up' in site.operators)
+	eq_(site.operators['s_p'][1, 0], 1.0)
+
+class TestPendingOperators(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.truncation = np.array([[1.0], [0.0]])
+        def make_matrix():
+            self.calls.append(1)
+            return np.array([[2.0, 1.0], [1.0, 0.0]])
+        self.bank = OperatorBank(1)
+        self.bank['id'] = np.eye(1)
+        self.bank.add_pending('op', PendingOperator(make_matrix, 
+                                                    self.truncation))
+
+    def test_not_calculated_until_used(self):
+	assert_true('op' in self.bank)
+	eq_(len(self.calls), 0)
+	eq_(self.bank['op'][0, 0], 2.0)
+	eq_(self.bank['op'][0, 0], 2.0)
+	eq_(len(self.calls), 1)
+
+    def test_copies_share_the_calculation(self):
+	copied = deepcopy(self.bank)
+	eq_(copied['op'][0, 0], 2.0)
+	eq_(self.bank['op'][0, 0], 2.0)
+	eq_(len(self.calls), 1)
+
+    def test_stack_renormalizes_everything(self):
+	eq_(self.bank.stack[1, 0, 0], 2.0)
+	eq_(len(self.bank.pending), 0)
+
+    def test_snapshots_share_the_calculation(self):
+	snapshot = self.bank.snapshot()
+	eq_(snapshot['op'][0, 0], 2.0)
+	eq_(self.bank['op'][0, 0], 2.0)
+	eq_(len(self.calls), 1)
+	eq_(snapshot['op'].ctypes.data, self.bank['op'].ctypes.data)
+
+class TestSnapshots(unittest.TestCase):
+
+    def setUp(self):
+        self.bank = OperatorBank(2)
+        self.bank['id'] = np.eye(2)
+        self.bank['s_z'] = np.diag([-0.5, 0.5])
+        self.snapshot = self.bank.snapshot()
+
+    def test_nothing_is_copied(self):
+	assert_true(self.snapshot.storage is self.bank.storage)
+	eq_(sorted(self.snapshot.keys()), ['id', 's_z'])
+
+    @raises(ValueError)
+    def test_snapshots_are_read_only(self):
+	self.snapshot['s_z'][0, 0] = 1.0
+
+    def test_copy_on_write(self):
+	self.bank['s_z'] = np.zeros((2, 2))
+	self.bank.add('s_x')
+	del self.bank['id']
+	eq_(self.snapshot['s_z'][0, 0], -0.5)
+	eq_(sorted(self.snapshot.keys()), ['id', 's_z'])
+	self.bank['s_x'][0, 1] = 1.0
+	eq_(self.bank['s_x'][0, 1], 1.0)
+
+class TestAdjointOperators(unittest.TestCase):
+
+    def setUp(self):
+        self.bank = OperatorBank(2)
+        self.bank['s_p'] = np.array([[0.0, 0.0], [1.0, 0.0]])
+        self.bank.add_adjoint('s_m', 's_p')
+
+    def test_adjoint_is_a_transposed_view(self):
+	assert_true('s_m' in self.bank.keys())
+	eq_(self.bank.stack.shape, (1, 2, 2))
+	eq_(self.bank['s_m'][0, 1], 1.0)
+	self.bank['s_p'][1, 0] = 2.0
+	eq_(self.bank['s_m'][0, 1], 2.0)
+
+    def test_changing_the_operator_keeps_the_adjoint(self):
+	self.bank['s_p'] = np.zeros((2, 2))
+	eq_(self.bank['s_m'][0, 1], 1.0)
+
+    @raises(DMRGException)
+    def test_adjoint_of_missing_operator(self):
+	self.bank.add_adjoint('c_up_dag', 'c_up')
@@ -0,0 +1,161 @@
+'''
+File: test_operators.py
+Author: Ivan Gonzalez
+Description: Tests for the operators applied in threads or processes
+'''
+import numpy as np
+import unittest
+import warnings
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_true, eq_, raises
+
+from dmrg101.core.distributed_operator import DistributedOperator
+from dmrg101.core.dmrg_exceptions import DMRGException
+from dmrg101.core.operators import CompositeOperator
+from dmrg101.core.sites import SpinOneHalfSite
+from dmrg101.core.system import System
+from dmrg101.core import thread_pools
+from dmrg101.core.thread_pools import find_blas_thread_functions
+from dmrg101.core.thread_pools import limit_blas_threads
+from dmrg101.core.wavefunction import Wavefunction, create_empty_like
+from dmrg101.utils.models.heisenberg_model import HeisenbergModel
+
+def run_heisenberg(number_of_threads, number_of_processes=1):
+    np.random.seed(1)
+    system = System(SpinOneHalfSite())
+    system.number_of_threads = number_of_threads
+    system.number_of_processes = number_of_processes
+    system.model = HeisenbergModel()
+    system.number_of_sites = 8
+    for left_block_size in range(1, 6):
+        energy, entropy, error = system.infinite_dmrg_step(left_block_size, 64)
+    return energy
+
+class TestOperatorsInThreads(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1)
+        self.h = CompositeOperator(6, 4)
+        for i in range(5):
+            self.h.add(np.random.rand(6, 6), np.random.rand(4, 4), i)
+        self.wf = Wavefunction(6, 4)
+        self.wf.randomize()
+
+    def test_same_result_in_threads(self):
+	out = create_empty_like(self.wf)
+	self.h.apply_into(self.wf, out)
+	for number_of_threads in (2, 3, 8):
+	    self.h.number_of_threads = number_of_threads
+	    out_in_threads = create_empty_like(self.wf)
+	    self.h.apply_into(self.wf, out_in_threads)
+	    assert_true(np.allclose(out.as_matrix, out_in_threads.as_matrix))
+
+    def test_composite_of_composites(self):
+	h = CompositeOperator(6, 4)
+	h.list_of_components.append(self.h)
+	h.add(np.eye(6), np.eye(4))
+	h.number_of_threads = 2
+	out = create_empty_like(self.wf)
+	h.apply_into(self.wf, out)
+	expected = self.h.apply(self.wf).as_matrix + self.wf.as_matrix
+	assert_true(np.allclose(out.as_matrix, expected))
+
+    def test_same_energy_in_threads(self):
+	assert_true(abs(run_heisenberg(1) - run_heisenberg(4)) < 1e-6)
+
+class TestDistributedOperator(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1)
+        self.h = CompositeOperator(7, 4)
+        for i in range(3):
+            self.h.add(np.random.rand(7, 7), np.random.rand(4, 4), i)
+        self.wf = Wavefunction(7, 4)
+        self.wf.randomize()
+
+    def test_same_result_in_processes(self):
+	expected = self.h.apply(self.wf).as_matrix
+	for number_of_processes in (1, 3, 10):
+	    with DistributedOperator(self.h, number_of_processes) as h:
+		result = h.apply(self.wf)
+		assert_true(np.allclose(result.as_matrix, expected))
+		# again, to check the processes are still there
+		h.apply_into(self.wf, result)
+		assert_true(np.allclose(result.as_matrix, expected))
+
+    @raises(DMRGException)
+    def test_closed(self):
+	h = DistributedOperator(self.h, 2)
+	h.close()
+	h.apply(self.wf)
+
+    def test_same_energy_in_processes(self):
+	assert_true(abs(run_heisenberg(1) - run_heisenberg(1, 2)) < 1e-6)
+
+    def test_identity_terms(self):
+	h = CompositeOperator(7, 4)
+	left_op = np.random.rand(7, 7)
+	h.add(left_op, np.random.rand(4, 4), 0.5)
+	h.add(left_op, np.random.rand(4, 4), 2.0)
+	h.add(np.random.rand(7, 7), np.eye(4))
+	h.add(np.eye(7), np.random.rand(4, 4), 3.0)
+	h.add(np.eye(7), np.eye(4), -1.0)
+	expected = h.apply(self.wf).as_matrix
+	with DistributedOperator(h, 3) as distributed_h:
+	    # the terms with the same left operator are grouped
+	    eq_(len(distributed_h.terms.left_ops), 1)
+	    result = distributed_h.apply(self.wf)
+	assert_true(np.allclose(result.as_matrix, expected))
+
+    def test_set_operator(self):
+	other_h = CompositeOperator(5, 3)
+	other_h.add(np.random.rand(5, 5), np.random.rand(3, 3))
+	other_wf = Wavefunction(5, 3)
+	other_wf.randomize()
+	with DistributedOperator(self.h, 2) as h:
+	    processes = list(h.processes)
+	    h.set_operator(other_h)
+	    result = h.apply(other_wf)
+	    eq_(h.processes, processes)
+	assert_true(np.allclose(result.as_matrix,
+		                other_h.apply(other_wf).as_matrix))
+
+    def test_processes_kept_for_all_steps(self):
+	system = System(SpinOneHalfSite())
+	system.number_of_processes = 2
+	system.model = HeisenbergModel()
+	system.number_of_sites = 8
+	system.infinite_dmrg_step(1, 64)
+	processes = list(system.distributed_hamiltonian.processes)
+	for left_block_size in range(2, 6):
+	    system.infinite_dmrg_step(left_block_size, 64)
+	eq_(system.distributed_hamiltonian.processes, processes)
+	system.stop_processes()
+	assert_true(all(not process.is_alive() for process in processes))
+
+class TestBlasThreads(unittest.TestCase):
+
+    def test_limit(self):
+	functions = find_blas_thread_functions()
+	if functions is None or thread_pools.threadpool_limits is not None:
+	    raise SkipTest("Cannot set the threads of this BLAS")
+	get_number_of_threads = functions[0]
+	old_number_of_threads = get_number_of_threads()
+	with limit_blas_threads(old_number_of_threads + 1):
+	    eq_(get_number_of_threads(), old_number_of_threads + 1)
+	eq_(get_number_of_threads(), old_number_of_threads)
+
+    def test_warning_when_not_limited(self):
+	if thread_pools.threadpool_limits is not None:
+	    raise SkipTest("The limit is set with threadpoolctl")
+	old_functions = list(thread_pools._blas_thread_functions)
+	thread_pools._blas_thread_functions[:] = [None]
+	try:
+	    with warnings.catch_warnings(record=True) as caught:
+		warnings.simplefilter('always')
+		with limit_blas_threads(1):
+		    pass
+	finally:
+	    thread_pools._blas_thread_functions[:] = old_functions
+	eq_(len(caught), 1)
+	assert_true(issubclass(caught[0].category, RuntimeWarning))
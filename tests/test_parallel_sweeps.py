@@ -0,0 +1,82 @@
+'''
+File: test_parallel_sweeps.py
+Author: Ivan Gonzalez
+Description: Tests for the segments of the chain swept in parallel
+'''
+import numpy as np
+import unittest
+from nose.tools import assert_true, eq_
+
+from dmrg101.core.parallel_sweeps import ParallelSweeps, make_segments
+from dmrg101.core.sites import SpinOneHalfSite
+from dmrg101.core.system import System
+from dmrg101.utils.models.heisenberg_model import HeisenbergModel
+from dmrg101.utils.parameter_scan import make_system, run_infinite_dmrg
+from dmrg101.utils.parameter_scan import run_finite_sweeps
+
+# for the Heisenberg chain with 10 sites and open boundary conditions
+EXACT_ENERGY = -4.258035207
+
+class TestParallelSweeps(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1)
+        self.system = System(SpinOneHalfSite())
+        self.system.model = HeisenbergModel()
+        self.system.number_of_sites = 10
+
+    def test_make_segments(self):
+	eq_(make_segments(10, 2), [(1, 3), (4, 6)])
+	eq_(make_segments(10, 10), [(i, i) for i in range(1, 7)])
+
+    def test_warm_up(self):
+	sweeps = ParallelSweeps(self.system, 2)
+	sweeps.warm_up(16)
+	eq_(sorted(sweeps.left_blocks), range(1, 8))
+	eq_(sorted(sweeps.right_blocks), range(1, 8))
+	for size, block in sweeps.left_blocks.items():
+	    eq_(block.number_of_sites, size)
+
+    def test_energy_in_processes(self):
+	sweeps = ParallelSweeps(self.system, 3)
+	sweeps.warm_up(16)
+	for i in range(2):
+	    energy = sweeps.sweep(16)
+	assert_true(EXACT_ENERGY - 1e-8 < energy < EXACT_ENERGY + 1e-5)
+	for size, block in sweeps.right_blocks.items():
+	    eq_(block.number_of_sites, size)
+
+    def test_energy_in_one_segment(self):
+	sweeps = ParallelSweeps(self.system, 1)
+	sweeps.warm_up(16)
+	energy = sweeps.sweep(16)
+	assert_true(EXACT_ENERGY - 1e-8 < energy < EXACT_ENERGY + 1e-5)
+
+class TestParallelSweepsWithTruncation(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1)
+        self.system = make_system(SpinOneHalfSite(), HeisenbergModel(), 12)
+        np.random.seed(1)
+        serial = make_system(SpinOneHalfSite(), HeisenbergModel(), 12)
+        run_infinite_dmrg(serial, 8)
+        self.serial_energy = run_finite_sweeps(serial, 8, 2)[0]
+
+    def check_sweeps(self, sweeps):
+	warm_up_energy = sweeps.warm_up(8)
+	for i in range(2):
+	    energy = sweeps.sweep(8)
+	assert_true(energy <= warm_up_energy + 1e-8)
+	assert_true(abs(energy - self.serial_energy) < 1e-4)
+
+    def test_energy_in_processes(self):
+	self.check_sweeps(ParallelSweeps(self.system, 2))
+
+    def test_energy_in_processes_with_threads(self):
+	self.system.number_of_threads = 2
+	self.check_sweeps(ParallelSweeps(self.system, 2))
+
+    def test_energy_with_blocks_on_disk(self):
+	self.system.number_of_threads = 2
+	self.system.keep_old_blocks_on_disk(background=True)
+	self.check_sweeps(ParallelSweeps(self.system, 2))
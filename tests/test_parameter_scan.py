@@ -0,0 +1,121 @@
+'''
+File: test_parameter_scan.py
+Author: Ivan Gonzalez
+Description: Tests for the scans of the parameters of a model
+'''
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from nose.tools import assert_true, eq_
+
+from dmrg101.core.sites import SpinOneHalfSite
+from dmrg101.core.thread_pools import find_blas_thread_functions
+from dmrg101.utils.models.chain_model import ChainModel
+from dmrg101.utils.models.chain_model import make_heisenberg_chain
+from dmrg101.utils.models.tfi_model import TranverseFieldIsingModel
+from dmrg101.utils.parameter_scan import make_grid, run_scan, scan_parameters
+
+class DimerizedHeisenbergChain(ChainModel):
+    """A Heisenberg chain of 8 sites with couplings 1 and `delta`.
+    """
+    def __init__(self):
+        super(DimerizedHeisenbergChain, self).__init__()
+        self.delta = 1.0
+
+    @property
+    def delta(self):
+	return self._delta
+
+    @delta.setter
+    def delta(self, value):
+	self._delta = value
+	self.bond_terms = []
+	couplings = [1.0, value] * 3 + [1.0]
+	for bond_term in make_heisenberg_chain(couplings).bond_terms:
+	    self.add_bond_term(*bond_term)
+
+class BlasThreadsRecorder(TranverseFieldIsingModel):
+    """The TFI model, keeping the number of threads of the BLAS.
+    """
+    blas_threads = []
+
+    def set_hamiltonian(self, system):
+	functions = find_blas_thread_functions()
+	if functions is not None:
+	    self.blas_threads.append(functions[0]())
+	super(BlasThreadsRecorder, self).set_hamiltonian(system)
+
+class TestParameterScan(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.grid = make_grid(H=[0.0, 0.5, 1.0])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_same_results_in_processes(self):
+	serial = dict(scan_parameters(TranverseFieldIsingModel, self.grid,
+		                      SpinOneHalfSite, 6, 8, 
+				      number_of_processes=1))
+	in_processes = dict(scan_parameters(TranverseFieldIsingModel,
+		                            self.grid, SpinOneHalfSite, 6, 8,
+					    number_of_processes=2))
+	eq_(sorted(in_processes), [0, 1, 2])
+	for index in serial:
+	    assert_true(abs(serial[index]['energy'] - 
+		            in_processes[index]['energy']) < 1e-10)
+	# the classical Ising chain
+	assert_true(abs(serial[0]['energy'] + 5 * 0.25) < 1e-8)
+
+    def test_results_file(self):
+	filename = os.path.join(self.directory, 'scan.json')
+	done = []
+	results = run_scan(TranverseFieldIsingModel, self.grid, 
+		           SpinOneHalfSite, 6, 8, filename,
+			   number_of_processes=2,
+			   callback=lambda index, result: done.append(index))
+	eq_(sorted(done), [0, 1, 2])
+	with open(filename) as f:
+	    scan = json.load(f)
+	eq_(scan['number_of_sites'], 6)
+	eq_([result['parameters']['H'] for result in scan['results']],
+	    [0.0, 0.5, 1.0])
+	eq_(scan['results'][1]['energy'], results[1]['energy'])
+
+    def test_errors_are_kept(self):
+	results = dict(scan_parameters(TranverseFieldIsingModel, self.grid, 
+		                       SpinOneHalfSite, 2, 8,
+				       number_of_processes=1))
+	assert_true('error' in results[0])
+
+    def test_blas_threads_limited(self):
+	if find_blas_thread_functions() is None:
+	    return
+	del BlasThreadsRecorder.blas_threads[:]
+	for warm_start_sweeps in (None, 1):
+	    results = dict(scan_parameters(BlasThreadsRecorder, self.grid,
+			                   SpinOneHalfSite, 6, 8,
+					   number_of_processes=1,
+					   blas_threads=3,
+					   warm_start_sweeps=warm_start_sweeps))
+	    eq_(sorted(results), [0, 1, 2])
+	assert_true(BlasThreadsRecorder.blas_threads)
+	assert_true(all(number_of_threads == 3 for number_of_threads
+		        in BlasThreadsRecorder.blas_threads))
+
+    def test_warm_started_site_dependent_model(self):
+	grid = make_grid(delta=[0.5, 0.6, 0.7])
+	cold = dict(scan_parameters(DimerizedHeisenbergChain, grid,
+		                    SpinOneHalfSite, 8, 8, number_of_sweeps=2,
+				    number_of_processes=1))
+	warm = dict(scan_parameters(DimerizedHeisenbergChain, grid,
+		                    SpinOneHalfSite, 8, 8,
+				    number_of_processes=1,
+				    warm_start_sweeps=2))
+	assert_true(all(warm[index]['warm_started'] for index in (1, 2)))
+	for index in range(3):
+	    assert_true(abs(warm[index]['energy'] -
+		            cold[index]['energy']) < 1e-5)
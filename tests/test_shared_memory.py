@@ -0,0 +1,81 @@
+'''
+File: test_shared_memory.py
+Author: Ivan Gonzalez
+Description: Tests for the arrays shared between processes
+'''
+import multiprocessing
+import pickle
+import shutil
+import numpy as np
+import unittest
+from nose.tools import assert_true, eq_
+
+from dmrg101.core.block import make_block_from_site
+from dmrg101.core.shared_memory import (SharedArray, make_shared_array,
+	make_shared_memory_directory)
+from dmrg101.core.sites import SpinOneHalfSite
+from dmrg101.core.wavefunction import Wavefunction
+
+def double_in_process(connection):
+    """Doubles the operators of a block sent through a connection.
+    """
+    block = connection.recv()
+    block.operators['s_z'] *= 2
+    connection.send(block.version)
+    connection.close()
+
+class TestSharedMemory(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = make_shared_memory_directory()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_pickled_by_handle(self):
+	a = make_shared_array((100, 100), float, self.directory)
+	assert_true(len(pickle.dumps(a, 2)) < 1000)
+	b = pickle.loads(pickle.dumps(a[10:20], 2))
+	assert_true(isinstance(b, SharedArray))
+	b[0, 0] = 1.0
+	eq_(a[10, 0], 1.0)
+
+    def test_not_contiguous_is_copied(self):
+	a = make_shared_array((4, 4), float, self.directory)
+	b = pickle.loads(pickle.dumps(a[:, 0], 2))
+	assert_true(not isinstance(b, SharedArray))
+	b[0] = 1.0
+	eq_(a[0, 0], 0.0)
+
+    def test_results_are_not_shared(self):
+	a = make_shared_array((4, 4), float, self.directory)
+	assert_true(not isinstance(a + 1.0, SharedArray))
+
+    def test_block_to_other_process(self):
+	block = make_block_from_site(SpinOneHalfSite())
+	block.move_to_shared_memory(self.directory)
+	s_z = np.array(block.operators['s_z'])
+	connection, other_end = multiprocessing.Pipe()
+	process = multiprocessing.Process(target=double_in_process,
+		                          args=(other_end,))
+	process.start()
+	connection.send(block)
+	version = connection.recv()
+	process.join()
+	assert_true(version != block.version)
+	assert_true(np.allclose(block.operators['s_z'], 2 * s_z))
+
+    def test_new_version_when_unpickled(self):
+	block = make_block_from_site(SpinOneHalfSite())
+	block.move_to_shared_memory(self.directory)
+	other = pickle.loads(pickle.dumps(block, 2))
+	assert_true(other.version != block.version)
+	eq_(block.snapshot().version, block.version)
+
+    def test_wavefunction(self):
+	wf = Wavefunction(3, 2)
+	wf.as_matrix = np.arange(6.0).reshape(3, 2)
+	wf.move_to_shared_memory(self.directory)
+	other = pickle.loads(pickle.dumps(wf, 2))
+	assert_true(isinstance(other.as_matrix, SharedArray))
+	assert_true(np.allclose(other.as_matrix, wf.as_matrix))
@@ -0,0 +1,69 @@
+'''
+File: test_symmetric_infinite_dmrg.py
+Author: Ivan Gonzalez
+Description: Tests for the infinite DMRG growing both blocks by reflection
+'''
+import numpy as np
+import unittest
+from nose.tools import assert_true, eq_, raises
+
+from dmrg101.core.dmrg_exceptions import DMRGException
+from dmrg101.core.sites import SpinOneHalfSite
+from dmrg101.core.system import System
+from dmrg101.utils.models.heisenberg_model import HeisenbergModel
+
+def calculate_exact_energy(number_of_sites):
+    """Diagonalizes the Heisenberg chain exactly.
+    """
+    site = SpinOneHalfSite()
+    def get_operator(name, i):
+	return np.kron(np.kron(np.eye(2**i), site.operators[name]),
+		       np.eye(2**(number_of_sites - i - 1)))
+    h = 0
+    for i in range(number_of_sites - 1):
+	h = h + (np.dot(get_operator('s_z', i), get_operator('s_z', i+1)) +
+		 .5 * np.dot(get_operator('s_p', i), get_operator('s_m', i+1)) +
+		 .5 * np.dot(get_operator('s_m', i), get_operator('s_p', i+1)))
+    return np.linalg.eigvalsh(h)[0]
+
+class TestSymmetricInfiniteDMRG(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(5)
+        self.system = System(SpinOneHalfSite())
+        self.system.model = HeisenbergModel()
+
+    def test_grows_two_sites_per_step(self):
+	self.system.number_of_sites = 10
+	for left_block_size in range(1, 4):
+	    energy = self.system.symmetric_infinite_dmrg_step(left_block_size,
+		                                              64)[0]
+	    exact = calculate_exact_energy(2 * left_block_size + 2)
+	    assert_true(abs(energy - exact) < 1e-5)
+	    eq_(len(self.system.old_left_blocks), left_block_size)
+	    eq_(len(self.system.old_right_blocks), left_block_size)
+	eq_(self.system.left_block.operators['bh'].ctypes.data,
+	    self.system.right_block.operators['bh'].ctypes.data)
+
+    def test_finite_sweeps_after(self):
+	for number_of_sites in (8, 9):
+	    self.system = System(SpinOneHalfSite())
+	    self.system.model = HeisenbergModel()
+	    self.system.number_of_sites = number_of_sites
+	    last = (number_of_sites - 1) // 2
+	    for left_block_size in range(1, last + 1):
+		self.system.symmetric_infinite_dmrg_step(left_block_size, 64)
+	    for left_block_size in range(last, number_of_sites - 2):
+		self.system.finite_dmrg_step('left', left_block_size, 64)
+	    for left_block_size in range(number_of_sites - 3, 0, -1):
+		energy = self.system.finite_dmrg_step('right',
+			                              left_block_size, 64)[0]
+	    exact = calculate_exact_energy(number_of_sites)
+	    assert_true(abs(energy - exact) < 1e-4)
+
+    @raises(DMRGException)
+    def test_needs_the_same_sites(self):
+	system = System(SpinOneHalfSite(), SpinOneHalfSite())
+	system.model = HeisenbergModel()
+	system.number_of_sites = 10
+	system.symmetric_infinite_dmrg_step(1, 8)
@@ -0,0 +1,63 @@
+'''
+File: test_tensor_cache.py
+Author: Ivan Gonzalez
+Description: Tests for the tensor products and their cache in a DMRG step
+'''
+import numpy as np
+import unittest
+from nose.tools import assert_true, eq_
+
+from dmrg101.core.make_tensor import make_tensor
+from dmrg101.core.sites import SpinOneHalfSite
+from dmrg101.core.system import System
+from dmrg101.utils.models.heisenberg_model import HeisenbergModel
+
+class TestMakeTensor(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1)
+        self.small = np.random.rand(3, 2)
+        self.large = np.random.rand(2, 4) + 1j * np.random.rand(2, 4)
+
+    def test_same_as_kron(self):
+	result = make_tensor(self.small, self.large)
+	assert_true(np.allclose(result, np.kron(self.large, self.small)))
+
+    def test_out(self):
+	out = np.empty((6, 8), complex)
+	result = make_tensor(self.small, self.large, out)
+	assert_true(result is out)
+	assert_true(np.allclose(out, np.kron(self.large, self.small)))
+	out = np.empty((8, 6), complex).T
+	make_tensor(self.small, self.large, out)
+	assert_true(np.allclose(out, np.kron(self.large, self.small)))
+
+class TestTensorCache(unittest.TestCase):
+
+    def setUp(self):
+        self.system = System(SpinOneHalfSite())
+        self.system.model = HeisenbergModel()
+        self.system.number_of_sites = 8
+        self.system.infinite_dmrg_step(1, 8)
+
+    def test_products_are_shared_in_a_step(self):
+	self.system.set_growing_side('left')
+	self.system.set_hamiltonian()
+	number_of_products = len(self.system.tensor_cache)
+	self.system.set_block_hamiltonian()
+	self.system.set_operators_to_update()
+	eq_(len(self.system.tensor_cache), number_of_products)
+	block = self.system.left_block
+	site = self.system.left_site
+	assert_true(np.all(self.system.get_tensor(block, 's_z', site, 'id') ==
+		           make_tensor(block.operators['s_z'], 
+				       site.operators['id'])))
+
+    def test_the_cache_is_cleared_for_new_blocks(self):
+	old_version = self.system.left_block.version
+	self.system.infinite_dmrg_step(2, 8)
+	assert_true(self.system.left_block.version != old_version)
+	self.system.set_hamiltonian()
+	versions = set(key[0] for key in self.system.tensor_cache)
+	eq_(versions, set([self.system.left_block.version,
+		           self.system.right_block.version]))
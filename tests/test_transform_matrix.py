@@ -0,0 +1,56 @@
+'''
+File: test_transform_matrix.py
+Author: Ivan Gonzalez
+Description: Tests for the transformation of matrices to a new basis
+'''
+import numpy as np
+import unittest
+from nose.tools import assert_true, eq_
+
+from dmrg101.core.transform_matrix import transform_matrix, transform_matrices
+from dmrg101.core.transform_matrix import multiply_stacks
+
+class TestTransformMatrices(unittest.TestCase):
+
+    def setUp(self):
+        self.matrices = np.random.rand(5, 6, 6)
+        q, r = np.linalg.qr(np.random.rand(6, 6))
+        self.truncation = np.copy(q[:, :4])
+
+    def test_same_as_one_by_one(self):
+	result = transform_matrices(self.matrices, self.truncation)
+	eq_(result.shape, (5, 4, 4))
+	for i in range(5):
+	    assert_true(np.allclose(result[i],
+		        transform_matrix(self.matrices[i], self.truncation)))
+
+    def test_threads_give_the_same(self):
+	result = transform_matrices(self.matrices, self.truncation)
+	threaded = transform_matrices(self.matrices, self.truncation, 3)
+	assert_true(np.allclose(result, threaded))
+
+    def test_complex_transformation(self):
+	truncation = self.truncation * np.exp(0.3j)
+	result = transform_matrices(self.matrices, truncation)
+	assert_true(np.allclose(result[2],
+		    transform_matrix(self.matrices[2], truncation)))
+
+class TestMultiplyStacks(unittest.TestCase):
+
+    def setUp(self):
+        self.a = np.random.rand(3, 4, 5)
+        self.b = np.random.rand(3, 5, 2)
+
+    def test_stacks(self):
+	result = multiply_stacks(self.a, self.b)
+	eq_(result.shape, (3, 4, 2))
+	for i in range(3):
+	    assert_true(np.allclose(result[i], np.dot(self.a[i], self.b[i])))
+
+    def test_matrix_and_stack(self):
+	left = multiply_stacks(self.a[0], self.a.transpose(0, 2, 1))
+	right = multiply_stacks(self.a, self.b[0])
+	for i in range(3):
+	    assert_true(np.allclose(left[i], np.dot(self.a[0],
+		                                    self.a[i].transpose())))
+	    assert_true(np.allclose(right[i], np.dot(self.a[i], self.b[0])))
@@ -0,0 +1,127 @@
+'''
+File: test_warm_start.py
+Author: Ivan Gonzalez
+Description: Tests for warm starting a system with a new model
+'''
+import numpy as np
+import unittest
+from nose.tools import assert_true, eq_
+
+from dmrg101.core.sites import SpinOneHalfSite
+from dmrg101.core.system import System
+from dmrg101.utils.models.chain_model import make_heisenberg_chain
+from dmrg101.utils.models.heisenberg_model import HeisenbergModel
+from dmrg101.utils.models.tfi_model import TranverseFieldIsingModel
+from dmrg101.utils.parameter_scan import make_grid, scan_parameters
+from dmrg101.utils.parameter_scan import make_system, run_infinite_dmrg
+from dmrg101.utils.parameter_scan import run_finite_sweeps
+
+class TestWarmStart(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1)
+        self.system = make_system(SpinOneHalfSite(),
+                                  TranverseFieldIsingModel(0.4), 8)
+        run_infinite_dmrg(self.system, 64)
+        run_finite_sweeps(self.system, 64, 1)
+
+    def get_block_hamiltonians(self):
+	blocks = list(self.system.old_left_blocks) + [self.system.left_block]
+	return [block.operators['bh'] for block in blocks
+		if 'bh' in block.operators.keys()]
+
+    def test_same_model_same_blocks(self):
+	old_bhs = [bh.copy() for bh in self.get_block_hamiltonians()]
+	old_block = self.system.left_block
+	self.system.warm_start(TranverseFieldIsingModel(0.4))
+	new_bhs = self.get_block_hamiltonians()
+	eq_(len(new_bhs), len(old_bhs))
+	for old_bh, new_bh in zip(old_bhs, new_bhs):
+	    assert_true(np.allclose(old_bh, new_bh))
+	# the old blocks are not changed
+	assert_true(old_block is not self.system.left_block)
+	assert_true(np.allclose(old_block.operators['bh'], old_bhs[-1]))
+
+    def test_new_model_same_energy(self):
+	cold = make_system(SpinOneHalfSite(), TranverseFieldIsingModel(0.5), 8)
+	run_infinite_dmrg(cold, 64)
+	cold_energy = run_finite_sweeps(cold, 64, 1)[0]
+	self.system.warm_start(TranverseFieldIsingModel(0.5))
+	assert_true(self.system.initial_wf is self.system.ground_state_wf)
+	warm_energy = run_finite_sweeps(self.system, 64, 1)[0]
+	assert_true(self.system.initial_wf is None)
+	assert_true(abs(warm_energy - cold_energy) < 1e-5)
+
+    def test_warm_started_scan(self):
+	grid = make_grid(H=[0.3, 0.4, 0.5])
+	results = dict(scan_parameters(TranverseFieldIsingModel, grid,
+		                       SpinOneHalfSite, 8, 64,
+				       number_of_processes=1,
+				       warm_start_sweeps=1))
+	eq_([results[i]['warm_started'] for i in range(3)],
+	    [False, True, True])
+	cold = dict(scan_parameters(TranverseFieldIsingModel, grid,
+		                    SpinOneHalfSite, 8, 64,
+				    number_of_processes=1))
+	for i in range(3):
+	    assert_true(abs(results[i]['energy'] - cold[i]['energy']) < 1e-5)
+
+def run_to_the_middle_of_a_sweep(model, number_of_sites,
+	                         number_of_states_kept):
+    """Runs the infinite algorithm, a sweep to the right, and half a sweep
+    to the left.
+    """
+    np.random.seed(2)
+    system = System(SpinOneHalfSite())
+    system.model = model
+    system.number_of_sites = number_of_sites
+    last = number_of_sites - 3
+    for left_block_size in range(1, last + 1):
+	system.infinite_dmrg_step(left_block_size, number_of_states_kept)
+    for left_block_size in range(last, 0, -1):
+	system.finite_dmrg_step('right', left_block_size,
+		                number_of_states_kept)
+    for left_block_size in range(1, number_of_sites // 2):
+	system.finite_dmrg_step('left', left_block_size,
+		                number_of_states_kept)
+    return system
+
+def get_all_block_hamiltonians(system):
+    """Gets the block hamiltonians of all the blocks of both sides.
+    """
+    result = []
+    for history, block in ((system.old_left_blocks, system.left_block),
+	                   (system.old_right_blocks, system.right_block)):
+	for old_block in list(history) + [block]:
+	    if 'bh' in old_block.operators.keys():
+		result.append(np.array(old_block.operators['bh']))
+    return result
+
+class TestWarmStartInTheMiddleOfASweep(unittest.TestCase):
+
+    def setUp(self):
+        self.number_of_sites = 10
+        self.left_block_size = self.number_of_sites // 2
+
+    def test_same_energy_with_truncation(self):
+	model = HeisenbergModel()
+	cold = run_to_the_middle_of_a_sweep(model, self.number_of_sites, 8)
+	warm = run_to_the_middle_of_a_sweep(model, self.number_of_sites, 8)
+	warm.warm_start(HeisenbergModel())
+	cold_energy = cold.finite_dmrg_step('left', self.left_block_size, 8)[0]
+	warm_energy = warm.finite_dmrg_step('left', self.left_block_size, 8)[0]
+	assert_true(abs(warm_energy - cold_energy) < 1e-5)
+
+    def test_site_dependent_model_same_blocks(self):
+	couplings = np.random.RandomState(3).uniform(0.5, 1.5,
+		                                     self.number_of_sites - 1)
+	system = run_to_the_middle_of_a_sweep(make_heisenberg_chain(couplings),
+		                              self.number_of_sites, 8)
+	old_bhs = get_all_block_hamiltonians(system)
+	system.warm_start(make_heisenberg_chain(couplings))
+	new_bhs = get_all_block_hamiltonians(system)
+	eq_(len(new_bhs), len(old_bhs))
+	for old_bh, new_bh in zip(old_bhs, new_bhs):
+	    assert_true(np.allclose(old_bh, new_bh))
+	energy = system.finite_dmrg_step('left', self.left_block_size, 8)[0]
+	assert_true(energy < -3.0)
@@ -0,0 +1,109 @@
+'''
+File: test_wavefunction.py
+Author: Ivan Gonzalez
+Description: Tests for the wavefunctions backed by files
+'''
+import numpy as np
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from nose.tools import assert_true, eq_
+
+from dmrg101.core.lanczos import calculate_ground_state
+from dmrg101.core.operators import CompositeOperator
+from dmrg101.core.wavefunction import Wavefunction, create_empty_like
+
+class TestWavefunctionOnDisk(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_create_empty_like(self):
+	wf = Wavefunction(3, 2)
+	on_disk = create_empty_like(wf, self.directory)
+	assert_true(isinstance(on_disk.as_matrix, np.memmap))
+	eq_(on_disk.as_matrix.shape, (3, 2))
+	# the file is removed right away
+	eq_(os.listdir(self.directory), [])
+
+    def test_move_to_disk(self):
+	wf = Wavefunction(3, 2)
+	wf.randomize()
+	as_matrix = np.copy(wf.as_matrix)
+	wf.move_to_disk(self.directory)
+	assert_true(isinstance(wf.as_matrix, np.memmap))
+	assert_true(np.all(wf.as_matrix == as_matrix))
+	assert_true(abs(wf.get_norm() - 1.0) < 1e-12)
+
+    def test_lanczos_vectors_on_disk(self):
+	np.random.seed(1)
+	h = CompositeOperator(6, 6)
+	for i in range(3):
+	    op = np.random.rand(6, 6)
+	    h.add(op + op.T, np.eye(6))
+	    h.add(np.eye(6), op + op.T)
+	initial_wf = Wavefunction(6, 6)
+	initial_wf.randomize()
+	energy, wf = calculate_ground_state(h, initial_wf)
+	energy_on_disk, wf_on_disk = calculate_ground_state(
+		h, initial_wf, directory=self.directory)
+	eq_(energy, energy_on_disk)
+	assert_true(np.allclose(wf.as_matrix, wf_on_disk.as_matrix))
+
+class TestInPlaceFunctions(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1)
+        self.wf = Wavefunction(3, 2)
+        self.wf.randomize()
+        self.other_wf = Wavefunction(3, 2)
+        self.other_wf.randomize()
+
+    def test_axpy(self):
+	as_matrix = self.wf.as_matrix
+	expected = as_matrix + 0.5 * self.other_wf.as_matrix
+	self.wf.axpy(0.5, self.other_wf)
+	assert_true(self.wf.as_matrix is as_matrix)
+	assert_true(np.allclose(self.wf.as_matrix, expected))
+
+    def test_axpy_with_a_complex_number(self):
+	wf = Wavefunction(3, 2, 'complex')
+	wf.as_matrix = np.zeros((3, 2), dtype=complex)
+	wf.axpy(1j, self.other_wf)
+	assert_true(np.allclose(wf.as_matrix, 1j * self.other_wf.as_matrix))
+
+    def test_randomize_and_set_to_zero(self):
+	wf = Wavefunction(3, 2, 'complex')
+	as_matrix = wf.as_matrix
+	wf.randomize()
+	assert_true(wf.as_matrix is as_matrix)
+	eq_(wf.as_matrix.dtype, np.dtype(complex))
+	assert_true(abs(wf.get_norm() - 1.0) < 1e-12)
+	wf.set_to_zero()
+	assert_true(wf.as_matrix is as_matrix)
+	eq_(wf.as_matrix.dtype, np.dtype(complex))
+	assert_true(np.all(wf.as_matrix == 0))
+
+    def test_scale_and_dot(self):
+	self.wf.scale(2.0)
+	assert_true(abs(self.wf.dot(self.wf) - 4.0) < 1e-12)
+
+    def test_apply_into(self):
+	h = CompositeOperator(3, 2)
+	h.add(np.random.rand(3, 3), np.eye(2), 0.5)
+	h.add(np.eye(3), np.random.rand(2, 2))
+	out = create_empty_like(self.wf)
+	as_matrix = out.as_matrix
+	h.apply_into(self.wf, out)
+	assert_true(out.as_matrix is as_matrix)
+	assert_true(np.allclose(out.as_matrix, h.apply(self.wf).as_matrix))
+
+    def test_pickle(self):
+	unpickled = pickle.loads(pickle.dumps(self.wf, 2))
+	eq_(unpickled.left_dim, 3)
+	assert_true(np.all(unpickled.as_matrix == self.wf.as_matrix))